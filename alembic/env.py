@@ -1,8 +1,5 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
-
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -20,10 +17,23 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 
 from app.models import Base
+from app.busca import tabela_de_busca
+from app.database import SQLALCHEMY_DATABASE_URL, criar_engine
 
 
 target_metadata = Base.metadata
 
+
+def incluir_objeto(objeto, nome, tipo, refletido, comparado_com):
+    # As tabelas da busca (FTS5) são criadas pela migration com SQL próprio e não existem nos
+    # models; sem isso o autogenerate tentaria apagá-las
+    return not (tipo == "table" and tabela_de_busca(nome))
+
+
+# A URL do banco vem das configurações da API (DATABASE_URL), e não do alembic.ini,
+# para as migrations rodarem sempre no mesmo banco que a aplicação usa
+config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +56,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=incluir_objeto,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -61,15 +72,12 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    # Uso o mesmo engine da API (com os PRAGMAs do SQLite), só que sem pool
+    connectable = criar_engine(sem_pool=True)
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=incluir_objeto
         )
 
         with context.begin_transaction():
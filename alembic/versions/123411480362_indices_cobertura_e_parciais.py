@@ -0,0 +1,49 @@
+"""indices cobertura e parciais
+
+Revision ID: 123411480362
+Revises: 2b788409de0f
+Create Date: 2026-10-17 22:42:17.820940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '123411480362'
+down_revision: Union[str, Sequence[str], None] = '2b788409de0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índices parciais só com as linhas ativas do catálogo, já com as colunas das listagens
+    # (o SQLite guarda booleano como 0/1; no PostgreSQL a comparação precisa ser com true)
+    op.create_index('ix_guias_ativos', 'guias', ['id', 'nome', 'telefone', 'ativo'], unique=False,
+                    sqlite_where=sa.text('ativo = 1'), postgresql_where=sa.text('ativo = true'))
+    op.create_index('ix_produtos_ativos', 'produtos', ['id', 'nome', 'preco_centavos', 'categoria', 'ativo'], unique=False,
+                    sqlite_where=sa.text('ativo = 1'), postgresql_where=sa.text('ativo = true'))
+
+    # Itens por visita (cascata, carga dos itens, ranking por período) e por produto (ranking geral)
+    op.create_index('ix_visita_produtos_visita_vendas', 'visita_produtos',
+                    ['visita_id', 'produto_id', 'quantidade', 'subtotal_centavos'], unique=False)
+    op.create_index('ix_visita_produtos_produto_vendas', 'visita_produtos',
+                    ['produto_id', 'quantidade', 'subtotal_centavos'], unique=False)
+
+    # O índice composto começa por guia_id, então substitui o antigo; crio o novo antes de
+    # apagar o outro para a chave estrangeira nunca ficar sem índice
+    op.create_index('ix_visitas_guia_data', 'visitas', ['guia_id', 'data_visita'], unique=False)
+    op.drop_index(op.f('ix_visitas_guia_id'), table_name='visitas')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_visitas_guia_id'), 'visitas', ['guia_id'], unique=False)
+    op.drop_index('ix_visitas_guia_data', table_name='visitas')
+    op.drop_index('ix_visita_produtos_produto_vendas', table_name='visita_produtos')
+    op.drop_index('ix_visita_produtos_visita_vendas', table_name='visita_produtos')
+    op.drop_index('ix_produtos_ativos', table_name='produtos')
+    op.drop_index('ix_guias_ativos', table_name='guias')
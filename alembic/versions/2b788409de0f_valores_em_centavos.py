@@ -0,0 +1,210 @@
+"""valores em centavos
+
+Revision ID: 2b788409de0f
+Revises: ecba03df5a12
+Create Date: 2026-10-17 23:40:12.503318
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.dinheiro import para_centavos
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b788409de0f'
+down_revision: Union[str, Sequence[str], None] = 'ecba03df5a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Cada valor é convertido pela mesma regra da API (app.dinheiro.para_centavos: o texto do float,
+# meio centavo para cima), registrada na conexão como a função SQL centavos(). Com o ROUND do
+# SQLite, que arredonda o valor binário, 1.005 viraria 100 aqui e 101 na API
+CENTAVOS = "centavos({coluna})"
+
+# No PostgreSQL a mesma regra vira uma função SQL, criada só durante a migração: o texto do
+# float (no 12 em diante, o mais curto que volta ao mesmo valor, como o str do Python) vai para
+# NUMERIC, e o ROUND do NUMERIC leva o meio centavo para longe do zero, como o ROUND_HALF_UP
+FUNCAO_CENTAVOS_POSTGRESQL = """
+CREATE FUNCTION centavos(valor double precision) RETURNS bigint
+LANGUAGE sql IMMUTABLE STRICT
+AS $$ SELECT CAST(ROUND(CAST(CAST(valor AS text) AS numeric) * 100) AS bigint) $$
+"""
+
+# Para cada total: soma da época do float, soma dos valores convertidos (calculada antes de
+# alterar qualquer coisa) e soma gravada nas colunas novas (depois da conversão)
+TOTAIS = {
+    "produtos.preco": (
+        "SELECT SUM(preco) FROM produtos",
+        f"SELECT SUM({CENTAVOS.format(coluna='preco')}) FROM produtos",
+        "SELECT SUM(preco_centavos) FROM produtos",
+    ),
+    "visitas.valor_taxa_guia": (
+        "SELECT SUM(valor_taxa_guia) FROM visitas",
+        f"SELECT SUM({CENTAVOS.format(coluna='valor_taxa_guia')}) FROM visitas",
+        "SELECT SUM(valor_taxa_guia_centavos) FROM visitas",
+    ),
+    "visitas.total_produtos": (
+        "SELECT SUM(total_produtos) FROM visitas",
+        f"SELECT SUM({CENTAVOS.format(coluna='total_produtos')}) FROM visitas",
+        "SELECT SUM(total_produtos_centavos) FROM visitas",
+    ),
+    "visita_produtos.subtotal": (
+        "SELECT SUM(quantidade * preco_na_hora) FROM visita_produtos",
+        f"SELECT SUM(quantidade * {CENTAVOS.format(coluna='preco_na_hora')}) FROM visita_produtos",
+        "SELECT SUM(subtotal_centavos) FROM visita_produtos",
+    ),
+}
+
+
+def _total(sql: str):
+    return op.get_bind().exec_driver_sql(sql).scalar() or 0
+
+
+def _registrar_centavos(conexao):
+    dialeto = conexao.dialect.name
+    if dialeto == "sqlite":
+        conexao.connection.driver_connection.create_function("centavos", 1, para_centavos, deterministic=True)
+    elif dialeto == "postgresql":
+        conexao.exec_driver_sql(FUNCAO_CENTAVOS_POSTGRESQL)
+    else:
+        raise RuntimeError(
+            f"A conversão para centavos só sabe registrar a função centavos() no SQLite e no PostgreSQL, não em {dialeto}."
+        )
+
+
+def _remover_centavos(conexao):
+    # No SQLite a função some junto com a conexão; no PostgreSQL ela ficaria no banco
+    if conexao.dialect.name == "postgresql":
+        conexao.exec_driver_sql("DROP FUNCTION centavos(double precision)")
+
+
+def _recriar_resumo(taxas: str, produtos: str, coluna_taxas: str, coluna_produtos: str):
+    # O resumo é recalculado a partir das visitas já convertidas, em vez de converter as somas antigas
+    op.execute("DELETE FROM resumo_diario")
+    op.execute(
+        f"""
+        INSERT INTO resumo_diario (dia, guia_id, qtd_visitas, qtd_turistas, {coluna_taxas}, {coluna_produtos})
+        SELECT date(data_visita), guia_id, COUNT(*),
+               COALESCE(SUM(qtd_turistas), 0), COALESCE(SUM({taxas}), 0), COALESCE(SUM({produtos}), 0)
+        FROM visitas
+        WHERE guia_id IS NOT NULL AND data_visita IS NOT NULL
+        GROUP BY date(data_visita), guia_id
+        """
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A conversão roda em Python, dentro da conexão; gerando SQL (modo offline) não há onde rodar
+    if context.is_offline_mode():
+        raise RuntimeError("A conversão para centavos precisa de uma conexão com o banco (não funciona com --sql).")
+    _registrar_centavos(op.get_bind())
+
+    # Antes de mexer no esquema, confiro que a soma dos valores convertidos bate, centavo por
+    # centavo, com o total da época do float. Não bate quando há valores com fração de
+    # centavo; nesse caso a migração para aqui, sem alterar nada
+    esperados = {}
+    divergencias = []
+    for nome, (sql_float, sql_convertido, _) in TOTAIS.items():
+        total_float = _total(sql_float)
+        esperados[nome] = _total(sql_convertido)
+        logger.info("Conferência %s: %.2f (float) -> %d centavos", nome, total_float, esperados[nome])
+        if esperados[nome] != para_centavos(total_float):
+            divergencias.append(f"{nome}: {total_float!r} em float, {esperados[nome]} centavos convertidos")
+
+    if divergencias:
+        raise RuntimeError("Os totais convertidos não batem com os totais antigos: " + "; ".join(divergencias))
+
+    op.add_column('produtos', sa.Column('preco_centavos', sa.Integer(), nullable=True))
+    op.add_column('visitas', sa.Column('valor_taxa_guia_centavos', sa.Integer(), nullable=True))
+    op.add_column('visitas', sa.Column('total_produtos_centavos', sa.Integer(), nullable=True))
+    op.add_column('visita_produtos', sa.Column('preco_na_hora_centavos', sa.Integer(), nullable=True))
+    op.add_column('visita_produtos', sa.Column('subtotal_centavos', sa.Integer(), nullable=True))
+    # O resumo é recalculado do zero, então as colunas antigas dele já podem sair aqui
+    with op.batch_alter_table('resumo_diario') as batch_op:
+        batch_op.drop_column('total_taxas')
+        batch_op.drop_column('total_produtos')
+        batch_op.add_column(sa.Column('total_taxas_centavos', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_produtos_centavos', sa.BigInteger(), nullable=False, server_default='0'))
+
+    op.execute(f"UPDATE produtos SET preco_centavos = {CENTAVOS.format(coluna='preco')}")
+    op.execute(
+        f"""
+        UPDATE visitas SET
+            valor_taxa_guia_centavos = {CENTAVOS.format(coluna='valor_taxa_guia')},
+            total_produtos_centavos = {CENTAVOS.format(coluna='total_produtos')}
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE visita_produtos SET
+            preco_na_hora_centavos = {CENTAVOS.format(coluna='preco_na_hora')},
+            subtotal_centavos = quantidade * {CENTAVOS.format(coluna='preco_na_hora')}
+        """
+    )
+    _recriar_resumo('valor_taxa_guia_centavos', 'total_produtos_centavos', 'total_taxas_centavos', 'total_produtos_centavos')
+
+    # Confiro o que ficou gravado (e o resumo recalculado) antes de apagar as colunas antigas
+    divergencias = [
+        f"{nome}: esperado {esperados[nome]}, gravado {_total(sql_gravado)}"
+        for nome, (_, _, sql_gravado) in TOTAIS.items()
+        if _total(sql_gravado) != esperados[nome]
+    ]
+    conexao = op.get_bind()
+    resumo = conexao.exec_driver_sql(
+        "SELECT COALESCE(SUM(total_taxas_centavos), 0), COALESCE(SUM(total_produtos_centavos), 0) FROM resumo_diario"
+    ).one()
+    visitas = conexao.exec_driver_sql(
+        "SELECT COALESCE(SUM(valor_taxa_guia_centavos), 0), COALESCE(SUM(total_produtos_centavos), 0) FROM visitas "
+        "WHERE guia_id IS NOT NULL AND data_visita IS NOT NULL"
+    ).one()
+    if tuple(resumo) != tuple(visitas):
+        divergencias.append(f"resumo_diario: {tuple(resumo)} centavos, visitas: {tuple(visitas)} centavos")
+
+    if divergencias:
+        raise RuntimeError("A conversão para centavos não gravou os totais esperados: " + "; ".join(divergencias))
+    _remover_centavos(conexao)
+
+    with op.batch_alter_table('produtos') as batch_op:
+        batch_op.drop_column('preco')
+    with op.batch_alter_table('visitas') as batch_op:
+        batch_op.drop_column('valor_taxa_guia')
+        batch_op.drop_column('total_produtos')
+    with op.batch_alter_table('visita_produtos') as batch_op:
+        batch_op.drop_column('preco_na_hora')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('produtos', sa.Column('preco', sa.Float(), nullable=True))
+    op.add_column('visitas', sa.Column('valor_taxa_guia', sa.Float(), nullable=True))
+    op.add_column('visitas', sa.Column('total_produtos', sa.Float(), nullable=True))
+    op.add_column('visita_produtos', sa.Column('preco_na_hora', sa.Float(), nullable=True))
+    with op.batch_alter_table('resumo_diario') as batch_op:
+        batch_op.drop_column('total_taxas_centavos')
+        batch_op.drop_column('total_produtos_centavos')
+        batch_op.add_column(sa.Column('total_taxas', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_produtos', sa.Float(), nullable=False, server_default='0'))
+
+    op.execute("UPDATE produtos SET preco = preco_centavos / 100.0")
+    op.execute(
+        "UPDATE visitas SET valor_taxa_guia = valor_taxa_guia_centavos / 100.0, "
+        "total_produtos = total_produtos_centavos / 100.0"
+    )
+    op.execute("UPDATE visita_produtos SET preco_na_hora = preco_na_hora_centavos / 100.0")
+    _recriar_resumo('valor_taxa_guia', 'total_produtos', 'total_taxas', 'total_produtos')
+
+    with op.batch_alter_table('produtos') as batch_op:
+        batch_op.drop_column('preco_centavos')
+    with op.batch_alter_table('visitas') as batch_op:
+        batch_op.drop_column('valor_taxa_guia_centavos')
+        batch_op.drop_column('total_produtos_centavos')
+    with op.batch_alter_table('visita_produtos') as batch_op:
+        batch_op.drop_column('preco_na_hora_centavos')
+        batch_op.drop_column('subtotal_centavos')
@@ -0,0 +1,32 @@
+"""epoca catalogo
+
+Revision ID: 5c1f0e7a9b2d
+Revises: d4d61cd3b7d0
+Create Date: 2026-10-18 00:20:41.118203
+
+"""
+import secrets
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0e7a9b2d'
+down_revision: Union[str, Sequence[str], None] = 'd4d61cd3b7d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+versoes = sa.table('catalogo_versoes', sa.column('tabela', sa.String), sa.column('versao', sa.Integer))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A época do banco entra nas ETags do catálogo; bancos criados a partir daqui já nascem com ela
+    op.execute(versoes.insert().values(tabela='epoca', versao=secrets.randbelow(2**31 - 1) + 1))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(versoes.delete().where(versoes.c.tabela == 'epoca'))
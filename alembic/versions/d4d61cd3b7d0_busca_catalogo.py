@@ -0,0 +1,61 @@
+"""busca catalogo
+
+Revision ID: d4d61cd3b7d0
+Revises: 123411480362
+Create Date: 2026-10-17 22:52:20.498429
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4d61cd3b7d0'
+down_revision: Union[str, Sequence[str], None] = '123411480362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Tabela do catálogo -> tabela virtual FTS5 que indexa o nome (sem acentos, com índice de
+# prefixo para 2 e 3 letras). A versão usada pela API (create_all) fica em app/busca.py
+BUSCAS = {"produtos": "produtos_busca", "guias": "guias_busca"}
+
+
+def _comandos(tabela: str, busca: str):
+    apagar = f"INSERT INTO {busca}({busca}, rowid, nome) VALUES ('delete', old.id, old.nome);"
+    inserir = f"INSERT INTO {busca}(rowid, nome) VALUES (new.id, new.nome);"
+    return [
+        f"CREATE VIRTUAL TABLE {busca} USING fts5(nome, content='{tabela}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {busca}_inserir AFTER INSERT ON {tabela} BEGIN {inserir} END",
+        f"CREATE TRIGGER {busca}_apagar AFTER DELETE ON {tabela} BEGIN {apagar} END",
+        f"CREATE TRIGGER {busca}_atualizar AFTER UPDATE OF nome ON {tabela} BEGIN {apagar} {inserir} END",
+        # Indexa o que já está cadastrado
+        f"INSERT INTO {busca}({busca}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # FTS5 só existe no SQLite; nos outros bancos a busca usa LIKE e não precisa de nada aqui.
+    # Atenção: um batch_alter_table em produtos ou guias recria a tabela e apaga os triggers,
+    # então uma migration assim precisa recriar os triggers depois
+    if op.get_context().dialect.name != "sqlite":
+        return
+
+    for tabela, busca in BUSCAS.items():
+        for comando in _comandos(tabela, busca):
+            op.execute(comando)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != "sqlite":
+        return
+
+    # Apagar a tabela virtual não apaga os triggers, que passariam a falhar em todo INSERT
+    for busca in BUSCAS.values():
+        for sufixo in ("inserir", "apagar", "atualizar"):
+            op.execute(f"DROP TRIGGER IF EXISTS {busca}_{sufixo}")
+        op.execute(f"DROP TABLE IF EXISTS {busca}")
@@ -0,0 +1,242 @@
+"""
+Limites de uso por chave de API, aplicados antes de a requisição chegar às rotas.
+
+Cada chave tem um balde de fichas por classe de rota (escrita, leitura e relatório): uma
+integração que dispara relatórios sem parar esgota o balde de relatórios dela, e não o de
+escrita de ninguém. Os relatórios ainda têm um limite de execuções simultâneas no processo,
+com uma fila curta; passando disso, a resposta sai na hora (429 ou 503, com Retry-After), em
+vez de a requisição ficar esperando e ocupando conexões do banco que o registro de visitas usa.
+
+Os baldes e a fila ficam na memória de cada processo: com vários workers, o limite efetivo
+de uma chave é o configurado vezes a quantidade de workers.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from app.config import configuracoes
+from app.metricas import Contador, Medidor, registro
+from app.security import API_KEY_NAME, identificar_chave
+
+# Rotas que agregam o período inteiro ou geram arquivos; as demais vão pelo método
+ROTAS_RELATORIO = {
+    ("GET", "/visitas/relatorio"),
+    ("GET", "/visitas/serie"),
+    ("GET", "/visitas/exportar"),
+    ("GET", "/produtos/ranking"),
+    ("GET", "/guias/desempenho"),
+    ("POST", "/relatorios/jobs"),
+}
+
+rejeicoes = registro.registrar(Contador(
+    "turismo_admissao_rejeicoes_total", "Requisições recusadas pelos limites de uso", ("chave", "classe", "motivo")
+))
+relatorios_em_andamento = registro.registrar(Medidor(
+    "turismo_admissao_relatorios_em_andamento", "Relatórios sendo atendidos agora"
+))
+relatorios_na_fila = registro.registrar(Medidor(
+    "turismo_admissao_relatorios_na_fila", "Relatórios esperando uma vaga"
+))
+
+
+class Lotado(Exception):
+    pass
+
+
+class Balde:
+    """
+    Balde de fichas: enche 'taxa' fichas por segundo até 'capacidade'; cada requisição gasta uma.
+    """
+
+    __slots__ = ("taxa", "capacidade", "fichas", "atualizado")
+
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.fichas = float(capacidade)
+        self.atualizado = time.monotonic()
+
+    def retirar(self) -> float:
+        # Devolve 0 se a ficha foi retirada; senão, quantos segundos faltam para a próxima
+        agora = time.monotonic()
+        self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return 0.0
+        return (1 - self.fichas) / self.taxa if self.taxa > 0 else math.inf
+
+
+class LimiteConcorrencia:
+    """
+    No máximo 'maximo' ao mesmo tempo e 'fila' esperando, cada um por até 'espera' segundos.
+    Quem sai passa a vaga direto para o primeiro da fila, na ordem de chegada.
+    """
+
+    def __init__(self, maximo: int, fila: int, espera: float):
+        self.maximo = maximo
+        self.tamanho_fila = fila
+        self.espera = espera
+        self.em_uso = 0
+        self._fila = deque()
+
+    async def entrar(self):
+        if self.em_uso < self.maximo and not self._fila:
+            self.em_uso += 1
+            self._atualizar_metricas()
+            return
+        if len(self._fila) >= self.tamanho_fila:
+            raise Lotado()
+
+        vaga = asyncio.get_running_loop().create_future()
+        self._fila.append(vaga)
+        self._atualizar_metricas()
+        try:
+            # asyncio.wait (e não wait_for) não cancela a vaga no tempo esgotado: dá para
+            # conferir se ela chegou junto com o fim da espera
+            await asyncio.wait((vaga,), timeout=self.espera)
+        except asyncio.CancelledError:
+            # Cliente desconectou enquanto esperava; se a vaga já tinha chegado, repasso
+            if vaga.done():
+                self.sair()
+            else:
+                self._desistir(vaga)
+            raise
+        if not vaga.done():
+            self._desistir(vaga)
+            raise Lotado()
+
+    def sair(self):
+        while self._fila:
+            vaga = self._fila.popleft()
+            if not vaga.done():
+                # A vaga muda de dono sem passar pelo contador
+                vaga.set_result(None)
+                self._atualizar_metricas()
+                return
+        self.em_uso -= 1
+        self._atualizar_metricas()
+
+    def _desistir(self, vaga):
+        vaga.cancel()
+        if vaga in self._fila:
+            self._fila.remove(vaga)
+        self._atualizar_metricas()
+
+    def _atualizar_metricas(self):
+        relatorios_em_andamento.definir(valor=self.em_uso)
+        relatorios_na_fila.definir(valor=len(self._fila))
+
+
+class ControleAdmissao:
+    def __init__(
+        self,
+        limites: Dict[str, Tuple[float, int]],
+        limites_por_chave: Dict[Tuple[str, str], Tuple[float, int]],
+        relatorios: LimiteConcorrencia,
+        habilitado: bool = True,
+    ):
+        self.limites = limites
+        self.limites_por_chave = limites_por_chave
+        self.relatorios = relatorios
+        self.habilitado = habilitado
+        self._baldes: Dict[Tuple[str, str], Balde] = {}
+
+    def classificar(self, metodo: str, caminho: str) -> str:
+        if (metodo, caminho) in ROTAS_RELATORIO:
+            return "relatorio"
+        return "leitura" if metodo in ("GET", "HEAD") else "escrita"
+
+    def retirar_ficha(self, chave: str, classe: str) -> float:
+        balde = self._baldes.get((chave, classe))
+        if balde is None:
+            taxa, capacidade = self.limites_por_chave.get((chave, classe), self.limites[classe])
+            balde = self._baldes[(chave, classe)] = Balde(taxa, capacidade)
+        return balde.retirar()
+
+    def limpar(self):
+        self._baldes.clear()
+
+
+class MiddlewareAdmissao:
+    """
+    Middleware ASGI que aplica os limites de uso. Requisições sem chave válida passam direto
+    (quem as recusa é o validar_api_key, com 401).
+    """
+
+    def __init__(self, app, controle: ControleAdmissao):
+        self.app = app
+        self.controle = controle
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controle.habilitado:
+            await self.app(scope, receive, send)
+            return
+
+        chave = identificar_chave(_cabecalho(scope, API_KEY_NAME.lower().encode()))
+        rota = _encontrar_rota(scope)
+        if chave is None or rota is None:
+            await self.app(scope, receive, send)
+            return
+
+        classe = self.controle.classificar(scope["method"], rota.path)
+        espera = self.controle.retirar_ficha(chave, classe)
+        if espera:
+            rejeicoes.inc(chave, classe, "taxa")
+            await _recusar(scope, receive, send, rota, 429, espera, 'Limite de requisições atingido para esta chave. Tente de novo em instantes.')
+            return
+
+        if classe != "relatorio":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controle.relatorios.entrar()
+        except Lotado:
+            rejeicoes.inc(chave, classe, "lotado")
+            await _recusar(scope, receive, send, rota, 503, self.controle.relatorios.espera, 'Muitos relatórios em andamento. Tente de novo em instantes.')
+            return
+
+        # A vaga só é liberada quando a resposta termina (inclusive as enviadas aos poucos, como a exportação)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controle.relatorios.sair()
+
+
+def _cabecalho(scope, nome: bytes) -> Optional[str]:
+    for chave, valor in scope["headers"]:
+        if chave == nome:
+            return valor.decode("latin-1")
+    return None
+
+
+def _encontrar_rota(scope):
+    # O roteamento ainda não aconteceu aqui; procuro a rota do mesmo jeito que o router
+    for rota in scope["app"].router.routes:
+        correspondencia, _ = rota.matches(scope)
+        if correspondencia == Match.FULL:
+            return rota
+    return None
+
+
+async def _recusar(scope, receive, send, rota, status: int, espera: float, detalhe: str):
+    # Com a rota no scope, a recusa aparece nas métricas HTTP com o nome certo
+    scope["route"] = rota
+    resposta = JSONResponse({"detail": detalhe}, status_code=status, headers={"Retry-After": str(max(1, math.ceil(min(espera, 3600))))})
+    await resposta(scope, receive, send)
+
+
+controle_admissao = ControleAdmissao(
+    configuracoes.limites,
+    configuracoes.limites_por_chave,
+    LimiteConcorrencia(
+        configuracoes.limite_relatorios_simultaneos,
+        configuracoes.limite_relatorios_fila,
+        configuracoes.limite_relatorios_espera,
+    ),
+    habilitado=configuracoes.limites_habilitados,
+)
@@ -0,0 +1,260 @@
+"""
+Painel ao vivo do faturamento do dia (GET /visitas/ao-vivo, Server-Sent Events).
+
+Os totais de hoje ficam em memória e são atualizados pelo próprio service de visitas logo
+depois de cada commit (cadastro, lote, edição e exclusão), então as telas abertas não
+consultam o banco a cada atualização. O banco só é lido para carregar o dia na primeira
+conexão e, enquanto houver tela aberta, numa recarga periódica (uma para o processo todo,
+não uma por tela) que traz as visitas gravadas por outros processos.
+
+Cada evento leva os totais completos, e não só a diferença: uma tela que perdeu eventos ou
+reconectou fica certa com o próximo que receber. Por isso também não há fila por conexão;
+uma tela lenta pula direto para os totais mais recentes.
+"""
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import orjson
+from app.config import configuracoes
+from app.dinheiro import para_reais
+from app.metricas import Contador, Medidor, registro
+
+logger = logging.getLogger("turismo_api")
+
+# Quanto o navegador espera para reconectar quando a conexão cai (campo "retry" do SSE)
+RECONEXAO_MS = 3000
+
+conexoes_ao_vivo = registro.registrar(Medidor(
+    "turismo_ao_vivo_conexoes", "Telas conectadas no painel ao vivo"
+))
+recargas_ao_vivo = registro.registrar(Contador(
+    "turismo_ao_vivo_recargas_total", "Leituras do banco feitas pelo painel ao vivo"
+))
+
+
+class Movimento(NamedTuple):
+    """
+    O que uma visita soma (ou, com valores negativos, tira) dos totais do dia. Os itens são
+    (produto_id, nome, quantidade, subtotal em centavos); o nome pode ser None quando o
+    produto já está no painel.
+    """
+    data_visita: Optional[datetime]
+    visitas: int
+    turistas: int
+    taxas: int
+    produtos: int
+    itens: Tuple[Tuple[int, Optional[str], int, int], ...] = ()
+
+    def invertido(self) -> "Movimento":
+        return Movimento(
+            self.data_visita, -self.visitas, -self.turistas, -self.taxas, -self.produtos,
+            tuple((produto_id, nome, -quantidade, -subtotal) for produto_id, nome, quantidade, subtotal in self.itens),
+        )
+
+
+# Totais do dia lidos do banco: [visitas, turistas, taxas, produtos] e, por produto, [nome, quantidade, subtotal]
+TotaisDoDia = Tuple[List[int], Dict[int, list]]
+Carregador = Callable[[date], Awaitable[TotaisDoDia]]
+
+
+def hoje() -> date:
+    # O banco grava data_visita em UTC (func.now()), então o "hoje" do painel também é em UTC
+    return datetime.now(timezone.utc).date()
+
+
+class PainelAoVivo:
+    def __init__(self, top: int = 5, heartbeat: float = 15.0, intervalo_minimo: float = 1.0, recarga: float = 60.0):
+        self.top = top
+        self.heartbeat = heartbeat
+        self.intervalo_minimo = intervalo_minimo
+        self.recarga = recarga
+        self._trava = threading.Lock()
+        # Entra no ID dos eventos: depois de um reinício, um Last-Event-ID antigo nunca coincide
+        self._epoca = format(time.time_ns() // 1_000_000, "x")
+        self._versao = 0
+        self._dia: Optional[date] = None
+        self._totais = [0, 0, 0, 0]
+        self._vendas: Dict[int, list] = {}
+        self._evento: Optional[Tuple[str, str]] = None
+        # Um asyncio.Event por tela conectada, com o loop dela (as publicações vêm de outras threads)
+        self._assinantes: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._publicacoes = 0
+        self._recarregando = False
+        self._proxima_recarga = 0.0
+
+    def publicar(self, movimentos: Iterable[Movimento]):
+        """
+        Aplica os movimentos de uma transação já confirmada e acorda as telas. Chamado pelos
+        services depois do commit; movimentos de outros dias são ignorados.
+        """
+        with self._trava:
+            self._publicacoes += 1
+            if self._dia is None:
+                return
+            self._virar_dia()
+
+            mudou = False
+            for movimento in movimentos:
+                if movimento.data_visita is None or movimento.data_visita.date() != self._dia:
+                    continue
+                for posicao, valor in enumerate(movimento[1:5]):
+                    self._totais[posicao] += valor
+                for produto_id, nome, quantidade, subtotal in movimento.itens:
+                    venda = self._vendas.setdefault(produto_id, [nome, 0, 0])
+                    venda[0] = nome or venda[0]
+                    venda[1] += quantidade
+                    venda[2] += subtotal
+                    if venda[1] <= 0:
+                        del self._vendas[produto_id]
+                mudou = True
+
+            if not mudou:
+                return
+            assinantes = self._nova_versao()
+        self._avisar(assinantes)
+
+    def evento_atual(self) -> Optional[Tuple[str, str]]:
+        # O JSON é montado uma vez por versão e reaproveitado por todas as telas
+        with self._trava:
+            if self._dia is None:
+                return None
+            self._virar_dia()
+            if self._evento is None:
+                self._evento = (f"{self._epoca}-{self._versao}", self._montar_json())
+            return self._evento
+
+    async def transmitir(
+        self,
+        carregar: Carregador,
+        ultimo_id: Optional[str] = None,
+        desconectado: Callable[[], Awaitable[bool]] = None,
+    ):
+        """
+        Gera o texto do stream de uma tela. Com o Last-Event-ID de uma conexão anterior, os
+        totais só são reenviados se mudaram desde então.
+        """
+        acordar = asyncio.Event()
+        with self._trava:
+            self._assinantes[acordar] = asyncio.get_running_loop()
+        conexoes_ao_vivo.inc()
+
+        try:
+            yield f"retry: {RECONEXAO_MS}\n\n"
+            enviado = ultimo_id
+
+            while not (desconectado and await desconectado()):
+                # Limpo antes de ler: uma publicação daqui em diante acorda a próxima espera
+                acordar.clear()
+                await self._carregar_se_preciso(carregar)
+
+                evento = self.evento_atual()
+                if evento and evento[0] != enviado:
+                    enviado, dados = evento
+                    yield f"id: {enviado}\nevent: totais\ndata: {dados}\n\n"
+                    # As publicações que chegarem nesse intervalo saem juntas num evento só
+                    await asyncio.sleep(self.intervalo_minimo)
+                    continue
+
+                try:
+                    await asyncio.wait_for(acordar.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comentário do SSE: mantém a conexão viva em proxies que cortam conexões paradas
+                    yield ": ping\n\n"
+        finally:
+            with self._trava:
+                self._assinantes.pop(acordar, None)
+            conexoes_ao_vivo.dec()
+
+    def limpar(self):
+        # Esquece o dia carregado (usado nos testes, que trocam de banco entre um caso e outro)
+        with self._trava:
+            self._dia = None
+            self._totais = [0, 0, 0, 0]
+            self._vendas = {}
+            self._evento = None
+            self._proxima_recarga = 0.0
+
+    async def _carregar_se_preciso(self, carregar: Carregador):
+        with self._trava:
+            if self._recarregando or time.monotonic() < self._proxima_recarga:
+                return
+            self._recarregando = True
+            publicacoes = self._publicacoes
+            dia = hoje()
+
+        try:
+            totais, vendas = await carregar(dia)
+        except Exception:
+            logger.exception("Painel ao vivo: erro ao ler os totais do dia; tento de novo na próxima atualização")
+            with self._trava:
+                self._recarregando = False
+            return
+        recargas_ao_vivo.inc()
+
+        with self._trava:
+            self._recarregando = False
+            self._proxima_recarga = time.monotonic() + self.recarga
+
+            if self._publicacoes != publicacoes:
+                # Houve commit durante a leitura e não dá para saber se ela já o viu: leio de novo
+                # logo em seguida. Sem nada carregado ainda, fico com esta leitura até lá
+                self._proxima_recarga = time.monotonic() + self.intervalo_minimo
+                if self._dia is not None:
+                    return
+
+            if (dia, totais, vendas) == (self._dia, self._totais, self._vendas):
+                return
+            self._dia, self._totais, self._vendas = dia, totais, vendas
+            assinantes = self._nova_versao()
+        self._avisar(assinantes)
+
+    def _virar_dia(self):
+        # Na virada do dia os totais recomeçam do zero (chamado com a trava)
+        dia = hoje()
+        if self._dia is not None and dia != self._dia:
+            self._dia = dia
+            self._totais = [0, 0, 0, 0]
+            self._vendas = {}
+            self._nova_versao()
+
+    def _nova_versao(self):
+        # Chamado com a trava; devolve quem precisa ser acordado
+        self._versao += 1
+        self._evento = None
+        return list(self._assinantes.items())
+
+    def _avisar(self, assinantes):
+        for acordar, loop in assinantes:
+            try:
+                loop.call_soon_threadsafe(acordar.set)
+            except RuntimeError:
+                # Loop já encerrado: a conexão sai da lista no finally do transmitir
+                pass
+
+    def _montar_json(self) -> str:
+        visitas, turistas, taxas, produtos = self._totais
+        mais_vendidos = heapq.nlargest(self.top, self._vendas.items(), key=lambda item: (item[1][2], -item[0]))
+        return orjson.dumps({
+            "dia": self._dia.isoformat(),
+            "visitas": visitas,
+            "turistas": turistas,
+            "total_taxas": para_reais(taxas),
+            "total_produtos": para_reais(produtos),
+            "faturamento_total": para_reais(taxas + produtos),
+            "top_produtos": [
+                {"id": produto_id, "nome": nome, "unidades_vendidas": quantidade, "faturamento_total": para_reais(subtotal)}
+                for produto_id, (nome, quantidade, subtotal) in mais_vendidos
+            ],
+        }).decode()
+
+
+painel_ao_vivo = PainelAoVivo(
+    top=configuracoes.ao_vivo_top,
+    heartbeat=configuracoes.ao_vivo_heartbeat,
+    intervalo_minimo=configuracoes.ao_vivo_intervalo_minimo,
+    recarga=configuracoes.ao_vivo_recarga,
+)
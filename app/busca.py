@@ -0,0 +1,81 @@
+"""
+Busca por nome (type-ahead do caixa) no catálogo.
+
+No SQLite cada tabela do catálogo ganha uma tabela virtual FTS5 que indexa o nome, sem
+acentos ("agua" acha "Água") e com índice de prefixo para as primeiras letras digitadas. A
+tabela virtual não guarda cópia das linhas (content=...) e é mantida por triggers, então
+qualquer INSERT/UPDATE/DELETE no catálogo já atualiza a busca, venha de onde vier.
+"""
+import re
+from typing import List
+from sqlalchemy import DDL, Table, column, event, literal_column, table
+
+# Tabela do catálogo -> tabela virtual da busca (usado também pelo Alembic para ignorar as
+# tabelas virtuais e as tabelas internas que o FTS5 cria junto)
+TABELAS_BUSCA = {"produtos": "produtos_busca", "guias": "guias_busca"}
+
+# Tamanhos de prefixo com índice próprio: deixam rápidas as buscas com 2 e 3 letras
+PREFIXOS = "2 3"
+
+
+def comandos_criacao(tabela: str, busca: str, colunas: List[str]) -> List[str]:
+    """
+    Comandos que criam a tabela virtual e os triggers que a mantêm igual à tabela do catálogo.
+    """
+    lista = ", ".join(colunas)
+    novos = ", ".join(f"new.{c}" for c in colunas)
+    antigos = ", ".join(f"old.{c}" for c in colunas)
+    # Numa tabela FTS5 com content=..., apagar é inserir o comando 'delete' com os valores antigos
+    apagar = f"INSERT INTO {busca}({busca}, rowid, {lista}) VALUES ('delete', old.id, {antigos});"
+    inserir = f"INSERT INTO {busca}(rowid, {lista}) VALUES (new.id, {novos});"
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {busca} USING fts5("
+        f"{lista}, content='{tabela}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='{PREFIXOS}')",
+        f"CREATE TRIGGER IF NOT EXISTS {busca}_inserir AFTER INSERT ON {tabela} BEGIN {inserir} END",
+        f"CREATE TRIGGER IF NOT EXISTS {busca}_apagar AFTER DELETE ON {tabela} BEGIN {apagar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {busca}_atualizar AFTER UPDATE OF {lista} ON {tabela} "
+        f"BEGIN {apagar} {inserir} END",
+    ]
+
+
+def registrar_busca(tabela: Table, colunas: List[str]):
+    """
+    Faz o create_all/drop_all (testes, benchmarks) criar e apagar a busca junto com a tabela.
+    Em bancos já existentes quem cria é a migration.
+    """
+    busca = TABELAS_BUSCA[tabela.name]
+    for comando in comandos_criacao(tabela.name, busca, colunas):
+        event.listen(tabela, "after_create", DDL(comando).execute_if(dialect="sqlite"))
+    # Sem isso, um drop_all seguido de create_all deixaria na busca as linhas do banco antigo
+    event.listen(tabela, "before_drop", DDL(f"DROP TABLE IF EXISTS {busca}").execute_if(dialect="sqlite"))
+
+
+def tabela_de_busca(nome: str) -> bool:
+    # A tabela virtual e as internas do FTS5 (produtos_busca_data, produtos_busca_idx, ...)
+    return any(nome == busca or nome.startswith(f"{busca}_") for busca in TABELAS_BUSCA.values())
+
+
+def termos(texto: str) -> List[str]:
+    # Mesmo critério do tokenizer unicode61: letras e números, o resto separa as palavras
+    return re.findall(r"\w+", texto)
+
+
+def expressao_fts(texto: str) -> str:
+    """
+    Monta a consulta do MATCH: todas as palavras precisam aparecer, e cada uma vale como
+    prefixo ("agu min" acha "Água Mineral"). As aspas evitam que o texto digitado seja lido
+    como operador do FTS5 (AND, OR, NEAR, *).
+    """
+    return " ".join(f'"{termo}"*' for termo in termos(texto))
+
+
+def consulta_fts(tabela: str):
+    """
+    Devolve a tabela virtual (para o JOIN pelo rowid), a condição do MATCH e a coluna rank
+    do FTS5 (bm25: quanto menor, mais relevante).
+    """
+    busca = TABELAS_BUSCA[tabela]
+    virtual = table(busca, column("rowid"))
+    return virtual, literal_column(busca).op("MATCH"), literal_column(f"{busca}.rank")
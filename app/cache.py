@@ -0,0 +1,186 @@
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+from app.config import configuracoes
+from app.metricas import registro
+
+
+class ProdutoEmCache(NamedTuple):
+    preco_centavos: int
+    ativo: bool
+    nome: str
+
+
+class GuiaEmCache(NamedTuple):
+    ativo: bool
+    nome: str
+    telefone: str
+
+
+def incrementar_versao(db: Session, tabela: str):
+    """
+    Incrementa a versão da tabela do catálogo. Deve ser chamada antes do commit da alteração,
+    para a versão nova e o dado novo ficarem visíveis juntos para os outros processos.
+    """
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(models.VersaoCatalogo).values(tabela=tabela, versao=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.VersaoCatalogo.tabela],
+        set_={"versao": models.VersaoCatalogo.versao + 1},
+    )
+    db.execute(stmt)
+
+
+def ler_versao_com_epoca(db: Session, tabela: str) -> Tuple[int, int]:
+    """
+    Época do banco e versão da tabela, numa consulta só. É o que identifica uma listagem do
+    catálogo nas ETags: a versão sozinha se repete num banco recriado ou restaurado.
+    """
+    # Tabela que nunca foi alterada ainda não tem linha: conta como versão 0
+    versoes = dict(
+        db.query(models.VersaoCatalogo.tabela, models.VersaoCatalogo.versao)
+        .filter(models.VersaoCatalogo.tabela.in_((models.EPOCA, tabela)))
+        .all()
+    )
+    return versoes.get(models.EPOCA, 0), versoes.get(tabela, 0)
+
+
+def renovar_epoca(db: Session) -> int:
+    """
+    Sorteia outra época para o banco (depois de restaurar um backup, por exemplo): as ETags
+    entregues antes deixam de valer e os caches dos processos são limpos. Não faz o commit.
+    """
+    epoca = models.nova_epoca()
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(models.VersaoCatalogo).values(tabela=models.EPOCA, versao=epoca)
+    db.execute(stmt.on_conflict_do_update(index_elements=[models.VersaoCatalogo.tabela], set_={"versao": epoca}))
+    return epoca
+
+
+class CatalogoCache:
+    """
+    Cache em memória do que o registro de visitas precisa do catálogo: preço, status e nome
+    dos produtos (o nome vai para o painel ao vivo) e status dos guias.
+
+    Quem altera o catálogo no próprio processo chama invalidar() logo depois do commit.
+    Alterações feitas por outros processos são percebidas pela tabela catalogo_versoes,
+    consultada no máximo uma vez a cada 'intervalo_verificacao' segundos.
+    """
+
+    def __init__(self, intervalo_verificacao: float = 2.0):
+        self.intervalo_verificacao = intervalo_verificacao
+        self._trava = threading.Lock()
+        self._produtos: Dict[int, ProdutoEmCache] = {}
+        self._guias: Dict[int, GuiaEmCache] = {}
+        self._versoes: Dict[str, int] = {}
+        self._proxima_verificacao = 0.0
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def produtos(self, db: Session, ids: Iterable[int]) -> Dict[int, ProdutoEmCache]:
+        # Devolve só os produtos que existem; quem chama compara com os IDs pedidos
+        self._verificar_versoes(db)
+        ids = set(ids)
+
+        with self._trava:
+            encontrados = {i: self._produtos[i] for i in ids if i in self._produtos}
+            faltando = ids - encontrados.keys()
+            self.acertos += len(encontrados)
+            self.falhas += len(faltando)
+
+        if faltando:
+            linhas = db.query(
+                models.Produto.id, models.Produto.preco_centavos, models.Produto.ativo, models.Produto.nome
+            ).filter(models.Produto.id.in_(faltando)).all()
+            novos = {linha.id: ProdutoEmCache(linha.preco_centavos, linha.ativo, linha.nome) for linha in linhas}
+
+            with self._trava:
+                self._produtos.update(novos)
+            encontrados.update(novos)
+
+        return encontrados
+
+    def guias(self, db: Session, ids: Iterable[int]) -> Dict[int, GuiaEmCache]:
+        self._verificar_versoes(db)
+        ids = set(ids)
+
+        with self._trava:
+            encontrados = {i: self._guias[i] for i in ids if i in self._guias}
+            faltando = ids - encontrados.keys()
+            self.acertos += len(encontrados)
+            self.falhas += len(faltando)
+
+        if faltando:
+            linhas = db.query(models.Guia.id, models.Guia.ativo, models.Guia.nome, models.Guia.telefone).filter(
+                models.Guia.id.in_(faltando)
+            ).all()
+            novos = {linha.id: GuiaEmCache(linha.ativo, linha.nome, linha.telefone) for linha in linhas}
+
+            with self._trava:
+                self._guias.update(novos)
+            encontrados.update(novos)
+
+        return encontrados
+
+    def guia(self, db: Session, guia_id: int) -> Optional[GuiaEmCache]:
+        return self.guias(db, [guia_id]).get(guia_id)
+
+    def invalidar(self, tabela: str):
+        with self._trava:
+            if tabela == "produtos":
+                self._produtos.clear()
+            elif tabela == "guias":
+                self._guias.clear()
+            self.invalidacoes += 1
+            # Na próxima leitura confiro as versões de novo, para não reaproveitar dado carregado
+            # por outra requisição enquanto esta alteração ainda não tinha sido confirmada
+            self._proxima_verificacao = 0.0
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "invalidacoes": self.invalidacoes,
+                "produtos_em_cache": len(self._produtos),
+                "guias_em_cache": len(self._guias),
+                "versoes": dict(self._versoes),
+            }
+
+    def _verificar_versoes(self, db: Session):
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return
+
+        versoes = dict(db.query(models.VersaoCatalogo.tabela, models.VersaoCatalogo.versao).all())
+
+        with self._trava:
+            # Época nova (banco restaurado, por exemplo): as versões podem ter voltado para trás
+            epoca_mudou = versoes.get(models.EPOCA) != self._versoes.get(models.EPOCA)
+            if epoca_mudou or versoes.get("produtos") != self._versoes.get("produtos"):
+                self._produtos.clear()
+            if epoca_mudou or versoes.get("guias") != self._versoes.get("guias"):
+                self._guias.clear()
+            self._versoes = versoes
+            self._proxima_verificacao = agora + self.intervalo_verificacao
+
+
+catalogo_cache = CatalogoCache(intervalo_verificacao=configuracoes.catalogo_cache_intervalo)
+
+
+@registro.coletor
+def _metricas_cache():
+    estatisticas = catalogo_cache.estatisticas()
+    linhas = []
+    for nome, descricao in (
+        ("acertos", "Consultas ao catálogo atendidas pelo cache"),
+        ("falhas", "Consultas ao catálogo que precisaram ir ao banco"),
+        ("invalidacoes", "Vezes que o cache do catálogo foi limpo"),
+    ):
+        metrica = f"turismo_catalogo_cache_{nome}_total"
+        linhas += [f"# HELP {metrica} {descricao}", f"# TYPE {metrica} counter", f"{metrica} {estatisticas[nome]}"]
+    return linhas
@@ -0,0 +1,49 @@
+"""
+Comandos de manutenção da Turismo API.
+
+Uso:
+    python -m app.cli reconstruir-resumos
+    python -m app.cli renovar-epoca
+"""
+import argparse
+from app.cache import renovar_epoca
+from app.database import SessionLocal
+from app.services.resumos_service import ResumoService
+
+
+def reconstruir_resumos(args):
+    db = SessionLocal()
+    try:
+        linhas = ResumoService().reconstruir(db)
+        print(f'Resumo diário reconstruído: {linhas} linha(s) de dia/guia.')
+    finally:
+        db.close()
+
+
+def renovar_epoca_catalogo(args):
+    db = SessionLocal()
+    try:
+        epoca = renovar_epoca(db)
+        db.commit()
+        print(f'Nova época do catálogo: {epoca}. As ETags entregues antes deixam de valer.')
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Comandos de manutenção da Turismo API")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    comandos.add_parser(
+        "reconstruir-resumos", help="Recalcula a tabela resumo_diario a partir das visitas"
+    ).set_defaults(executar=reconstruir_resumos)
+    comandos.add_parser(
+        "renovar-epoca", help="Sorteia outra época para o catálogo (use depois de restaurar um backup)"
+    ).set_defaults(executar=renovar_epoca_catalogo)
+
+    args = parser.parse_args(argv)
+    args.executar(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+from typing import Dict, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _ligado(valor: str) -> bool:
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def _limite(valor: str) -> Tuple[float, int]:
+    # "taxa:rajada" -> requisições por segundo e quantas podem chegar de uma vez
+    taxa, _, rajada = valor.strip().partition(":")
+    return float(taxa), int(rajada or max(1, float(taxa)))
+
+
+def _lista(valor: str, separador: str) -> Dict[str, str]:
+    # "a=1,b=2" -> {"a": "1", "b": "2"}, ignorando espaços e itens vazios
+    pares = (item.split(separador, 1) for item in valor.split(",") if item.strip())
+    return {nome.strip(): conteudo.strip() for nome, conteudo in pares}
+
+
+class Configuracoes:
+    """
+    Configurações da API lidas das variáveis de ambiente (ou do arquivo .env).
+    Os valores padrão servem para rodar localmente com SQLite.
+    """
+
+    def __init__(self):
+        # ----------> BANCO DE DADOS
+        self.database_url = os.getenv("DATABASE_URL", "sqlite:///./turismo_api.db")
+
+        # Modo assíncrono (AsyncSession). Com DB_ASYNC=false a API volta a usar sessões
+        # síncronas rodando no threadpool. Se DATABASE_ASYNC_URL não for informada, ela é
+        # derivada de DATABASE_URL trocando o driver (ex.: sqlite -> sqlite+aiosqlite)
+        self.db_async = _ligado(os.getenv("DB_ASYNC", "true"))
+        self.database_async_url = os.getenv("DATABASE_ASYNC_URL")
+
+        # Lado da leitura (GETs e relatórios), com engine e pool separados dos de quem grava.
+        # No SQLite as conexões de leitura abrem o mesmo arquivo com PRAGMA query_only; em outros
+        # bancos, DATABASE_READ_URL pode apontar para uma réplica (sem ela, usa DATABASE_URL)
+        self.db_leitura_separada = _ligado(os.getenv("DB_LEITURA_SEPARADA", "true"))
+        self.database_read_url = os.getenv("DATABASE_READ_URL") or None
+
+        # Pool de conexões (ignorado para SQLite em memória, que usa uma conexão só)
+        self.db_pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.db_pool_max_overflow = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+        self.db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+        self.db_leitura_pool_size = int(os.getenv("DB_LEITURA_POOL_SIZE", str(self.db_pool_size)))
+        self.db_leitura_pool_max_overflow = int(os.getenv("DB_LEITURA_POOL_MAX_OVERFLOW", str(self.db_pool_max_overflow)))
+
+        # PRAGMAs aplicados em cada conexão SQLite. WAL deixa leituras e escrita acontecerem
+        # ao mesmo tempo e, com synchronous=NORMAL, o commit não espera o fsync a cada transação
+        self.sqlite_journal_mode = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+        self.sqlite_synchronous = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+        self.sqlite_busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        # Valor negativo = tamanho em KiB (aqui, 64 MiB de cache de páginas por conexão)
+        self.sqlite_cache_size = int(os.getenv("SQLITE_CACHE_SIZE", "-64000"))
+        self.sqlite_mmap_size = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+        self.sqlite_temp_store = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+        # ----------> CACHE
+        self.catalogo_cache_intervalo = float(os.getenv("CATALOGO_CACHE_INTERVALO", "2"))
+
+        # ----------> LISTAGENS
+        # Caminho rápido das listagens (guias, produtos, visitas e ranking): monta as linhas
+        # direto das colunas e serializa com orjson, sem passar pelo Pydantic. Desligado por padrão
+        self.listagem_rapida = _ligado(os.getenv("LISTAGEM_RAPIDA", "false"))
+
+        # ----------> PAINEL AO VIVO
+        # Produtos no top do painel, segundos entre os pings de uma tela parada, intervalo mínimo
+        # entre dois eventos para a mesma tela (publicações nesse meio saem juntas) e de quanto
+        # em quanto tempo os totais são relidos do banco (para ver o que outros processos gravaram)
+        self.ao_vivo_top = int(os.getenv("AO_VIVO_TOP", "5"))
+        self.ao_vivo_heartbeat = float(os.getenv("AO_VIVO_HEARTBEAT", "15"))
+        self.ao_vivo_intervalo_minimo = float(os.getenv("AO_VIVO_INTERVALO_MINIMO", "1"))
+        self.ao_vivo_recarga = float(os.getenv("AO_VIVO_RECARGA", "60"))
+
+        # ----------> RELATÓRIOS EM SEGUNDO PLANO
+        # Pasta onde ficam o andamento e o resultado de cada relatório, por quanto tempo (segundos)
+        # um resultado é reaproveitado para o mesmo pedido e quantos processos rodam relatórios
+        self.relatorios_diretorio = os.getenv("RELATORIOS_DIRETORIO", "./relatorios")
+        self.relatorios_ttl = float(os.getenv("RELATORIOS_TTL", "600"))
+        self.relatorios_processos = int(os.getenv("RELATORIOS_PROCESSOS", "2"))
+
+        # ----------> LIMITES DE USO
+        # Chaves de API com nome, além da API_KEY_TURISMO (que se chama "padrao"): "caixa:chave1,bi:chave2"
+        self.api_keys = _lista(os.getenv("API_KEYS", ""), ":")
+
+        # Balde de fichas por chave e por classe de rota, no formato "taxa:rajada" (requisições por
+        # segundo e quantas podem chegar de uma vez). LIMITES_POR_CHAVE troca o de uma chave:
+        # "bi.relatorio=0.5:2,caixa.escrita=100:200"
+        self.limites_habilitados = _ligado(os.getenv("LIMITES_HABILITADOS", "true"))
+        self.limites = {
+            "escrita": _limite(os.getenv("LIMITE_ESCRITA", "50:100")),
+            "leitura": _limite(os.getenv("LIMITE_LEITURA", "20:60")),
+            "relatorio": _limite(os.getenv("LIMITE_RELATORIO", "0.5:3")),
+        }
+        self.limites_por_chave = {
+            tuple(nome.split(".", 1)): _limite(limite)
+            for nome, limite in _lista(os.getenv("LIMITES_POR_CHAVE", ""), "=").items()
+        }
+
+        # Relatórios atendidos ao mesmo tempo (no processo todo, somando as chaves), quantos podem
+        # esperar por uma vaga e por quantos segundos; além disso, a resposta é 503 na hora
+        self.limite_relatorios_simultaneos = int(os.getenv("LIMITE_RELATORIOS_SIMULTANEOS", "2"))
+        self.limite_relatorios_fila = int(os.getenv("LIMITE_RELATORIOS_FILA", "8"))
+        self.limite_relatorios_espera = float(os.getenv("LIMITE_RELATORIOS_ESPERA", "2"))
+
+        # ----------> PERFIL DE REQUISIÇÕES
+        # Nomes das chaves (ver API_KEYS) que podem pedir o perfil de uma requisição com o cabeçalho
+        # "X-Profile: 1". Vazio desliga o recurso (o middleware nem é instalado). Os perfis vão para
+        # PERFIL_DIRETORIO, com uma amostra das pilhas a cada PERFIL_INTERVALO_MS milissegundos
+        self.perfil_chaves = {nome.strip() for nome in os.getenv("PERFIL_CHAVES", "").split(",") if nome.strip()}
+        self.perfil_diretorio = os.getenv("PERFIL_DIRETORIO", "./perfis")
+        self.perfil_intervalo_ms = float(os.getenv("PERFIL_INTERVALO_MS", "1"))
+
+        # ----------> MÉTRICAS
+        # O endpoint de métricas fica aberto por padrão (o Prometheus normalmente acessa pela
+        # rede interna). Com METRICAS_TOKEN, passa a exigir "Authorization: Bearer <token>"
+        self.metricas_habilitadas = _ligado(os.getenv("METRICAS_HABILITADAS", "true"))
+        self.metricas_caminho = os.getenv("METRICAS_CAMINHO", "/metrics")
+        self.metricas_token = os.getenv("METRICAS_TOKEN") or None
+
+
+configuracoes = Configuracoes()
@@ -1,20 +1,232 @@
-from sqlalchemy import create_engine
+import logging
+from contextlib import asynccontextmanager
+from typing import Union
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+from app.config import configuracoes
+from app.metricas import instrumentar_engine, instrumentar_pools
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./turismo_api.db"
+logger = logging.getLogger("turismo_api")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+SQLALCHEMY_DATABASE_URL = configuracoes.database_url
+
+# Driver assíncrono usado para cada banco quando DATABASE_ASYNC_URL não é informada
+DRIVERS_ASSINCRONOS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+PRAGMAS_SQLITE = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store", "query_only")
+
+
+def _sqlite_em_memoria(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+    # Roda a cada conexão nova aberta pelo pool
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={configuracoes.sqlite_journal_mode}")
+    _aplicar_pragmas_conexao(cursor)
+    cursor.close()
+
+
+def _aplicar_pragmas_sqlite_leitura(dbapi_connection, connection_record):
+    # O journal_mode vale para o arquivo (quem define é o lado da escrita). O query_only faz o
+    # SQLite recusar qualquer escrita por esta conexão, então uma leitura nunca pega o lock de escrita
+    cursor = dbapi_connection.cursor()
+    _aplicar_pragmas_conexao(cursor)
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _aplicar_pragmas_conexao(cursor):
+    cursor.execute(f"PRAGMA synchronous={configuracoes.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={configuracoes.sqlite_busy_timeout_ms}")
+    cursor.execute(f"PRAGMA cache_size={configuracoes.sqlite_cache_size}")
+    cursor.execute(f"PRAGMA mmap_size={configuracoes.sqlite_mmap_size}")
+    cursor.execute(f"PRAGMA temp_store={configuracoes.sqlite_temp_store}")
+
+
+def _opcoes_engine(url, sem_pool: bool = False, assincrono: bool = False, leitura: bool = False) -> dict:
+    opcoes = {}
+
+    if url.get_backend_name() == "sqlite":
+        # O SQLite por padrão só deixa usar a conexão na thread que a criou
+        opcoes["connect_args"] = {"check_same_thread": False, "timeout": configuracoes.sqlite_busy_timeout_ms / 1000}
+
+    if url.get_backend_name() == "postgresql" and leitura:
+        # Transações somente leitura por padrão (numa réplica já seria assim; no primário, protege)
+        if url.get_driver_name() == "asyncpg":
+            opcoes["connect_args"] = {"server_settings": {"default_transaction_read_only": "on"}}
+        else:
+            opcoes["connect_args"] = {"options": "-c default_transaction_read_only=on"}
+
+    if url.get_backend_name() == "sqlite" and _sqlite_em_memoria(url):
+        # Banco em memória só existe enquanto a conexão existe, então todos usam a mesma
+        opcoes["poolclass"] = StaticPool
+    elif sem_pool:
+        opcoes["poolclass"] = NullPool
+    else:
+        opcoes.update(
+            pool_size=configuracoes.db_leitura_pool_size if leitura else configuracoes.db_pool_size,
+            max_overflow=configuracoes.db_leitura_pool_max_overflow if leitura else configuracoes.db_pool_max_overflow,
+            pool_timeout=configuracoes.db_pool_timeout,
+            pool_recycle=configuracoes.db_pool_recycle,
+            pool_pre_ping=url.get_backend_name() != "sqlite",
+        )
+        if assincrono:
+            opcoes["poolclass"] = AsyncAdaptedQueuePool
+
+    return opcoes
+
+
+def criar_engine(url: str = None, sem_pool: bool = False, leitura: bool = False):
+    """
+    Cria o engine a partir das configurações. Também é usado pelo Alembic (com sem_pool=True),
+    para as migrations rodarem com o mesmo banco e os mesmos ajustes da API. Com leitura=True,
+    as conexões recusam escritas e o pool usa os tamanhos DB_LEITURA_*.
+    """
+    url = make_url(url or SQLALCHEMY_DATABASE_URL)
+    novo_engine = create_engine(url, **_opcoes_engine(url, sem_pool=sem_pool, leitura=leitura))
+
+    if url.get_backend_name() == "sqlite":
+        event.listen(novo_engine, "connect", _aplicar_pragmas_sqlite_leitura if leitura else _aplicar_pragmas_sqlite)
+
+    return novo_engine
+
+
+def criar_engine_assincrono(url: str = None, leitura: bool = False):
+    url = make_url(url or configuracoes.database_async_url or SQLALCHEMY_DATABASE_URL)
+    if "+" not in url.drivername and url.get_backend_name() in DRIVERS_ASSINCRONOS:
+        url = url.set(drivername=DRIVERS_ASSINCRONOS[url.get_backend_name()])
+
+    novo_engine = create_async_engine(url, **_opcoes_engine(url, assincrono=True, leitura=leitura))
+
+    # Os eventos ficam no engine síncrono que existe por baixo do assíncrono
+    if url.get_backend_name() == "sqlite":
+        event.listen(
+            novo_engine.sync_engine, "connect", _aplicar_pragmas_sqlite_leitura if leitura else _aplicar_pragmas_sqlite
+        )
+
+    return novo_engine
+
+
+def _ler_pragmas_sqlite(conexao) -> dict:
+    return {pragma: conexao.exec_driver_sql(f"PRAGMA {pragma}").scalar() for pragma in PRAGMAS_SQLITE}
+
+
+async def descrever_engine(engine_alvo) -> dict:
+    """
+    Mostra a configuração que realmente está valendo: para o SQLite, os PRAGMAs são lidos
+    de volta da conexão (se o banco recusar algum valor, aparece aqui o que ele aceitou).
+    Aceita o engine assíncrono, que é o que atende as requisições no modo assíncrono.
+    """
+    pool = engine_alvo.pool
+    descricao = {
+        "url": engine_alvo.url.render_as_string(hide_password=True),
+        "pool": pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        # O AsyncAdaptedQueuePool também é um QueuePool; o máximo de extras não tem acessor público
+        descricao.update(pool_size=pool.size(), max_overflow=pool._max_overflow, pool_timeout=pool.timeout())
+
+    if engine_alvo.dialect.name == "sqlite":
+        if isinstance(engine_alvo, AsyncEngine):
+            async with engine_alvo.connect() as conexao:
+                descricao.update(await conexao.run_sync(_ler_pragmas_sqlite))
+        else:
+            with engine_alvo.connect() as conexao:
+                descricao.update(_ler_pragmas_sqlite(conexao))
+
+    return descricao
+
+
+engine = criar_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Um banco SQLite em memória não pode ser aberto por dois engines (cada um veria um banco
+# diferente), então nesse caso fico só com o modo síncrono
+USAR_ASYNC = configuracoes.db_async and not (
+    engine.dialect.name == "sqlite" and _sqlite_em_memoria(engine.url)
+)
+
+async_engine = criar_engine_assincrono() if USAR_ASYNC else None
+
+# Lado da leitura (GETs e relatórios): engine e pool próprios, para uma leitura longa não
+# ocupar as conexões de quem grava. Pelo mesmo motivo do modo assíncrono, um SQLite em
+# memória fica com um engine só
+LEITURA_SEPARADA = configuracoes.db_leitura_separada and not (
+    engine.dialect.name == "sqlite" and _sqlite_em_memoria(engine.url)
+)
+
+if LEITURA_SEPARADA:
+    engine_leitura = criar_engine(configuracoes.database_read_url, leitura=True)
+    async_engine_leitura = (
+        criar_engine_assincrono(configuracoes.database_read_url, leitura=True) if USAR_ASYNC else None
+    )
+else:
+    engine_leitura, async_engine_leitura = engine, async_engine
+
+SessionLocalLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+
+# Engines de cada lado, para as métricas e o log de inicialização
+ENGINES = {"escrita": async_engine or engine}
+if LEITURA_SEPARADA:
+    ENGINES["leitura"] = async_engine_leitura or engine_leitura
+
+# Contagem e tempo das consultas para o /metrics (e para a lista de consultas dos perfis)
+if configuracoes.metricas_habilitadas or configuracoes.perfil_chaves:
+    instrumentar_engine(engine)
+    if async_engine is not None:
+        instrumentar_engine(async_engine.sync_engine)
+    if LEITURA_SEPARADA:
+        instrumentar_engine(engine_leitura)
+        if async_engine_leitura is not None:
+            instrumentar_engine(async_engine_leitura.sync_engine)
+    instrumentar_pools(ENGINES)
+
+# expire_on_commit=False: depois do commit os objetos continuam legíveis sem voltar ao banco,
+# o que no modo assíncrono é obrigatório (não existe lazy load fora do run_sync)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if USAR_ASYNC else None
+)
+AsyncSessionLocalLeitura = (
+    async_sessionmaker(async_engine_leitura, autoflush=False, expire_on_commit=False) if USAR_ASYNC else None
+)
+
+# Tipo da sessão entregue pelo get_db: AsyncSession no modo assíncrono, Session no síncrono
+SessaoBanco = Union[AsyncSession, Session]
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+@asynccontextmanager
+async def abrir_sessao(leitura: bool = False):
+    """
+    Abre uma sessão do tipo certo para o modo em vigor, para quem precisa do banco fora de uma
+    dependência do FastAPI (por exemplo, o painel ao vivo, que não segura sessão enquanto transmite).
+    """
+    if USAR_ASYNC:
+        async with (AsyncSessionLocalLeitura if leitura else AsyncSessionLocal)() as db:
+            yield db
+    else:
+        db = (SessionLocalLeitura if leitura else SessionLocal)()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def get_db():
+    async with abrir_sessao() as db:
+        yield db
+
+async def get_read_db():
+    # Sessão do lado da leitura, para os GETs e relatórios (não aceita escrita)
+    async with abrir_sessao(leitura=True) as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
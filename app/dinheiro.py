@@ -0,0 +1,38 @@
+"""
+Conversão de valores em dinheiro.
+
+No banco, todo valor monetário é guardado em centavos (inteiro), para as somas serem exatas
+e feitas pelo próprio banco. A API continua recebendo e devolvendo reais; a conversão
+acontece só na entrada (schemas -> services) e na saída (services -> respostas).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional
+from sqlalchemy import Float, cast
+
+
+def para_centavos(reais) -> Optional[int]:
+    # Passo pelo texto do float (e não pelo valor binário) para 0.1 + 0.2 virar 30, e não 30.000000000000004.
+    # Frações de centavo são arredondadas para o centavo mais próximo (meio centavo para cima)
+    if reais is None:
+        return None
+    return int((Decimal(str(reais)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def dividir_centavos(centavos: int, divisor: int) -> int:
+    # Divisão arredondada para o centavo com a mesma regra do para_centavos (meio centavo para
+    # cima); o round() do Python arredondaria 3000.5 para 3000, o par mais próximo
+    return int((Decimal(centavos) / divisor).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def para_reais(centavos) -> Optional[float]:
+    # A divisão de um inteiro por 100 dá o float mais próximo do valor exato (12.34, e não 12.3399...)
+    if centavos is None:
+        return None
+    return centavos / 100
+
+
+def em_reais(coluna):
+    """
+    Mesma conversão, mas dentro da consulta SQL (usada na exportação, que não passa pelos schemas).
+    """
+    return cast(coluna, Float) / 100
@@ -0,0 +1,36 @@
+"""
+Respostas condicionais (ETag / If-None-Match) para listagens que mudam pouco.
+"""
+from typing import Optional
+from fastapi import Response
+
+
+def gerar_etag(*partes) -> str:
+    # ETag forte: o mesmo valor só é gerado para exatamente o mesmo conteúdo
+    return '"' + "-".join(str(parte) for parte in partes) + '"'
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara o If-None-Match do cliente com a ETag atual. O cabeçalho pode trazer várias ETags
+    separadas por vírgula ou '*'; pela RFC 9110 a comparação aqui é a fraca (ignora o 'W/').
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(
+        candidata.strip().removeprefix("W/") == etag
+        for candidata in if_none_match.split(",")
+    )
+
+
+def cabecalhos_etag(etag: str) -> dict:
+    # no-cache: o cliente pode guardar a resposta, mas precisa revalidar antes de usar
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def nao_modificado(etag: str) -> Response:
+    return Response(status_code=304, headers=cabecalhos_etag(etag))
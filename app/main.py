@@ -1,15 +1,66 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import guias, visitas, produtos
+from app.admissao import MiddlewareAdmissao, controle_admissao
+from app.config import configuracoes
+from app.database import ENGINES, LEITURA_SEPARADA, USAR_ASYNC, async_engine, async_engine_leitura, descrever_engine
+from app.metricas import MiddlewareMetricas
+from app.perfil import MiddlewarePerfil
+from app.relatorios import gerenciador_relatorios
+from app.routers import guias, visitas, produtos, diagnostico, metricas, relatorios
+
+logger = logging.getLogger("turismo_api")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mostro no log a configuração do banco que realmente entrou em vigor, de cada engine que
+    # atende as requisições (no modo assíncrono, o assíncrono)
+    modo = "assíncrono" if USAR_ASYNC else "síncrono"
+    for lado, engine_do_lado in ENGINES.items():
+        logger.info("Banco de dados (%s, modo %s): %s", lado, modo, await descrever_engine(engine_do_lado))
+    yield
+
+    gerenciador_relatorios.encerrar()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if LEITURA_SEPARADA and async_engine_leitura is not None:
+        await async_engine_leitura.dispose()
 
 app = FastAPI(
     title="Turismo API",
     description="API para gestão de faturamento turístico e controle de guias.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.include_router(guias.router)
 app.include_router(visitas.router)
 app.include_router(produtos.router)
+app.include_router(relatorios.router)
+app.include_router(diagnostico.router)
+
+# Perfil sob demanda (X-Profile); o mais interno, para medir só a requisição. Sem chaves
+# configuradas nem é instalado
+if configuracoes.perfil_chaves:
+    app.add_middleware(
+        MiddlewarePerfil,
+        chaves=configuracoes.perfil_chaves,
+        diretorio=configuracoes.perfil_diretorio,
+        intervalo_ms=configuracoes.perfil_intervalo_ms,
+    )
+
+# Limites de uso por chave; adicionado antes do de métricas para as recusas aparecerem nelas
+app.add_middleware(MiddlewareAdmissao, controle=controle_admissao)
+
+if configuracoes.metricas_habilitadas:
+    # O próprio /metrics fica de fora, para a coleta não aparecer nas métricas
+    app.add_middleware(MiddlewareMetricas, ignorar=[configuracoes.metricas_caminho])
+    app.include_router(metricas.router)
 
 @app.get("/", tags=["Home"])
 def home():
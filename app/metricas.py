@@ -0,0 +1,301 @@
+"""
+Métricas da API no formato de texto do Prometheus.
+
+O middleware mede cada requisição (latência, status, requisições em andamento) agrupando
+pelo modelo da rota (/visitas/{visita_id}, e não /visitas/42), e os eventos do SQLAlchemy
+contam as consultas e o tempo de banco de cada requisição.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# Esperar por uma conexão livre normalmente leva microssegundos; os buckets começam bem abaixo dos da latência
+BUCKETS_ESPERA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self._trava = threading.Lock()
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, *rotulos, valor: float = 1.0):
+        with self._trava:
+            self._valores[rotulos] = self._valores.get(rotulos, 0.0) + valor
+
+    def exportar(self) -> List[str]:
+        with self._trava:
+            itens = list(self._valores.items())
+        return self._cabecalho() + [f"{self.nome}{_rotulos(self.rotulos, r)} {v}" for r, v in itens]
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, *rotulos, valor: float = 1.0):
+        with self._trava:
+            self._valores[rotulos] = self._valores.get(rotulos, 0.0) + valor
+
+    def dec(self, *rotulos, valor: float = 1.0):
+        self.inc(*rotulos, valor=-valor)
+
+    def definir(self, *rotulos, valor: float):
+        with self._trava:
+            self._valores[rotulos] = valor
+
+    def exportar(self) -> List[str]:
+        with self._trava:
+            itens = list(self._valores.items())
+        return self._cabecalho() + [f"{self.nome}{_rotulos(self.rotulos, r)} {v}" for r, v in itens]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, rotulos=(), buckets: Iterable[float] = BUCKETS_SEGUNDOS):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # rótulos -> [contagem por bucket (não acumulada), soma, total]
+        self._series: Dict[Tuple, list] = {}
+
+    def observar(self, valor: float, *rotulos):
+        with self._trava:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * len(self.buckets), 0.0, 0]
+            for posicao, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][posicao] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self) -> List[str]:
+        with self._trava:
+            series = [(r, list(s[0]), s[1], s[2]) for r, s in self._series.items()]
+
+        linhas = self._cabecalho()
+        for rotulos, contagens, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                le = f'le="{limite}"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, rotulos, le)} {acumulado}")
+            le = 'le="+Inf"'
+            linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, rotulos, le)} {total}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {soma}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, rotulos)} {total}")
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: List[_Metrica] = []
+        # Funções chamadas na hora da exportação, para métricas que são lidas de outro lugar
+        # (por exemplo, o cache do catálogo), em vez de atualizadas a cada evento
+        self._coletores: List[Callable[[], Iterable[str]]] = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletor(self, funcao: Callable[[], Iterable[str]]):
+        self._coletores.append(funcao)
+        return funcao
+
+    def exportar(self) -> str:
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar())
+        for coletor in self._coletores:
+            linhas.extend(coletor())
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro()
+
+http_duracao = registro.registrar(Histograma(
+    "turismo_http_duracao_segundos", "Latência das requisições HTTP por rota", ("metodo", "rota")
+))
+http_respostas = registro.registrar(Contador(
+    "turismo_http_respostas_total", "Respostas HTTP por rota e status", ("metodo", "rota", "status")
+))
+http_em_andamento = registro.registrar(Medidor(
+    "turismo_http_requisicoes_em_andamento", "Requisições sendo atendidas agora"
+))
+db_consultas_por_requisicao = registro.registrar(Histograma(
+    "turismo_db_consultas_por_requisicao", "Quantidade de consultas SQL feitas em cada requisição",
+    ("metodo", "rota"), buckets=BUCKETS_CONSULTAS
+))
+db_tempo_por_requisicao = registro.registrar(Histograma(
+    "turismo_db_tempo_por_requisicao_segundos", "Tempo total gasto no banco em cada requisição", ("metodo", "rota")
+))
+db_consultas = registro.registrar(Contador(
+    "turismo_db_consultas_total", "Consultas SQL executadas (inclusive fora de requisições)"
+))
+db_tempo = registro.registrar(Contador(
+    "turismo_db_tempo_segundos_total", "Tempo total gasto em consultas SQL"
+))
+db_pool_espera = registro.registrar(Histograma(
+    "turismo_db_pool_espera_segundos", "Espera de cada sessão por uma conexão do pool, por lado (escrita ou leitura)",
+    ("lado",), buckets=BUCKETS_ESPERA
+))
+
+
+class EstatisticasBanco:
+    __slots__ = ("consultas", "tempo", "detalhes")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+        # Lista de (comando, duração) de cada consulta, só quando a requisição está sendo perfilada
+        self.detalhes: Optional[List[Tuple[str, float]]] = None
+
+
+# Estatísticas de banco da requisição atual (None fora de uma requisição)
+requisicao_atual: ContextVar[Optional[EstatisticasBanco]] = ContextVar("requisicao_atual", default=None)
+
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("turismo_inicio_consultas", []).append(time.perf_counter())
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("turismo_inicio_consultas")
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+
+    db_consultas.inc()
+    db_tempo.inc(valor=duracao)
+
+    estatisticas = requisicao_atual.get()
+    if estatisticas is not None:
+        estatisticas.consultas += 1
+        estatisticas.tempo += duracao
+        if estatisticas.detalhes is not None:
+            estatisticas.detalhes.append((statement, duracao))
+
+
+def instrumentar_engine(engine):
+    """
+    Liga a contagem de consultas no engine. Para um engine assíncrono, passe engine.sync_engine.
+    """
+    event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+    event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+
+
+def instrumentar_pools(engines: Dict[str, object]):
+    """
+    Métricas dos pools de cada lado ({"escrita": engine, "leitura": engine}; engines assíncronos
+    podem vir direto): conexões em uso e livres na hora da coleta e quanto cada sessão esperou
+    por uma conexão, do começo da transação até a conexão chegar.
+    """
+    lados = {getattr(engine, "sync_engine", engine): lado for lado, engine in engines.items()}
+
+    def _inicio_da_transacao(session, transacao):
+        if transacao.parent is None:
+            session.info["turismo_inicio_transacao"] = time.perf_counter()
+
+    def _conexao_recebida(session, transacao, conexao):
+        inicio = session.info.pop("turismo_inicio_transacao", None)
+        lado = lados.get(conexao.engine)
+        if inicio is not None and lado:
+            db_pool_espera.observar(time.perf_counter() - inicio, lado)
+
+    # Vale para toda sessão, inclusive a síncrona que existe por baixo de uma AsyncSession
+    event.listen(Session, "after_transaction_create", _inicio_da_transacao)
+    event.listen(Session, "after_begin", _conexao_recebida)
+
+    @registro.coletor
+    def _metricas_pools():
+        linhas = []
+        for nome, descricao, leitura in (
+            ("turismo_db_pool_em_uso", "Conexões do pool emprestadas agora", "checkedout"),
+            ("turismo_db_pool_livres", "Conexões abertas e livres no pool", "checkedin"),
+            ("turismo_db_pool_tamanho", "Conexões fixas do pool (fora as extras do overflow)", "size"),
+        ):
+            linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} gauge"]
+            for engine, lado in lados.items():
+                # StaticPool e NullPool (SQLite em memória, Alembic) não têm esses números
+                if hasattr(engine.pool, leitura):
+                    linhas.append(f'{nome}{{lado="{lado}"}} {getattr(engine.pool, leitura)()}')
+        return linhas
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI (sem BaseHTTPMiddleware, para não criar tarefas extras por requisição).
+    """
+
+    def __init__(self, app, ignorar: Iterable[str] = ()):
+        self.app = app
+        self.ignorar = set(ignorar)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.ignorar:
+            await self.app(scope, receive, send)
+            return
+
+        estatisticas = EstatisticasBanco()
+        token = requisicao_atual.set(estatisticas)
+        status = 500
+        inicio = time.perf_counter()
+        http_em_andamento.inc()
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            http_em_andamento.dec()
+            requisicao_atual.reset(token)
+
+            # O FastAPI guarda a rota encontrada no scope; sem ela (404) agrupo tudo junto
+            rota = scope.get("route")
+            caminho = getattr(rota, "path", "sem_rota")
+            metodo = scope["method"]
+
+            http_duracao.observar(duracao, metodo, caminho)
+            http_respostas.inc(metodo, caminho, str(status))
+            db_consultas_por_requisicao.observar(estatisticas.consultas, metodo, caminho)
+            db_tempo_por_requisicao.observar(estatisticas.tempo, metodo, caminho)
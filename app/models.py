@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+import secrets
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Date, Index, event, insert
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.busca import registrar_busca
 
 class Guia(Base):
     __tablename__ = "guias"
@@ -15,35 +17,67 @@ class Guia(Base):
     # Ligação para conseguir ver todas as visitas que este guia já fez
     visitas = relationship("Visita", back_populates="guia")
 
+    # Índice parcial só com os guias ativos (e as colunas da listagem), para a listagem com
+    # apenas_ativos e a validação das visitas não lerem os guias desativados
+    __table_args__ = (
+        Index(
+            "ix_guias_ativos", "id", "nome", "telefone", "ativo",
+            sqlite_where=ativo == True, postgresql_where=ativo == True,
+        ),
+    )
+
 class Visita(Base):
     __tablename__ = "visitas"
 
     id = Column(Integer, primary_key=True, index=True)
     qtd_turistas = Column(Integer)
-    valor_taxa_guia = Column(Float)
-    total_produtos = Column(Float, default=0.0)
+    # Valores em dinheiro ficam em centavos (inteiros) para as somas serem exatas; a conversão
+    # de/para reais fica em app/dinheiro.py
+    valor_taxa_guia_centavos = Column(Integer)
+    total_produtos_centavos = Column(Integer, default=0)
     # O server_default garante que a data seja gravada automaticamente no momento da criação
-    data_visita = Column(DateTime(timezone=True), server_default=func.now())
+    # O índice deixa os filtros por período (relatórios e listagem) lerem só o intervalo pedido
+    data_visita = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Chave estrangeira para saber qual guia fez a visita
-    guia_id = Column(Integer, ForeignKey("guias.id"), index=True)
+    guia_id = Column(Integer, ForeignKey("guias.id"))
     
     guia = relationship("Guia", back_populates="visitas")
     
     # O cascade="all, delete-orphan" serve para que, se eu apagar a visita, 
-    # os itens vendidos nela também sejam apagados automaticamente
-    itens = relationship("VisitaProduto", back_populates="visita", cascade="all, delete-orphan")
+    # os itens vendidos nela também sejam apagados automaticamente. Os itens vêm na ordem em que
+    # foram gravados (a mesma do caminho rápido da listagem), e não na ordem do índice que o banco usar
+    itens = relationship(
+        "VisitaProduto", back_populates="visita", cascade="all, delete-orphan", order_by="VisitaProduto.id"
+    )
+
+    # Faz o INSERT já devolver o id e a data gerada pelo banco, sem precisar de outro SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
+    # As visitas de um guia já saem do índice na ordem da paginação (data_visita, id), sem ordenar
+    # depois; o mesmo índice serve para a chave estrangeira
+    __table_args__ = (
+        Index("ix_visitas_guia_data", "guia_id", "data_visita"),
+    )
 
 class Produto(Base):
     __tablename__ = "produtos"
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String)
-    preco = Column(Float)
+    preco_centavos = Column(Integer)
     categoria = Column(String)
     # Usado para o "soft delete".
     ativo = Column(Boolean, default=True)
 
+    # Mesmo esquema dos guias: índice parcial com as colunas da listagem, só dos produtos ativos
+    __table_args__ = (
+        Index(
+            "ix_produtos_ativos", "id", "nome", "preco_centavos", "categoria", "ativo",
+            sqlite_where=ativo == True, postgresql_where=ativo == True,
+        ),
+    )
+
 class VisitaProduto(Base):
     """
     Esta tabela serve para ligar os produtos às visitas.
@@ -56,7 +90,63 @@ class VisitaProduto(Base):
     quantidade = Column(Integer, default=1)
     
     # Guardo o preço aqui para o faturamento não mudar se o preço do produto for alterado depois
-    preco_na_hora = Column(Float)
+    preco_na_hora_centavos = Column(Integer)
+    # quantidade * preco_na_hora_centavos, gravado junto com o item: o ranking soma esta coluna
+    # direto (e um índice com ela consegue responder a soma sem ler a tabela)
+    subtotal_centavos = Column(Integer)
 
     visita = relationship("Visita", back_populates="itens")
-    produto = relationship("Produto")
\ No newline at end of file
+    produto = relationship("Produto")
+
+    __table_args__ = (
+        # Itens de uma visita (carga dos itens, exclusão em cascata e a junção do ranking por
+        # período); com produto, quantidade e subtotal o ranking não precisa ler a tabela
+        Index("ix_visita_produtos_visita_vendas", "visita_id", "produto_id", "quantidade", "subtotal_centavos"),
+        # Ranking sem período: o GROUP BY produto_id lê o índice já agrupado, sem ordenar nem ler a tabela
+        Index("ix_visita_produtos_produto_vendas", "produto_id", "quantidade", "subtotal_centavos"),
+    )
+
+class ResumoDiario(Base):
+    """
+    Totais de cada dia por guia. É atualizada na mesma transação que grava as visitas,
+    então os relatórios somam poucas linhas por dia em vez de varrer todas as visitas.
+    """
+    __tablename__ = "resumo_diario"
+
+    dia = Column(Date, primary_key=True)
+    guia_id = Column(Integer, ForeignKey("guias.id"), primary_key=True)
+    qtd_visitas = Column(Integer, nullable=False, default=0)
+    qtd_turistas = Column(Integer, nullable=False, default=0)
+    # Somas de vários dias podem passar do limite de um Integer de 32 bits no PostgreSQL
+    total_taxas_centavos = Column(BigInteger, nullable=False, default=0)
+    total_produtos_centavos = Column(BigInteger, nullable=False, default=0)
+
+
+class VersaoCatalogo(Base):
+    """
+    Contador de versão de cada tabela do catálogo (produtos, guias). Toda alteração no
+    catálogo incrementa o contador, assim cada processo da API percebe quando o cache dele ficou velho.
+    """
+    __tablename__ = "catalogo_versoes"
+
+    tabela = Column(String, primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+
+
+# Linha especial da catalogo_versoes: um número sorteado quando o banco é criado. Ele entra nas
+# ETags junto com as versões, que recomeçam do zero num banco recriado
+EPOCA = "epoca"
+
+
+def nova_epoca() -> int:
+    return secrets.randbelow(2**31 - 1) + 1
+
+
+@event.listens_for(VersaoCatalogo.__table__, "after_create")
+def _sortear_epoca(tabela, conexao, **_):
+    conexao.execute(insert(tabela).values(tabela=EPOCA, versao=nova_epoca()))
+
+
+# Busca por nome (FTS5) do catálogo, criada e apagada junto com as tabelas; veja app/busca.py
+registrar_busca(Produto.__table__, ["nome"])
+registrar_busca(Guia.__table__, ["nome"])
@@ -0,0 +1,246 @@
+"""
+Perfil de uma requisição sob demanda (cabeçalho "X-Profile: 1", só para as chaves de PERFIL_CHAVES).
+
+Enquanto a requisição roda, uma thread tira amostras das pilhas de todas as threads do
+processo (a do loop, as do threadpool e as do aiosqlite), e os eventos do SQLAlchemy guardam
+cada consulta com a duração. No fim ficam dois arquivos em PERFIL_DIRETORIO:
+
+* <id>.json: tempo total, tempo de banco, lista das consultas e estimativas (pelas amostras)
+  do tempo de serialização da resposta e de montagem dos objetos do ORM;
+* <id>.folded: as pilhas no formato "quadro;quadro;quadro contagem", aceito pelo flamegraph.pl
+  e pelo speedscope.
+
+A resposta volta normal, com o resumo em Server-Timing (aparece no DevTools do navegador) e o
+ID do perfil em X-Profile-Id. Threads de outras requisições rodando ao mesmo tempo também
+entram nas amostras: o perfil é mais limpo num momento de pouco movimento.
+"""
+import json
+import linecache
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from app.admissao import _cabecalho
+from app.metricas import EstatisticasBanco, requisicao_atual
+from app.security import API_KEY_NAME, identificar_chave
+
+CABECALHO = b"x-profile"
+
+# Onde uma thread parada fica esperando (loop sem evento, worker sem tarefa): pelo arquivo do
+# quadro mais interno ou, quando a espera é numa função em C (a fila do aiosqlite, por exemplo),
+# pela chamada na linha em que ele está
+ARQUIVOS_OCIOSOS = ("selectors.py", "threading.py", "queue.py")
+CHAMADAS_OCIOSAS = (".get(", ".wait(", ".select(", ".acquire(")
+
+# Quadros que indicam serialização da resposta e montagem de objetos do ORM
+SERIALIZACAO = {"serialize_response", "jsonable_encoder", "render"}
+ORM = os.path.join("orm", "loading.py")
+
+
+class Amostrador(threading.Thread):
+    """
+    Tira uma amostra das pilhas de todas as threads (menos a própria) a cada 'intervalo' segundos.
+    """
+
+    def __init__(self, intervalo: float):
+        super().__init__(name="perfil-amostrador", daemon=True)
+        self.intervalo = intervalo
+        self.pilhas: Counter = Counter()
+        self.rodadas = 0
+        self._parar = threading.Event()
+        self._ociosas: Dict[tuple, bool] = {}
+
+    def start(self):
+        # Com o intervalo padrão de troca de threads do Python (5 ms), o amostrador só pegaria o
+        # GIL de tempos em tempos enquanto a requisição roda código Python; durante o perfil, a
+        # troca acontece no intervalo das amostras (vale para o processo todo, só nesse tempo)
+        self._troca_original = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._troca_original, self.intervalo))
+        super().start()
+
+    def run(self):
+        # A primeira amostra sai na hora, para requisições mais curtas que o intervalo
+        self._amostrar()
+        while not self._parar.wait(self.intervalo):
+            self._amostrar()
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        sys.setswitchinterval(self._troca_original)
+
+    def _ociosa(self, quadro) -> bool:
+        posicao = (quadro.f_code, quadro.f_lineno)
+        ociosa = self._ociosas.get(posicao)
+        if ociosa is None:
+            arquivo = quadro.f_code.co_filename
+            linha = linecache.getline(arquivo, quadro.f_lineno)
+            ociosa = self._ociosas[posicao] = (
+                os.path.basename(arquivo) in ARQUIVOS_OCIOSOS or any(chamada in linha for chamada in CHAMADAS_OCIOSAS)
+            )
+        return ociosa
+
+    def _amostrar(self):
+        self.rodadas += 1
+        for ident, quadro in sys._current_frames().items():
+            if ident == self.ident or self._ociosa(quadro):
+                continue
+            pilha = []
+            while quadro is not None:
+                pilha.append(quadro.f_code)
+                quadro = quadro.f_back
+            pilha.reverse()
+            self.pilhas[(ident, tuple(pilha))] += 1
+
+
+class MiddlewarePerfil:
+    """
+    Middleware ASGI dos perfis. Sem o cabeçalho X-Profile, só confere os cabeçalhos e segue.
+    """
+
+    def __init__(self, app, chaves: Set[str], diretorio: str, intervalo_ms: float):
+        self.app = app
+        self.chaves = chaves
+        self.diretorio = Path(diretorio)
+        self.intervalo = intervalo_ms / 1000
+        # Um perfil por vez: dois amostradores juntos misturariam as pilhas e dobrariam o custo
+        self._trava = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _pediu_perfil(scope):
+            await self.app(scope, receive, send)
+            return
+
+        chave = identificar_chave(_cabecalho(scope, API_KEY_NAME.lower().encode()))
+        if chave not in self.chaves:
+            # Quem não pode pedir perfil recebe a resposta normal, sem aviso
+            await self.app(scope, receive, send)
+            return
+
+        if not self._trava.acquire(blocking=False):
+            async def avisar_ocupado(mensagem):
+                if mensagem["type"] == "http.response.start":
+                    MutableHeaders(scope=mensagem)["X-Profile"] = "ocupado"
+                await send(mensagem)
+
+            await self.app(scope, receive, avisar_ocupado)
+            return
+
+        # A trava é liberada pelo _perfilar assim que o amostrador para, antes de gravar os arquivos
+        await self._perfilar(scope, receive, send, chave)
+
+    async def _perfilar(self, scope, receive, send, chave: str):
+        perfil_id = f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+        # Sem o middleware de métricas, as estatísticas de banco da requisição ficam por minha conta
+        estatisticas = requisicao_atual.get()
+        token = None
+        if estatisticas is None:
+            estatisticas = EstatisticasBanco()
+            token = requisicao_atual.set(estatisticas)
+        estatisticas.detalhes = consultas = []
+
+        status = 500
+        thread_do_loop = threading.get_ident()
+        amostrador = Amostrador(self.intervalo)
+        inicio_relogio = datetime.now(timezone.utc)
+        inicio = time.perf_counter()
+        try:
+            amostrador.start()
+        except BaseException:
+            self._trava.release()
+            raise
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                # Até aqui a resposta já foi montada e serializada; o resto é o envio do corpo
+                parcial = _resumo(amostrador, consultas, thread_do_loop, time.perf_counter() - inicio)
+                cabecalhos = MutableHeaders(scope=mensagem)
+                cabecalhos["X-Profile-Id"] = perfil_id
+                cabecalhos["Server-Timing"] = ", ".join(
+                    f"{nome};dur={parcial[campo]:.1f}"
+                    for nome, campo in (("total", "duracao_ms"), ("db", "banco_ms"), ("serializacao", "serializacao_ms"), ("orm", "orm_ms"))
+                )
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            amostrador.parar()
+            self._trava.release()
+            estatisticas.detalhes = None
+            if token is not None:
+                requisicao_atual.reset(token)
+
+            perfil = {
+                "id": perfil_id,
+                "metodo": scope["method"],
+                "caminho": scope["path"] + (f"?{scope['query_string'].decode('latin-1')}" if scope["query_string"] else ""),
+                "status": status,
+                "chave": chave,
+                "inicio": inicio_relogio.isoformat(),
+                **_resumo(amostrador, consultas, thread_do_loop, duracao),
+                "consultas": [{"sql": sql, "duracao_ms": round(tempo * 1000, 3)} for sql, tempo in consultas],
+                "arquivo_pilhas": f"{perfil_id}.folded",
+            }
+            await run_in_threadpool(self._gravar, perfil, _dobrar(amostrador.pilhas))
+
+    def _gravar(self, perfil: dict, pilhas: Iterable[str]):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        (self.diretorio / f"{perfil['id']}.folded").write_text("".join(f"{linha}\n" for linha in pilhas), encoding="utf-8")
+        (self.diretorio / f"{perfil['id']}.json").write_text(json.dumps(perfil, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _pediu_perfil(scope) -> bool:
+    valor = _cabecalho(scope, CABECALHO)
+    return valor is not None and valor not in ("", "0")
+
+
+def _resumo(amostrador: Amostrador, consultas: List, thread_do_loop: int, duracao: float) -> Dict:
+    # As estimativas contam as amostras da thread do loop (onde a resposta é serializada) e de
+    # qualquer thread montando objetos do ORM; cada amostra vale o tempo médio entre duas rodadas
+    por_rodada = duracao / max(amostrador.rodadas, 1)
+    serializacao = orm = 0
+    for (ident, pilha), quantidade in list(amostrador.pilhas.items()):
+        if ident == thread_do_loop and any(codigo.co_name in SERIALIZACAO for codigo in pilha):
+            serializacao += quantidade
+        if any(codigo.co_filename.endswith(ORM) for codigo in pilha):
+            orm += quantidade
+
+    return {
+        "duracao_ms": round(duracao * 1000, 3),
+        "banco_ms": round(sum(tempo for _, tempo in consultas) * 1000, 3),
+        "quantidade_consultas": len(consultas),
+        "serializacao_ms": round(serializacao * por_rodada * 1000, 3),
+        "orm_ms": round(orm * por_rodada * 1000, 3),
+        "amostras": amostrador.rodadas,
+        "intervalo_ms": round(amostrador.intervalo * 1000, 3),
+    }
+
+
+def _dobrar(pilhas: Counter) -> List[str]:
+    # Formato "dobrado" do flamegraph: a thread é a raiz e cada quadro vira "funcao (arquivo:linha)"
+    nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+    linhas = Counter()
+    for (ident, pilha), quantidade in pilhas.items():
+        quadros = [nomes.get(ident, f"thread-{ident}")] + [_quadro(codigo) for codigo in pilha]
+        linhas[";".join(quadros)] += quantidade
+    return [f"{linha} {quantidade}" for linha, quantidade in linhas.most_common()]
+
+
+def _quadro(codigo) -> str:
+    arquivo = codigo.co_filename
+    if "site-packages" in arquivo:
+        arquivo = arquivo.split("site-packages" + os.sep, 1)[-1]
+    elif arquivo.startswith(os.getcwd()):
+        arquivo = os.path.relpath(arquivo)
+    return f"{codigo.co_name} ({arquivo}:{codigo.co_firstlineno})".replace(";", ",")
@@ -0,0 +1,269 @@
+"""
+Relatórios em segundo plano (POST /relatorios/jobs).
+
+Relatórios de períodos longos podem levar vários segundos, tempo demais para segurar uma
+requisição (e o proxy na frente dela). Aqui eles rodam num pool de processos, com os mesmos
+services das rotas síncronas, e o andamento e o resultado de cada um ficam gravados em disco,
+num JSON por relatório. Como o disco é a fonte da verdade, qualquer processo da API consegue
+responder sobre um relatório, inclusive um que outro processo começou.
+
+O ID do relatório é derivado do tipo e dos parâmetros: o mesmo pedido feito de novo dentro
+do TTL devolve o relatório já pronto (ou o que ainda está rodando), sem executar outra vez.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from app.config import configuracoes
+from app.database import SessionLocalLeitura, _sqlite_em_memoria, engine
+from app.services.exportacao_service import FORMATOS, ExportacaoService
+from app.services.produtos_service import ProdutoService
+from app.services.visitas_service import VisitaService
+
+logger = logging.getLogger("turismo_api")
+
+# Parâmetros que fazem diferença em cada tipo (os outros são ignorados, e não mudam o ID)
+TIPOS = {
+    "resumo": ("data_inicio", "data_fim"),
+    "ranking": ("data_inicio", "data_fim", "top", "categoria", "apenas_ativos", "ordenar_por"),
+    "exportacao": ("data_inicio", "data_fim", "formato"),
+}
+
+# Intervalo mínimo entre duas gravações do andamento no disco
+INTERVALO_PROGRESSO = 0.5
+
+
+def _agora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def identificador(tipo: str, parametros: dict) -> str:
+    bruto = json.dumps([tipo, parametros], sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode()).hexdigest()[:24]
+
+
+def _caminho(diretorio: Path, job_id: str) -> Path:
+    return diretorio / f"{job_id}.json"
+
+
+def ler_estado(diretorio: Path, job_id: str) -> Optional[dict]:
+    try:
+        return json.loads(_caminho(diretorio, job_id).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def gravar_estado(diretorio: Path, estado: dict):
+    # Grava num arquivo temporário e troca de uma vez: quem lê nunca vê um JSON pela metade
+    destino = _caminho(diretorio, estado["id"])
+    temporario = destino.with_name(f"{destino.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    temporario.write_text(json.dumps(estado, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(temporario, destino)
+
+
+def executar_job(diretorio: str, job_id: str):
+    """
+    Roda no processo do pool: executa o relatório pelos services e grava o andamento e o
+    resultado no disco. Erros também vão para o disco; nada volta pelo retorno.
+    """
+    pasta = Path(diretorio)
+    estado = ler_estado(pasta, job_id)
+    if estado is None:
+        return
+
+    estado.update(status="executando", progresso=0, atualizado_em=_agora().isoformat())
+    gravar_estado(pasta, estado)
+
+    parametros = dict(estado["parametros"])
+    for campo in ("data_inicio", "data_fim"):
+        if parametros.get(campo):
+            parametros[campo] = datetime.fromisoformat(parametros[campo])
+
+    try:
+        if estado["tipo"] == "resumo":
+            with SessionLocalLeitura() as db:
+                estado["resultado"] = VisitaService().gerar_relatorio_filtrado(db, **parametros)
+        elif estado["tipo"] == "ranking":
+            with SessionLocalLeitura() as db:
+                estado["resultado"] = ProdutoService().listar_produtos_com_estatisticas(db, **parametros)
+        else:
+            estado["arquivo"], estado["nome_arquivo"] = _exportar(pasta, estado, parametros)
+    except HTTPException as erro:
+        estado.update(status="erro", erro=erro.detail)
+    except Exception:
+        logger.exception("Erro no relatório %s", job_id)
+        estado.update(status="erro", erro="Erro interno ao gerar o relatório.")
+    else:
+        estado.update(status="concluido", progresso=100)
+
+    agora = _agora()
+    estado.update(
+        atualizado_em=agora.isoformat(),
+        concluido_em=agora.isoformat(),
+        expira_em=(agora + timedelta(seconds=estado["ttl"])).isoformat(),
+    )
+    gravar_estado(pasta, estado)
+
+
+def _exportar(pasta: Path, estado: dict, parametros: dict) -> Tuple[str, str]:
+    servico = ExportacaoService()
+    formato = parametros.pop("formato")
+    total = servico.contar_linhas(**parametros) or 1
+    lidas = 0
+    proxima_gravacao = 0.0
+
+    def progresso(linhas: int):
+        nonlocal lidas, proxima_gravacao
+        lidas += linhas
+        if time.monotonic() >= proxima_gravacao:
+            # Nunca 100 antes do arquivo estar fechado
+            estado.update(progresso=min(99, lidas * 100 // total), atualizado_em=_agora().isoformat())
+            gravar_estado(pasta, estado)
+            proxima_gravacao = time.monotonic() + INTERVALO_PROGRESSO
+
+    conteudo, _, nome_arquivo = servico.exportar_vendas(formato, progresso=progresso, **parametros)
+
+    destino = pasta / f"{estado['id']}.{FORMATOS[formato][1]}"
+    parcial = destino.with_name(f"{destino.name}.parcial")
+    with open(parcial, "wb") as arquivo:
+        for parte in conteudo:
+            arquivo.write(parte.encode() if isinstance(parte, str) else parte)
+    os.replace(parcial, destino)
+
+    return destino.name, nome_arquivo
+
+
+class GerenciadorRelatorios:
+    def __init__(self, diretorio: str, ttl: float, processos: int, usar_processos: bool = True):
+        self.diretorio = Path(diretorio)
+        self.ttl = ttl
+        self.processos = processos
+        self.usar_processos = usar_processos
+        self._trava = threading.Lock()
+        self._executor: Optional[Executor] = None
+        # Relatórios deste processo que ainda estão no pool
+        self._em_andamento = set()
+        self._proxima_limpeza = 0.0
+
+    def enfileirar(self, tipo: str, parametros: dict) -> Tuple[dict, bool]:
+        """
+        Coloca o relatório na fila, a não ser que o mesmo pedido já esteja pronto (e dentro do
+        TTL) ou rodando. Devolve o estado do relatório e se ele acabou de entrar na fila.
+        """
+        parametros = {nome: parametros.get(nome) for nome in TIPOS[tipo]}
+        if parametros["data_inicio"] and parametros["data_fim"] and parametros["data_inicio"] > parametros["data_fim"]:
+            raise HTTPException(status_code=400, detail='A data de início não pode ser depois da data de fim.')
+        parametros = {nome: valor.isoformat() if isinstance(valor, datetime) else valor for nome, valor in parametros.items()}
+
+        job_id = identificador(tipo, parametros)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+
+        with self._trava:
+            self._limpar_expirados()
+
+            estado = ler_estado(self.diretorio, job_id)
+            if estado and self._aproveitavel(estado):
+                return estado, False
+
+            agora = _agora().isoformat()
+            estado = {
+                "id": job_id, "tipo": tipo, "parametros": parametros, "status": "pendente", "progresso": 0,
+                "ttl": self.ttl, "criado_em": agora, "atualizado_em": agora,
+            }
+            gravar_estado(self.diretorio, estado)
+
+            futuro = self._pool().submit(executar_job, str(self.diretorio), job_id)
+            self._em_andamento.add(job_id)
+        futuro.add_done_callback(partial(self._ao_terminar, job_id))
+
+        return estado, True
+
+    def estado(self, job_id: str) -> Optional[dict]:
+        # O ID vira nome de arquivo: qualquer coisa fora do formato gerado aqui nem é procurada
+        if len(job_id) != 24 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        estado = ler_estado(self.diretorio, job_id)
+        # Vencido é como se não existisse, mesmo que a limpeza ainda não tenha apagado os arquivos
+        # (ela só roda dentro do enfileirar; apagar aqui, sem a trava, poderia levar junto um pedido novo)
+        if estado and estado.get("expira_em") and datetime.fromisoformat(estado["expira_em"]) <= _agora():
+            return None
+        return estado
+
+    def caminho_arquivo(self, estado: dict) -> Optional[Path]:
+        caminho = self.diretorio / estado["arquivo"] if estado.get("arquivo") else None
+        return caminho if caminho and caminho.exists() else None
+
+    def encerrar(self):
+        with self._trava:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if self.usar_processos:
+                # spawn: o processo novo começa limpo, sem herdar o loop, as threads e as conexões abertas do pai
+                self._executor = ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.processos, thread_name_prefix="relatorios")
+        return self._executor
+
+    def _aproveitavel(self, estado: dict) -> bool:
+        agora = _agora()
+        if estado["status"] == "concluido":
+            return datetime.fromisoformat(estado["concluido_em"]) + timedelta(seconds=self.ttl) > agora
+        if estado["status"] in ("pendente", "executando"):
+            # Rodando aqui, ou em outro processo que deu sinal de vida dentro do TTL
+            return estado["id"] in self._em_andamento or (
+                datetime.fromisoformat(estado["atualizado_em"]) + timedelta(seconds=self.ttl) > agora
+            )
+        return False
+
+    def _ao_terminar(self, job_id: str, futuro):
+        with self._trava:
+            self._em_andamento.discard(job_id)
+            erro = None if futuro.cancelled() else futuro.exception()
+            if erro is not None:
+                # O processo do relatório morreu sem gravar o erro (falta de memória, por exemplo);
+                # um pool quebrado não aceita mais nada, então o próximo pedido cria outro
+                logger.error("Relatório %s interrompido: %r", job_id, erro)
+                if self.usar_processos:
+                    self._executor = None
+
+        if erro is not None and (estado := ler_estado(self.diretorio, job_id)):
+            agora = _agora().isoformat()
+            estado.update(status="erro", erro="O relatório foi interrompido. Tente pedir de novo.", atualizado_em=agora, expira_em=agora)
+            gravar_estado(self.diretorio, estado)
+
+    def _limpar_expirados(self):
+        # Roda no máximo uma vez por minuto, dentro do enfileirar (chamado com a trava)
+        agora = time.monotonic()
+        if agora < self._proxima_limpeza:
+            return
+        self._proxima_limpeza = agora + 60
+
+        for caminho in self.diretorio.glob("*.json"):
+            estado = ler_estado(self.diretorio, caminho.stem)
+            if not estado or not estado.get("expira_em") or datetime.fromisoformat(estado["expira_em"]) > _agora():
+                continue
+            if estado.get("arquivo"):
+                (self.diretorio / estado["arquivo"]).unlink(missing_ok=True)
+            caminho.unlink(missing_ok=True)
+
+
+# Um processo separado não enxerga um SQLite em memória (os testes); nesse caso uso threads
+gerenciador_relatorios = GerenciadorRelatorios(
+    configuracoes.relatorios_diretorio,
+    ttl=configuracoes.relatorios_ttl,
+    processos=configuracoes.relatorios_processos,
+    usar_processos=not (engine.dialect.name == "sqlite" and _sqlite_em_memoria(engine.url)),
+)
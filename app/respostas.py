@@ -0,0 +1,16 @@
+"""
+Caminho rápido das listagens grandes (ligado com LISTAGEM_RAPIDA=true).
+
+Normalmente a listagem monta um schema do Pydantic por linha e o FastAPI valida e serializa
+tudo de novo pelo response_model. No caminho rápido o service já devolve dicionários montados
+a partir das colunas da consulta, no mesmo formato do schema, e a resposta é codificada direto
+com o orjson. O response_model continua declarado nas rotas, então o OpenAPI não muda.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class RespostaJSONRapida(JSONResponse):
+    def render(self, content) -> bytes:
+        # OPT_UTC_Z: datas em UTC saem com "Z", igual ao Pydantic
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from app.cache import catalogo_cache
+from app.security import validar_api_key
+
+router = APIRouter(
+    prefix="/diagnostico", 
+    tags=["Diagnóstico"], 
+    dependencies=[Depends(validar_api_key)]
+)
+
+@router.get("/cache", summary="Estatísticas do cache do catálogo")
+def estatisticas_cache():
+    """
+    Mostra os acertos e falhas do cache de produtos e guias usado no registro de visitas,
+    quantas invalidações aconteceram e as versões do catálogo que este processo conhece.
+    """
+    return catalogo_cache.estatisticas()
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, Path
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, Path, Query, Response
 from app import schemas
-from app.database import get_db
-from app.services.guias_service import GuiaService
-from typing import List
+from app.config import configuracoes
+from app.database import SessaoBanco, get_db, get_read_db
+from app.etag import cabecalhos_etag, etag_confere, nao_modificado
+from app.respostas import RespostaJSONRapida
+from app.services.guias_service import GuiaServiceAsync
+from typing import List, Literal, Optional
+from datetime import datetime
 from app.security import validar_api_key
 
 router = APIRouter(
@@ -12,52 +15,115 @@ router = APIRouter(
     dependencies=[Depends(validar_api_key)]
 )
 
-guia_service = GuiaService()
+guia_service = GuiaServiceAsync()
 
 @router.post("/", response_model=schemas.GuiaResponse, summary="Criar um novo guia")
-def criar_novo_guia(guia: schemas.GuiaCreate, db: Session = Depends(get_db)):
+async def criar_novo_guia(guia: schemas.GuiaCreate, db: SessaoBanco = Depends(get_db)):
     """
     Cadastra um guia no sistema. Por padrão, o guia é criado com o status 'ativo'.
     """
-    return guia_service.criar_guia(db, guia)
+    return await guia_service.criar_guia(db, guia)
 
 @router.get("/", response_model=List[schemas.GuiaResponse], summary="Listar guias cadastrados")
-def listar_todos_os_guias(apenas_ativos: bool = False, db: Session = Depends(get_db)):
+async def listar_todos_os_guias(
+    response: Response,
+    apenas_ativos: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: SessaoBanco = Depends(get_read_db)
+):
     """
     Retorna a lista de todos os guias. 
     Marque 'apenas_ativos' como verdadeiro para filtrar apenas guias disponíveis para novas visitas.
+    A resposta traz uma ETag: enviando ela no If-None-Match, a API responde 304 sem reler a
+    tabela enquanto nenhum guia for criado, alterado ou desativado.
+    """
+    # Leio a versão antes da lista: se alguém alterar no meio, a ETag antiga vai com a lista
+    # nova e o cliente só baixa de novo na próxima vez (o contrário deixaria dado velho preso)
+    etag = await guia_service.etag_listagem(db, apenas_ativos=apenas_ativos)
+    if etag_confere(if_none_match, etag):
+        return nao_modificado(etag)
+
+    if configuracoes.listagem_rapida:
+        guias = await guia_service.listar_guias_rapido(db, apenas_ativos=apenas_ativos)
+        return RespostaJSONRapida(guias, headers=cabecalhos_etag(etag))
+
+    response.headers.update(cabecalhos_etag(etag))
+    return await guia_service.listar_guias(db, apenas_ativos=apenas_ativos)
+
+# As rotas fixas (/busca, /desempenho) precisam vir antes de /{guia_id}, senão o nome
+# seria lido como um ID
+@router.get("/busca", response_model=List[schemas.GuiaResponse], summary="Buscar guias pelo nome")
+async def buscar_guias(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto digitado (pode ser só o começo das palavras)"),
+    limite: int = Query(10, ge=1, le=50, description="Quantidade máxima de guias"),
+    apenas_ativos: bool = True,
+    db: SessaoBanco = Depends(get_read_db)
+):
+    """
+    Busca guias pelo nome, do mesmo jeito que a busca de produtos: sem diferenciar acentos,
+    pelo começo das palavras e com os mais relevantes primeiro. Por padrão só os guias ativos aparecem.
     """
-    return guia_service.listar_guias(db, apenas_ativos=apenas_ativos)
+    return await guia_service.buscar_guias(db, q, limite=limite, apenas_ativos=apenas_ativos)
+
+@router.get("/desempenho", response_model=List[schemas.GuiaDesempenho], summary="Ver desempenho dos guias")
+async def ver_desempenho_dos_guias(
+    data_inicio: Optional[datetime] = Query(None, description="Data inicial para o filtro - (YYYY-MM-DD)"),
+    data_fim: Optional[datetime] = Query(None, description="Data final para o filtro - (YYYY-MM-DD)"),
+    top: Optional[int] = Query(None, ge=1, le=500, description="Quantidade de guias no resultado (padrão: todos)"),
+    apenas_ativos: bool = False,
+    ordenar_por: Literal["faturamento", "visitas", "turistas", "ticket_medio"] = Query(
+        "faturamento", description="Critério de ordenação"
+    ),
+    db: SessaoBanco = Depends(get_read_db)
+):
+    """
+    Mostra os números de cada guia no período: visitas, turistas, taxas, vendas de produtos,
+    ticket médio por turista e a data da última visita. Usa os mesmos filtros de data do relatório.
+    """
+    desempenho = await guia_service.desempenho_guias(
+        db,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        top=top,
+        apenas_ativos=apenas_ativos,
+        ordenar_por=ordenar_por,
+    )
+
+    # Mesmo esquema do ranking de produtos: os dicionários já têm os campos do schema
+    if configuracoes.listagem_rapida:
+        return RespostaJSONRapida(desempenho)
+
+    return desempenho
 
 @router.get("/{guia_id}", response_model=schemas.GuiaResponse, summary="Buscar guia por ID")
-def buscar_guia(
+async def buscar_guia(
     guia_id: int = Path(..., description="ID numérico do guia que deseja consultar"), 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_read_db)
 ):
     """
     Retorna as informações detalhadas de um guia específico.
     """
-    return guia_service.buscar_por_id(db, guia_id)
+    return await guia_service.buscar_por_id(db, guia_id)
 
 @router.put("/{guia_id}", response_model=schemas.GuiaResponse, summary="Atualizar dados de um guia")
-def atualizar_guia(
+async def atualizar_guia(
     guia_id: int = Path(..., description="ID do guia a ser atualizado"), 
     novos_dados: schemas.GuiaCreate = None, 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Permite alterar o nome, telefone ou status de atividade de um guia existente.
     """
-    return guia_service.atualizar_guia(db, guia_id, novos_dados)
+    return await guia_service.atualizar_guia(db, guia_id, novos_dados)
 
 @router.delete("/{guia_id}", summary="Desativar um guia")
-def desativar_guia(
+async def desativar_guia(
     guia_id: int = Path(..., description="É necessário informar o ID do guia na URL para desativá-lo"), 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Desativa o guia no sistema. 
     **Importante:** Os dados não são apagados permanentemente para preservar o histórico das visitas realizadas.
     """
-    guia_service.desativar_guia(db, guia_id)
+    await guia_service.desativar_guia(db, guia_id)
     return {"message": "Guia desativado com sucesso (os dados históricos foram preservados)"}
\ No newline at end of file
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.config import configuracoes
+from app.metricas import registro
+from app.security import validar_token_metricas
+
+router = APIRouter(tags=["Diagnóstico"], dependencies=[Depends(validar_token_metricas)])
+
+@router.get(configuracoes.metricas_caminho, include_in_schema=False)
+def metricas():
+    """
+    Métricas no formato de texto do Prometheus (latência por rota, status, consultas ao banco).
+    """
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, Path
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, Path, Query, Response
+from typing import List, Literal, Optional
+from datetime import datetime
 from app import schemas, models
-from app.database import get_db
-from app.services.produtos_service import ProdutoService
+from app.config import configuracoes
+from app.database import SessaoBanco, get_db, get_read_db
+from app.etag import cabecalhos_etag, etag_confere, nao_modificado
+from app.respostas import RespostaJSONRapida
+from app.services.produtos_service import ProdutoServiceAsync
 from app.security import validar_api_key
 
 router = APIRouter(
@@ -12,48 +15,102 @@ router = APIRouter(
     dependencies=[Depends(validar_api_key)]
 )
 
-produto_service = ProdutoService()
+produto_service = ProdutoServiceAsync()
 
 @router.post("/", response_model=schemas.ProdutoResponse, summary="Cadastrar novo produto")
-def cadastrar_produto(produto: schemas.ProdutoCreate, db: Session = Depends(get_db)):
+async def cadastrar_produto(produto: schemas.ProdutoCreate, db: SessaoBanco = Depends(get_db)):
     """
     Registra um novo produto no sistema com nome, preço e categoria.
     """
-    return produto_service.criar_produto(db, produto)
+    return await produto_service.criar_produto(db, produto)
 
 @router.get("/", response_model=List[schemas.ProdutoResponse], summary="Listar produtos")
-def listar_todos_os_produtos(apenas_ativos: bool = False, db: Session = Depends(get_db)):
+async def listar_todos_os_produtos(
+    response: Response,
+    apenas_ativos: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: SessaoBanco = Depends(get_read_db)
+):
     """
     Retorna a lista de produtos. Use o filtro 'apenas_ativos' para ocultar produtos desativados.
+    Com o If-None-Match igual à ETag recebida antes, a resposta é 304 enquanto o catálogo não mudar.
+    """
+    # A versão é lida antes da lista, pelo mesmo motivo explicado na listagem de guias
+    etag = await produto_service.etag_listagem(db, apenas_ativos=apenas_ativos)
+    if etag_confere(if_none_match, etag):
+        return nao_modificado(etag)
+
+    if configuracoes.listagem_rapida:
+        produtos = await produto_service.listar_produtos_rapido(db, apenas_ativos=apenas_ativos)
+        return RespostaJSONRapida(produtos, headers=cabecalhos_etag(etag))
+
+    response.headers.update(cabecalhos_etag(etag))
+    return await produto_service.listar_produtos(db, apenas_ativos=apenas_ativos)
+
+@router.get("/busca", response_model=List[schemas.ProdutoResponse], summary="Buscar produtos pelo nome")
+async def buscar_produtos(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto digitado (pode ser só o começo das palavras)"),
+    limite: int = Query(10, ge=1, le=50, description="Quantidade máxima de produtos"),
+    apenas_ativos: bool = True,
+    db: SessaoBanco = Depends(get_read_db)
+):
+    """
+    Busca produtos pelo nome, para o preenchimento automático do caixa. Ignora acentos
+    ("acai" acha "Açaí"), aceita o começo das palavras e devolve os mais relevantes primeiro.
+    Por padrão só os produtos ativos aparecem.
     """
-    return produto_service.listar_produtos(db, apenas_ativos=apenas_ativos)
+    return await produto_service.buscar_produtos(db, q, limite=limite, apenas_ativos=apenas_ativos)
 
 @router.put("/{produto_id}", response_model=schemas.ProdutoResponse, summary="Atualizar produto existente")
-def atualizar_produto(
+async def atualizar_produto(
     produto_id: int = Path(..., description="ID numérico do produto a ser editado"), 
     dados: schemas.ProdutoCreate = None, 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Atualiza as informações de um produto específico através do seu ID.
     """
-    return produto_service.atualizar_produto(db, produto_id, dados)
+    return await produto_service.atualizar_produto(db, produto_id, dados)
 
 @router.delete("/{produto_id}", summary="Desativar um produto")
-def desativar_produto(
+async def desativar_produto(
     produto_id: int = Path(..., description="É necessário informar o ID do produto na URL para realizar a remoção"), 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Realiza a desativação lógica (soft delete) de um produto. 
     **Nota:** Não é possível realizar DELETE diretamente em /produtos sem o ID.
     """
-    produto_service.desativar_produto(db, produto_id)
+    await produto_service.desativar_produto(db, produto_id)
     return {"mensagem": "Produto removido com sucesso"}
 
 @router.get("/ranking", response_model=List[schemas.ProdutoStatus], summary="Ver ranking de vendas")
-def ver_ranking_de_vendas(db: Session = Depends(get_db)):
+async def ver_ranking_de_vendas(
+    top: int = Query(20, ge=1, le=500, description="Quantidade de produtos no ranking"),
+    data_inicio: Optional[datetime] = Query(None, description="Data inicial para o filtro - (YYYY-MM-DD)"),
+    data_fim: Optional[datetime] = Query(None, description="Data final para o filtro - (YYYY-MM-DD)"),
+    categoria: Optional[str] = Query(None, description="Mostra apenas produtos desta categoria"),
+    apenas_ativos: bool = False,
+    ordenar_por: Literal["faturamento", "unidades"] = Query("faturamento", description="Critério de ordenação do ranking"),
+    db: SessaoBanco = Depends(get_read_db)
+):
     """
     Gera um relatório dos produtos mais vendidos e faturamento histórico real.
+    É possível limitar o período, a categoria e a quantidade de produtos retornados.
     """
-    return produto_service.listar_produtos_com_estatisticas(db)
\ No newline at end of file
+    ranking = await produto_service.listar_produtos_com_estatisticas(
+        db,
+        top=top,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        categoria=categoria,
+        apenas_ativos=apenas_ativos,
+        ordenar_por=ordenar_por,
+    )
+
+    # O ranking já vem em dicionários com os campos do ProdutoStatus; no caminho rápido só
+    # pulo a validação do response_model
+    if configuracoes.listagem_rapida:
+        return RespostaJSONRapida(ranking)
+
+    return ranking
\ No newline at end of file
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from app import schemas
+from app.relatorios import FORMATOS, gerenciador_relatorios
+from app.security import validar_api_key
+
+router = APIRouter(
+    prefix="/relatorios",
+    tags=["Relatórios"],
+    dependencies=[Depends(validar_api_key)]
+)
+
+def _resposta(request: Request, estado: dict) -> dict:
+    # O caminho do arquivo no disco não sai na resposta; no lugar dele vai o link para baixar
+    resposta = dict(estado)
+    if estado["status"] == "concluido" and estado.get("arquivo"):
+        resposta["arquivo_url"] = request.app.url_path_for("baixar_arquivo_do_relatorio", job_id=estado["id"])
+    return resposta
+
+def _buscar(job_id: str) -> dict:
+    estado = gerenciador_relatorios.estado(job_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail='Relatório não encontrado.')
+    return estado
+
+@router.post("/jobs", response_model=schemas.RelatorioJob, status_code=202, summary="Pedir um relatório em segundo plano")
+async def pedir_relatorio(pedido: schemas.RelatorioJobCreate, request: Request, response: Response):
+    """
+    Coloca na fila um relatório (resumo financeiro, ranking de produtos ou exportação das vendas)
+    e responde na hora com o ID e o andamento; o resultado é consultado em **GET /relatorios/jobs/{id}**.
+    O mesmo pedido feito de novo enquanto o resultado está guardado devolve o mesmo relatório
+    (status 200, sem gerar outra vez).
+    """
+    # Gravar o estado e subir o pool mexem no disco; fora do loop
+    estado, novo = await run_in_threadpool(gerenciador_relatorios.enfileirar, pedido.tipo, pedido.model_dump())
+
+    if not novo:
+        response.status_code = 200
+    response.headers["Location"] = request.app.url_path_for("ver_relatorio", job_id=estado["id"])
+    return _resposta(request, estado)
+
+@router.get("/jobs/{job_id}", response_model=schemas.RelatorioJob, summary="Ver andamento e resultado de um relatório")
+async def ver_relatorio(request: Request, job_id: str = Path(..., description="ID devolvido ao pedir o relatório")):
+    """
+    Mostra o status (pendente, executando, concluido ou erro), o andamento de 0 a 100 e, quando
+    concluído, o resultado do relatório (ou o link para baixar o arquivo, na exportação).
+    """
+    return _resposta(request, _buscar(job_id))
+
+@router.get("/jobs/{job_id}/arquivo", summary="Baixar o arquivo de uma exportação")
+async def baixar_arquivo_do_relatorio(job_id: str = Path(..., description="ID devolvido ao pedir o relatório")):
+    """
+    Baixa o arquivo gerado por um relatório do tipo exportação, depois de concluído.
+    """
+    estado = _buscar(job_id)
+    caminho = gerenciador_relatorios.caminho_arquivo(estado) if estado["status"] == "concluido" else None
+    if caminho is None:
+        raise HTTPException(status_code=409, detail='O arquivo deste relatório não está disponível.')
+
+    formato = estado["parametros"]["formato"]
+    return FileResponse(caminho, media_type=FORMATOS[formato][0], filename=estado["nome_arquivo"])
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, Path, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, Depends, Header, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from datetime import date, datetime
 from app import schemas
-from app.database import get_db
-from app.services.visitas_service import VisitaService
+from app.ao_vivo import painel_ao_vivo
+from app.config import configuracoes
+from app.database import SessaoBanco, abrir_sessao, get_db, get_read_db
+from app.respostas import RespostaJSONRapida
+from app.services.visitas_service import VisitaServiceAsync
+from app.services.exportacao_service import ExportacaoService
 from app.security import validar_api_key
 
 router = APIRouter(
@@ -13,54 +17,147 @@ router = APIRouter(
     dependencies=[Depends(validar_api_key)]
 )
 
-visita_service = VisitaService()
+visita_service = VisitaServiceAsync()
+exportacao_service = ExportacaoService()
 
 @router.post("/", response_model=schemas.VisitaResponse, summary="Registrar nova visita")
-def criar_visita(visita: schemas.VisitaCreate, db: Session = Depends(get_db)):
+async def criar_visita(visita: schemas.VisitaCreate, db: SessaoBanco = Depends(get_db)):
     """
     Registra uma visita turística, vinculando um guia e os produtos vendidos.
     O sistema calcula automaticamente o faturamento total com base nos preços atuais.
     """
-    return visita_service.registrar_visita(db, visita)
+    return await visita_service.registrar_visita(db, visita)
 
-@router.get("/", response_model=List[schemas.VisitaResponse], summary="Listar todas as visitas")
-def listar_historico_visitas(db: Session = Depends(get_db)):
+@router.post("/lote", response_model=schemas.ResultadoLote, summary="Registrar várias visitas de uma vez")
+async def criar_visitas_em_lote(lote: schemas.VisitaLote, db: SessaoBanco = Depends(get_db)):
     """
-    Retorna o histórico completo de visitas realizadas.
+    Registra um lote de visitas (por exemplo, as acumuladas por um quiosque enquanto estava offline).
+    Guias e produtos são validados de uma vez para o lote inteiro e as visitas são gravadas em blocos.
+    O retorno traz o resultado de cada visita, então só as que falharam precisam ser reenviadas.
     """
-    return visita_service.listar_visitas(db)
+    return await visita_service.registrar_lote(db, lote)
+
+@router.get("/", response_model=List[schemas.VisitaResponse], summary="Listar visitas (paginado)")
+async def listar_historico_visitas(
+    response: Response,
+    limite: int = Query(100, ge=1, le=500, description="Quantidade máxima de visitas por página"),
+    cursor: Optional[str] = Query(None, description="Cursor devolvido no cabeçalho X-Proximo-Cursor da página anterior"),
+    data_inicio: Optional[datetime] = Query(None, description="Data inicial para o filtro - (YYYY-MM-DD)"), 
+    data_fim: Optional[datetime] = Query(None, description="Data final para o filtro - (YYYY-MM-DD)"), 
+    guia_id: Optional[int] = Query(None, description="Filtra as visitas de um guia específico"),
+    db: SessaoBanco = Depends(get_read_db)
+):
+    """
+    Retorna o histórico de visitas em ordem cronológica, uma página por vez.
+    Quando houver mais resultados, o cabeçalho **X-Proximo-Cursor** traz o valor a ser enviado em 'cursor' para buscar a próxima página.
+    """
+    # No caminho rápido as linhas já vêm no formato do VisitaResponse, direto das colunas
+    listar = visita_service.listar_visitas_rapido if configuracoes.listagem_rapida else visita_service.listar_visitas
+    visitas, proximo_cursor = await listar(
+        db, limite=limite, cursor=cursor, data_inicio=data_inicio, data_fim=data_fim, guia_id=guia_id
+    )
+
+    if configuracoes.listagem_rapida:
+        cabecalhos = {"X-Proximo-Cursor": proximo_cursor} if proximo_cursor else None
+        return RespostaJSONRapida(visitas, headers=cabecalhos)
+
+    if proximo_cursor:
+        response.headers["X-Proximo-Cursor"] = proximo_cursor
+
+    return visitas
 
 @router.put("/{visita_id}", response_model=schemas.VisitaResponse, summary="Atualizar dados de uma visita")
-def atualizar_visita(
+async def atualizar_visita(
     visita_id: int = Path(..., description="ID da visita que será editada"),
     dados: schemas.VisitaCreate = None, 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Permite corrigir dados de uma visita e recalcula automaticamente os totais financeiros.
     """
-    return visita_service.atualizar_visita(db, visita_id, dados) 
+    return await visita_service.atualizar_visita(db, visita_id, dados) 
 
 @router.delete("/{visita_id}", summary="Remover registro de visita")
-def deletar_visita(
+async def deletar_visita(
     visita_id: int = Path(..., description="ID da visita que vai excluída permanentemente"),
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
     """
     Remove uma visita do banco de dados. 
     **Nota:** Esta ação é irreversível e remove o faturamento correspondente dos relatórios.
     """
-    visita_service.deletar_visita(db, visita_id)
+    await visita_service.deletar_visita(db, visita_id)
     return {"message": "Visita removida com sucesso. O faturamento foi atualizado."}
 
 @router.get("/relatorio", response_model=schemas.RelatorioGeral, summary="Gerar relatório financeiro")
-def obter_relatorio(
+async def obter_relatorio(
     data_inicio: Optional[datetime] = Query(None, description="Data inicial para o filtro - (YYYY-MM-DD)"), 
     data_fim: Optional[datetime] = Query(None, description="Data final para o filtro - (YYYY-MM-DD)"), 
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_read_db)
 ):
     """
     Gera um resumo financeiro, incluindo total de guias, produtos e arrecadação geral.
     É possível filtrar por um período específico de tempo.
     """
-    return visita_service.gerar_relatorio_filtrado(db, data_inicio, data_fim)
\ No newline at end of file
+    return await visita_service.gerar_relatorio_filtrado(db, data_inicio, data_fim)
+
+@router.get("/serie", response_model=List[schemas.PontoSerie], summary="Série do faturamento por período")
+async def obter_serie(
+    data_inicio: datetime = Query(..., description="Data inicial da série - (YYYY-MM-DD)"),
+    data_fim: datetime = Query(..., description="Data final da série - (YYYY-MM-DD)"),
+    bucket: Literal["hour", "day", "week", "month"] = Query("day", description="Tamanho de cada intervalo da série"),
+    db: SessaoBanco = Depends(get_read_db)
+):
+    """
+    Devolve visitas, turistas, taxas e vendas de produtos separados por hora, dia, semana
+    (começando na segunda) ou mês. Intervalos sem visitas aparecem zerados, então a série
+    vem completa para montar o gráfico.
+    """
+    serie = await visita_service.gerar_serie(db, bucket, data_inicio, data_fim)
+
+    if configuracoes.listagem_rapida:
+        return RespostaJSONRapida(serie)
+
+    return serie
+
+async def _totais_do_dia(dia: date):
+    # O painel abre uma sessão só para a leitura, em vez de segurar uma enquanto a tela está conectada
+    async with abrir_sessao(leitura=True) as db:
+        return await visita_service.totais_do_dia(db, dia)
+
+@router.get("/ao-vivo", summary="Painel ao vivo do faturamento de hoje (SSE)")
+async def painel_ao_vivo_do_dia(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, description="ID do último evento recebido (enviado pelo navegador ao reconectar)"),
+):
+    """
+    Stream de Server-Sent Events com os totais de hoje: visitas, turistas, taxas, vendas de
+    produtos e os produtos mais vendidos. Cada evento `totais` traz os números completos, e
+    um novo evento sai a cada visita registrada, editada ou removida (no máximo um por segundo).
+    Sem novidades, um comentário `: ping` mantém a conexão aberta.
+    Ao reconectar com **Last-Event-ID**, os totais só são reenviados se mudaram desde então.
+    """
+    return StreamingResponse(
+        painel_ao_vivo.transmitir(_totais_do_dia, last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        # Sem cache e sem buffer em proxies (X-Accel-Buffering é o do nginx), para cada evento sair na hora
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/exportar", summary="Exportar visitas e vendas do período")
+async def exportar_vendas(
+    formato: Literal["csv", "ndjson", "xlsx"] = Query("csv", description="Formato do arquivo gerado"),
+    data_inicio: Optional[datetime] = Query(None, description="Data inicial para o filtro - (YYYY-MM-DD)"), 
+    data_fim: Optional[datetime] = Query(None, description="Data final para o filtro - (YYYY-MM-DD)"), 
+):
+    """
+    Exporta as visitas do período com os produtos vendidos em cada uma (uma linha por item vendido).
+    O arquivo é enviado aos poucos, conforme as linhas são lidas do banco, então pode ser usado para períodos longos.
+    """
+    conteudo, media_type, nome_arquivo = exportacao_service.exportar_vendas(formato, data_inicio, data_fim)
+
+    return StreamingResponse(
+        conteudo,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
 # ----------> GUIA
@@ -29,6 +29,19 @@ class GuiaResumido(BaseModel):
     class Config:
         from_attributes = True
 
+class GuiaDesempenho(BaseModel):
+    # Números de cada guia no período, usados para pagamento e escala
+    id: int
+    nome: str
+    ativo: bool
+    visitas: int = Field(..., description="Quantidade de visitas conduzidas")
+    turistas: int = Field(..., description="Soma dos turistas de todas as visitas")
+    total_taxas: float = Field(..., description="Soma das taxas de guia")
+    total_produtos: float = Field(..., description="Soma das vendas de produtos nas visitas do guia")
+    faturamento_total: float = Field(..., description="Taxas + produtos")
+    ticket_medio_por_turista: float = Field(..., description="Faturamento total dividido pelo número de turistas")
+    ultima_visita: Optional[datetime] = Field(None, description="Data da visita mais recente no período")
+
 
 # ----------> VISITA
 
@@ -51,6 +64,27 @@ class VisitaBase(BaseModel):
 class VisitaCreate(VisitaBase):
     pass
 
+class VisitaLote(BaseModel):
+    # Usado pelos quiosques que ficam offline e depois mandam várias visitas de uma vez
+    visitas: List[VisitaCreate] = Field(..., min_length=1, max_length=5000)
+    tamanho_bloco: Optional[int] = Field(
+        None, gt=0, example=500,
+        description="Quantas visitas gravar por transação. Se não for informado, grava o lote inteiro numa transação só"
+    )
+
+class ResultadoItemLote(BaseModel):
+    # 'indice' é a posição da visita na lista enviada, para o quiosque saber qual reenviar
+    indice: int
+    sucesso: bool
+    visita_id: Optional[int] = None
+    erro: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    total_recebidas: int
+    total_registradas: int
+    total_com_erro: int
+    resultados: List[ResultadoItemLote]
+
 class VisitaResponse(BaseModel):
     id: int
     data_visita: datetime
@@ -104,4 +138,42 @@ class RelatorioGeral(BaseModel):
     total_taxas_guias: float = Field(..., description="Soma de todas as taxas de guias no período")
     total_produtos: float = Field(..., description="Soma de todas as vendas de produtos no período")
     faturamento_total_geral: float = Field(..., description="Soma total arrecadada (Taxas + Produtos)")
-    quantidade_visitas: int = Field(..., description="Total de registros de visitas processados")
\ No newline at end of file
+    quantidade_visitas: int = Field(..., description="Total de registros de visitas processados")
+
+class PontoSerie(BaseModel):
+    # Um ponto da série do faturamento (uma hora, dia, semana ou mês)
+    inicio: datetime = Field(..., description="Início do intervalo")
+    visitas: int
+    turistas: int
+    total_taxas: float
+    total_produtos: float
+    faturamento_total: float
+
+
+# ----------> RELATÓRIOS EM SEGUNDO PLANO
+
+class RelatorioJobCreate(BaseModel):
+    # Pedido de relatório; cada tipo usa só os campos que fazem sentido para ele
+    tipo: Literal["resumo", "ranking", "exportacao"] = Field(..., example="resumo")
+    data_inicio: Optional[datetime] = Field(None, description="Data inicial do período - (YYYY-MM-DD)")
+    data_fim: Optional[datetime] = Field(None, description="Data final do período - (YYYY-MM-DD)")
+    top: int = Field(20, ge=1, le=500, description="Ranking: quantidade de produtos")
+    categoria: Optional[str] = Field(None, description="Ranking: apenas produtos desta categoria")
+    apenas_ativos: bool = Field(False, description="Ranking: apenas produtos ativos")
+    ordenar_por: Literal["faturamento", "unidades"] = Field("faturamento", description="Ranking: critério de ordenação")
+    formato: Literal["csv", "ndjson", "xlsx"] = Field("csv", description="Exportação: formato do arquivo")
+
+class RelatorioJob(BaseModel):
+    # Andamento de um relatório; o resultado aparece quando o status for 'concluido'
+    id: str
+    tipo: str
+    parametros: dict
+    status: Literal["pendente", "executando", "concluido", "erro"]
+    progresso: int = Field(..., description="Andamento de 0 a 100")
+    criado_em: datetime
+    atualizado_em: datetime
+    concluido_em: Optional[datetime] = None
+    expira_em: Optional[datetime] = Field(None, description="Até quando o resultado fica guardado")
+    resultado: Optional[Union[RelatorioGeral, List[ProdutoStatus]]] = None
+    arquivo_url: Optional[str] = Field(None, description="Exportação: onde baixar o arquivo pronto")
+    erro: Optional[str] = None
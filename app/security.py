@@ -1,14 +1,20 @@
 import os
-from fastapi import HTTPException, Security, status
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException, Security, status
 from fastapi.security.api_key import APIKeyHeader
 from dotenv import load_dotenv
+from app.config import configuracoes
 
 load_dotenv()
 
 API_KEY = os.getenv('API_KEY_TURISMO')
-if not API_KEY:
+if not API_KEY and not configuracoes.api_keys:
     raise RuntimeError('ERRO: A variável de ambiente API_KEY_TURISMO não foi definida!')
 
+# Nome de cada cliente -> chave; o nome é o que aparece nos limites de uso e nas métricas
+CHAVES = {**({'padrao': API_KEY} if API_KEY else {}), **configuracoes.api_keys}
+
 API_KEY_NAME = 'X-API-KEY'
 
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -20,10 +26,31 @@ def validar_api_key(api_key: str = Security(api_key_header)):
             detail='Acesso negado: Cabeçalho X-API-KEY ausente.',
         )
     
-    if api_key != API_KEY:
+    if identificar_chave(api_key) is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Acesso negado: Chave de API inválida.',
         )
     
-    return api_key
\ No newline at end of file
+    return api_key
+
+def identificar_chave(api_key: Optional[str]) -> Optional[str]:
+    # Nome do cliente dono da chave (ou None); compara todas para não vazar nada pelo tempo de resposta
+    encontrado = None
+    for nome, chave in CHAVES.items():
+        if api_key and secrets.compare_digest(api_key.encode(), chave.encode()):
+            encontrado = nome
+    return encontrado
+
+def validar_token_metricas(authorization: str = Header(None)):
+    # Sem METRICAS_TOKEN configurado o /metrics fica aberto
+    token = configuracoes.metricas_token
+    if token is None:
+        return
+
+    # Comparo os bytes: com str, o compare_digest recusa (TypeError) cabeçalho com caractere fora do ASCII
+    if not authorization or not secrets.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Acesso negado: token das métricas ausente ou inválido.',
+        )
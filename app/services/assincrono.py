@@ -0,0 +1,27 @@
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class ServicoAssincrono:
+    """
+    Versão assíncrona de um service: cada método do service original vira uma corrotina
+    com a mesma assinatura (db primeiro, depois os mesmos argumentos).
+
+    Com uma AsyncSession, o método roda via run_sync, que usa o driver assíncrono e não
+    ocupa uma thread enquanto espera o banco. Com uma Session comum (modo síncrono, DB_ASYNC=false),
+    o método roda no threadpool, como os handlers síncronos faziam antes.
+    """
+
+    def __init__(self, servico):
+        self._servico = servico
+
+    def __getattr__(self, nome):
+        metodo = getattr(self._servico, nome)
+
+        async def executar(db, *args, **kwargs):
+            if isinstance(db, AsyncSession):
+                return await db.run_sync(metodo, *args, **kwargs)
+            return await run_in_threadpool(metodo, db, *args, **kwargs)
+
+        executar.__name__ = nome
+        return executar
@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+from typing import Callable, Optional
+from sqlalchemy import func, select
+from app import models
+from app.database import SessionLocalLeitura
+from app.dinheiro import em_reais
+from app.services.visitas_service import filtrar_periodo
+
+# Quantas linhas o cursor do banco entrega por vez. A memória usada fica presa a esse tamanho,
+# não importa se a exportação tem mil ou dez milhões de itens
+LINHAS_POR_BLOCO = 2000
+
+# O Excel aceita no máximo 1.048.576 linhas por aba; passo para a próxima aba antes disso
+LINHAS_POR_ABA_XLSX = 1_000_000
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+class ExportacaoService:
+    def exportar_vendas(
+        self,
+        formato: str,
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        progresso: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Monta a exportação das visitas com os itens vendidos (uma linha por item) e devolve
+        o gerador com o conteúdo, o media type e o nome sugerido do arquivo. Se informado,
+        'progresso' é chamado com a quantidade de linhas de cada bloco lido do banco.
+        """
+        consulta = self._consulta(data_inicio, data_fim)
+
+        colunas = list(consulta.selected_columns.keys())
+        geradores = {"csv": gerar_csv, "ndjson": gerar_ndjson, "xlsx": gerar_xlsx}
+        media_type, extensao = FORMATOS[formato]
+
+        conteudo = geradores[formato](colunas, _ler_em_blocos(consulta, progresso))
+        return conteudo, media_type, f"vendas.{extensao}"
+
+    def contar_linhas(self, data_inicio: datetime = None, data_fim: datetime = None) -> int:
+        # Total de linhas da exportação, para calcular o andamento dos relatórios em segundo plano
+        consulta = self._consulta(data_inicio, data_fim).order_by(None)
+        with SessionLocalLeitura() as db:
+            return db.scalar(select(func.count()).select_from(consulta.subquery()))
+
+    def _consulta(self, data_inicio: datetime = None, data_fim: datetime = None):
+        # Os valores ficam em centavos no banco; na exportação saem em reais, com os mesmos nomes de antes
+        consulta = select(
+            models.Visita.id.label("visita_id"),
+            models.Visita.data_visita,
+            models.Visita.guia_id,
+            models.Guia.nome.label("guia_nome"),
+            models.Visita.qtd_turistas,
+            em_reais(models.Visita.valor_taxa_guia_centavos).label("valor_taxa_guia"),
+            em_reais(models.Visita.total_produtos_centavos).label("total_produtos"),
+            models.VisitaProduto.produto_id,
+            models.Produto.nome.label("produto_nome"),
+            models.Produto.categoria,
+            models.VisitaProduto.quantidade,
+            em_reais(models.VisitaProduto.preco_na_hora_centavos).label("preco_na_hora"),
+            em_reais(models.VisitaProduto.subtotal_centavos).label("subtotal"),
+        ).select_from(models.Visita).outerjoin(
+            models.Guia, models.Guia.id == models.Visita.guia_id
+        ).outerjoin(
+            models.VisitaProduto, models.VisitaProduto.visita_id == models.Visita.id
+        ).outerjoin(
+            models.Produto, models.Produto.id == models.VisitaProduto.produto_id
+        )
+
+        # Valido as datas aqui, antes de começar a resposta, para ainda dar tempo de devolver 400
+        return filtrar_periodo(consulta, data_inicio, data_fim).order_by(
+            models.Visita.data_visita, models.Visita.id, models.VisitaProduto.id
+        )
+
+
+def _ler_em_blocos(consulta, progresso: Optional[Callable[[int], None]] = None):
+    # A exportação abre a própria sessão (do lado da leitura) porque continua lendo enquanto a
+    # resposta é enviada
+    with SessionLocalLeitura() as db:
+        resultado = db.execute(consulta.execution_options(yield_per=LINHAS_POR_BLOCO))
+        for bloco in resultado.partitions():
+            if progresso:
+                progresso(len(bloco))
+            yield bloco
+
+
+def _texto(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def gerar_csv(colunas, blocos):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(colunas)
+
+    for bloco in blocos:
+        escritor.writerows(bloco)
+        yield saida.getvalue()
+        saida.seek(0)
+        saida.truncate()
+
+    if saida.tell():
+        yield saida.getvalue()
+
+
+def gerar_ndjson(colunas, blocos):
+    for bloco in blocos:
+        yield "".join(
+            json.dumps(dict(zip(colunas, linha)), default=_texto, ensure_ascii=False) + "\n"
+            for linha in bloco
+        )
+
+
+class _SaidaSemSeek(io.RawIOBase):
+    # Destino do zip: guarda o que foi escrito até o gerador repassar para a resposta.
+    # Como não tem seek, o zipfile escreve os tamanhos depois de cada arquivo (data descriptor)
+    def __init__(self):
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def esvaziar(self):
+        dados = b"".join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def _celula(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f"<c><v>{valor}</v></c>"
+    return f'<c t="inlineStr"><is><t>{escape(str(_texto(valor)))}</t></is></c>'
+
+
+def _linha_xlsx(valores):
+    return "<row>" + "".join(_celula(v) for v in valores) + "</row>"
+
+
+def gerar_xlsx(colunas, blocos):
+    """
+    Escreve o .xlsx direto no fluxo da resposta: cada aba é gravada no zip aos poucos e só
+    os arquivos pequenos de índice (workbook, rels) ficam para o final.
+    """
+    ns_planilha = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    ns_rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    ns_pacote = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+    saida = _SaidaSemSeek()
+    pacote = zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED)
+
+    abas = 0
+    aba = None
+    linhas_na_aba = 0
+
+    def abrir_aba():
+        nonlocal abas, aba, linhas_na_aba
+        abas += 1
+        aba = pacote.open(f"xl/worksheets/sheet{abas}.xml", "w", force_zip64=True)
+        aba.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="{ns_planilha}"><sheetData>'.encode())
+        aba.write(_linha_xlsx(colunas).encode())
+        linhas_na_aba = 1
+
+    def fechar_aba():
+        aba.write(b"</sheetData></worksheet>")
+        aba.close()
+
+    abrir_aba()
+    for bloco in blocos:
+        for linha in bloco:
+            if linhas_na_aba >= LINHAS_POR_ABA_XLSX:
+                fechar_aba()
+                abrir_aba()
+            aba.write(_linha_xlsx(linha).encode())
+            linhas_na_aba += 1
+        yield saida.esvaziar()
+    fechar_aba()
+
+    xml = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    pacote.writestr(
+        "[Content_Types].xml",
+        xml + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + "".join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for n in range(1, abas + 1)
+        )
+        + "</Types>",
+    )
+    pacote.writestr(
+        "_rels/.rels",
+        xml + f'<Relationships xmlns="{ns_pacote}">'
+        f'<Relationship Id="rId1" Type="{ns_rel}/officeDocument" Target="xl/workbook.xml"/></Relationships>',
+    )
+    pacote.writestr(
+        "xl/workbook.xml",
+        xml + f'<workbook xmlns="{ns_planilha}" xmlns:r="{ns_rel}"><sheets>'
+        + "".join(f'<sheet name="Vendas {n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, abas + 1))
+        + "</sheets></workbook>",
+    )
+    pacote.writestr(
+        "xl/_rels/workbook.xml.rels",
+        xml + f'<Relationships xmlns="{ns_pacote}">'
+        + "".join(
+            f'<Relationship Id="rId{n}" Type="{ns_rel}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+            for n in range(1, abas + 1)
+        )
+        + "</Relationships>",
+    )
+    pacote.close()
+    yield saida.esvaziar()
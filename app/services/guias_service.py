@@ -1,6 +1,15 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from app import models, schemas
+from app.services.assincrono import ServicoAssincrono
+from app.busca import consulta_fts, expressao_fts, termos
+from app.cache import catalogo_cache, incrementar_versao, ler_versao_com_epoca
+from app.dinheiro import dividir_centavos, para_reais
+from app.etag import gerar_etag
+from app.services.visitas_service import filtrar_periodo
+from sqlalchemy import func
+from typing import Optional
+from datetime import datetime
 
 class GuiaService:
     def criar_guia(self, db: Session, guia_data: schemas.GuiaCreate):
@@ -13,6 +22,7 @@ class GuiaService:
             )
 
             db.add(novo_guia)
+            incrementar_versao(db, "guias")
             db.commit()
             db.refresh(novo_guia) # Pego os dados atualizados (como o ID gerado)
 
@@ -30,6 +40,43 @@ class GuiaService:
         
         return query.all()
 
+    def listar_guias_rapido(self, db: Session, apenas_ativos: bool = False):
+        # Caminho rápido: só as colunas do GuiaResponse, já como dicionários
+        query = db.query(models.Guia.nome, models.Guia.telefone, models.Guia.id, models.Guia.ativo)
+
+        if apenas_ativos:
+            query = query.filter(models.Guia.ativo == True)
+
+        return [linha._asdict() for linha in query]
+
+    def buscar_guias(self, db: Session, texto: str, limite: int = 10, apenas_ativos: bool = True):
+        # Mesma busca dos produtos, pelo nome do guia
+        expressao = expressao_fts(texto)
+        if not expressao:
+            return []
+
+        query = db.query(models.Guia)
+
+        if db.get_bind().dialect.name == "sqlite":
+            virtual, corresponde, relevancia = consulta_fts("guias")
+            query = query.join(virtual, virtual.c.rowid == models.Guia.id).filter(
+                corresponde(expressao)
+            ).order_by(relevancia, models.Guia.nome)
+        else:
+            query = query.filter(
+                *[models.Guia.nome.icontains(termo, autoescape=True) for termo in termos(texto)]
+            ).order_by(models.Guia.nome)
+
+        if apenas_ativos:
+            query = query.filter(models.Guia.ativo == True)
+
+        return query.limit(limite).all()
+
+    def etag_listagem(self, db: Session, apenas_ativos: bool = False):
+        # Mesmo esquema dos produtos: a versão do catálogo de guias identifica a listagem
+        epoca, versao = ler_versao_com_epoca(db, "guias")
+        return gerar_etag("guias", epoca, versao, "ativos" if apenas_ativos else "todos")
+
     def buscar_por_id(self, db: Session, guia_id: int):
         # Procuro o guia pelo ID. Se não achar, já mando o erro 404
         guia = db.query(models.Guia).filter(models.Guia.id == guia_id).first()
@@ -50,7 +97,10 @@ class GuiaService:
         try:
             # Faço o "soft delete" mudando o status para inativo
             guia.ativo = False
+            # Aviso os outros processos que o catálogo mudou (na mesma transação da alteração)
+            incrementar_versao(db, "guias")
             db.commit()
+            catalogo_cache.invalidar("guias")
 
             return True
         except Exception:
@@ -66,11 +116,96 @@ class GuiaService:
             guia_existente.nome = novos_dados.nome
             guia_existente.telefone = novos_dados.telefone
             guia_existente.ativo = novos_dados.ativo
+            incrementar_versao(db, "guias")
             
             db.commit()
+            catalogo_cache.invalidar("guias")
             db.refresh(guia_existente)
 
             return guia_existente
         except Exception:
             db.rollback()
-            raise HTTPException(status_code=500, detail='Erro ao atualizar os dados do guia.')
\ No newline at end of file
+            raise HTTPException(status_code=500, detail='Erro ao atualizar os dados do guia.')
+
+    def desempenho_guias(
+        self,
+        db: Session,
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        top: Optional[int] = None,
+        apenas_ativos: bool = False,
+        ordenar_por: str = "faturamento",
+    ):
+        try:
+            # Somo tudo direto nas visitas, agrupando por guia. O total dos produtos já está
+            # gravado em cada visita, então não junto com os itens (a junção repetiria a visita
+            # uma vez por item e multiplicaria turistas e taxas)
+            numeros = db.query(
+                models.Visita.guia_id,
+                func.count(models.Visita.id).label("visitas"),
+                func.sum(models.Visita.qtd_turistas).label("turistas"),
+                func.sum(models.Visita.valor_taxa_guia_centavos).label("taxas"),
+                func.sum(models.Visita.total_produtos_centavos).label("produtos"),
+                func.max(models.Visita.data_visita).label("ultima_visita"),
+            )
+            numeros = filtrar_periodo(numeros, data_inicio, data_fim)
+            numeros = numeros.group_by(models.Visita.guia_id).subquery()
+
+            # Guia sem visita no período também aparece, zerado
+            visitas = func.coalesce(numeros.c.visitas, 0).label("visitas")
+            turistas = func.coalesce(numeros.c.turistas, 0).label("turistas")
+            taxas = func.coalesce(numeros.c.taxas, 0).label("taxas")
+            produtos = func.coalesce(numeros.c.produtos, 0).label("produtos")
+            faturamento = (taxas + produtos).label("faturamento")
+
+            query = db.query(
+                models.Guia.id,
+                models.Guia.nome,
+                models.Guia.ativo,
+                visitas,
+                turistas,
+                taxas,
+                produtos,
+                faturamento,
+                numeros.c.ultima_visita,
+            ).outerjoin(numeros, numeros.c.guia_id == models.Guia.id)
+
+            if apenas_ativos:
+                query = query.filter(models.Guia.ativo == True)
+
+            # A ordenação e o limite ficam no banco, como no ranking de produtos
+            chaves = {
+                "faturamento": faturamento,
+                "visitas": visitas,
+                "turistas": turistas,
+                "ticket_medio": func.coalesce(faturamento * 1.0 / func.nullif(turistas, 0), 0),
+            }
+            query = query.order_by(chaves[ordenar_por].desc(), models.Guia.id)
+            if top:
+                query = query.limit(top)
+
+            return [
+                {
+                    "id": linha.id,
+                    "nome": linha.nome,
+                    "ativo": linha.ativo,
+                    "visitas": linha.visitas,
+                    "turistas": linha.turistas,
+                    "total_taxas": para_reais(linha.taxas),
+                    "total_produtos": para_reais(linha.produtos),
+                    "faturamento_total": para_reais(linha.faturamento),
+                    # Arredondo para o centavo, como os outros valores em reais
+                    "ticket_medio_por_turista": para_reais(dividir_centavos(linha.faturamento, linha.turistas)) if linha.turistas else 0.0,
+                    "ultima_visita": linha.ultima_visita,
+                }
+                for linha in query
+            ]
+        except HTTPException as error:
+            raise error
+        except Exception:
+            raise HTTPException(status_code=500, detail="Erro ao calcular o desempenho dos guias.")
+
+
+class GuiaServiceAsync(ServicoAssincrono):
+    def __init__(self):
+        super().__init__(GuiaService())
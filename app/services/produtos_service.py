@@ -1,7 +1,15 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from app import models, schemas
+from app.services.assincrono import ServicoAssincrono
+from app.busca import consulta_fts, expressao_fts, termos
+from app.cache import catalogo_cache, incrementar_versao, ler_versao_com_epoca
+from app.dinheiro import para_centavos, para_reais
+from app.etag import gerar_etag
+from app.services.visitas_service import filtrar_periodo
 from sqlalchemy import func
+from typing import Optional
+from datetime import datetime
 
 class ProdutoService:
     def criar_produto(self, db: Session, produto: schemas.ProdutoCreate):
@@ -11,14 +19,19 @@ class ProdutoService:
                 raise HTTPException(status_code=400, detail="O preço do produto não pode ser negativo.") 
 
             # Aqui eu transformo os dados que vêm do Swagger em um modelo que o banco entende
-            # Usei o model_dump() para facilitar a conversão
-            novo = models.Produto(**produto.model_dump()) 
+            # (o preço chega em reais e é gravado em centavos)
+            novo = models.Produto(
+                nome=produto.nome,
+                preco_centavos=para_centavos(produto.preco),
+                categoria=produto.categoria,
+            )
 
             db.add(novo)
+            incrementar_versao(db, "produtos")
             db.commit()
             db.refresh(novo)
             
-            return novo
+            return self._para_resposta(novo)
         except HTTPException as error:
             raise error
         except Exception:
@@ -39,9 +52,62 @@ class ProdutoService:
 
         # Se o usuário quiser apenas os ativos, aplico o filtro aqui
         if apenas_ativos:
-            return query.filter(models.Produto.ativo == True).all()
+            query = query.filter(models.Produto.ativo == True)
         
-        return query.all()
+        return [self._para_resposta(produto) for produto in query]
+
+    def buscar_produtos(self, db: Session, texto: str, limite: int = 10, apenas_ativos: bool = True):
+        # Busca pelo nome, para o type-ahead do caixa (os mais relevantes primeiro)
+        expressao = expressao_fts(texto)
+        if not expressao:
+            return []
+
+        query = db.query(models.Produto)
+
+        if db.get_bind().dialect.name == "sqlite":
+            virtual, corresponde, relevancia = consulta_fts("produtos")
+            query = query.join(virtual, virtual.c.rowid == models.Produto.id).filter(
+                corresponde(expressao)
+            ).order_by(relevancia, models.Produto.nome)
+        else:
+            # Sem FTS5 fora do SQLite: cada palavra precisa aparecer no nome (sem ignorar acentos)
+            query = query.filter(
+                *[models.Produto.nome.icontains(termo, autoescape=True) for termo in termos(texto)]
+            ).order_by(models.Produto.nome)
+
+        if apenas_ativos:
+            query = query.filter(models.Produto.ativo == True)
+
+        return [self._para_resposta(produto) for produto in query.limit(limite)]
+
+    def _para_resposta(self, produto: models.Produto):
+        return schemas.ProdutoResponse(
+            id=produto.id,
+            nome=produto.nome,
+            preco=para_reais(produto.preco_centavos),
+            categoria=produto.categoria,
+            ativo=produto.ativo,
+        )
+
+    def listar_produtos_rapido(self, db: Session, apenas_ativos: bool = False):
+        # Caminho rápido: só as colunas do ProdutoResponse, já como dicionários
+        query = db.query(
+            models.Produto.nome, models.Produto.preco_centavos, models.Produto.categoria, models.Produto.id, models.Produto.ativo
+        )
+
+        if apenas_ativos:
+            query = query.filter(models.Produto.ativo == True)
+
+        return [
+            {"nome": nome, "preco": para_reais(preco_centavos), "categoria": categoria, "id": id_, "ativo": ativo}
+            for nome, preco_centavos, categoria, id_, ativo in query
+        ]
+
+    def etag_listagem(self, db: Session, apenas_ativos: bool = False):
+        # A versão do catálogo só muda quando algum produto é criado, alterado ou desativado,
+        # então basta ela (com a época do banco e o filtro usado) para saber se a listagem mudou
+        epoca, versao = ler_versao_com_epoca(db, "produtos")
+        return gerar_etag("produtos", epoca, versao, "ativos" if apenas_ativos else "todos")
 
     def atualizar_produto(self, db: Session, produto_id: int, novos_dados: schemas.ProdutoCreate):
         produto_existente = self.buscar_por_id(db, produto_id)
@@ -52,13 +118,17 @@ class ProdutoService:
 
             # Atualizo campo por campo para ter certeza do que está sendo alterado no banco
             produto_existente.nome = novos_dados.nome
-            produto_existente.preco = novos_dados.preco
+            produto_existente.preco_centavos = para_centavos(novos_dados.preco)
             produto_existente.categoria = novos_dados.categoria
+
+            # Aviso os outros processos que o catálogo mudou (na mesma transação da alteração)
+            incrementar_versao(db, "produtos")
             
             db.commit()
+            catalogo_cache.invalidar("produtos")
             db.refresh(produto_existente)
 
-            return produto_existente
+            return self._para_resposta(produto_existente)
         except HTTPException as error:
             raise error
         except Exception:
@@ -72,51 +142,84 @@ class ProdutoService:
             # Importante: não apago o produto para não estragar o histórico das visitas antigas
             # Apenas mudo o status para inativo
             produto.ativo = False
+            incrementar_versao(db, "produtos")
             db.commit()
+            catalogo_cache.invalidar("produtos")
 
             return True
         except Exception:
             db.rollback()
             raise HTTPException(status_code=500, detail='Erro ao desativar produto.')
     
-    def listar_produtos_com_estatisticas(self, db: Session):
+    def listar_produtos_com_estatisticas(
+        self,
+        db: Session,
+        top: int = 20,
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        categoria: Optional[str] = None,
+        apenas_ativos: bool = False,
+        ordenar_por: str = "faturamento",
+    ):
         try:
             # Peço ao banco para somar as quantidades e o faturamento real
-            # Faço o cálculo direto no SQL (quantidade * preço gravado na hora da visita)
-            estatisticas_query = db.query(
-                models.VisitaProduto.produto_id, 
+            # O subtotal (quantidade * preço gravado na hora da visita) já está em centavos no item,
+            # então a soma é inteira e exata
+            vendas = db.query(
+                models.VisitaProduto.produto_id,
                 func.sum(models.VisitaProduto.quantidade).label("total_unidades"),
-                func.sum(models.VisitaProduto.quantidade * models.VisitaProduto.preco_na_hora).label("faturamento_real")
-            ).group_by(models.VisitaProduto.produto_id).all()
-
-            # Crio um dicionário para achar os dados de venda mais fácil depois
-            mapa_vendas = {
-                item.produto_id: {
-                    "unidades": item.total_unidades, 
-                    "faturamento": item.faturamento_real
-                } for item in estatisticas_query
-            }
-
-            produtos = db.query(models.Produto).all()
-            
-            ranking = []
-            for p in produtos:
-                # Se o produto nunca foi vendido, coloco 0 para não dar erro no retorno
-                dados_venda = mapa_vendas.get(p.id, {"unidades": 0, "faturamento": 0.0})
-                
-                ranking.append({
-                    "id": p.id,
-                    "ativo": p.ativo,
-                    "nome": p.nome,
-                    "categoria": p.categoria,
-                    "preco": p.preco,
-                    "unidades_vendidas": dados_venda["unidades"],
-                    "faturamento_total": dados_venda["faturamento"]
-                })
-            
-            # Ordeno a lista para mostrar primeiro quem faturou mais
-            ranking = sorted(ranking, key=lambda x: x['faturamento_total'], reverse=True)
-
-            return ranking
+                func.sum(models.VisitaProduto.subtotal_centavos).label("faturamento_real")
+            )
+
+            # Só preciso juntar com as visitas quando o ranking é de um período
+            if data_inicio or data_fim:
+                vendas = vendas.join(models.Visita, models.Visita.id == models.VisitaProduto.visita_id)
+                vendas = filtrar_periodo(vendas, data_inicio, data_fim)
+
+            vendas = vendas.group_by(models.VisitaProduto.produto_id).subquery()
+
+            # Se o produto nunca foi vendido, coloco 0 para não dar erro no retorno
+            unidades = func.coalesce(vendas.c.total_unidades, 0).label("unidades_vendidas")
+            faturamento = func.coalesce(vendas.c.faturamento_real, 0).label("faturamento_total")
+
+            query = db.query(
+                models.Produto.id,
+                models.Produto.ativo,
+                models.Produto.nome,
+                models.Produto.categoria,
+                models.Produto.preco_centavos,
+                unidades,
+                faturamento,
+            ).outerjoin(vendas, vendas.c.produto_id == models.Produto.id)
+
+            if categoria:
+                query = query.filter(models.Produto.categoria == categoria)
+
+            if apenas_ativos:
+                query = query.filter(models.Produto.ativo == True)
+
+            # A ordenação e o limite ficam no banco: ele devolve só o top pedido
+            chave = unidades if ordenar_por == "unidades" else faturamento
+            ranking = query.order_by(chave.desc(), models.Produto.id).limit(top).all()
+
+            return [
+                {
+                    "id": linha.id,
+                    "ativo": linha.ativo,
+                    "nome": linha.nome,
+                    "categoria": linha.categoria,
+                    "preco": para_reais(linha.preco_centavos),
+                    "unidades_vendidas": linha.unidades_vendidas,
+                    "faturamento_total": para_reais(linha.faturamento_total),
+                }
+                for linha in ranking
+            ]
+        except HTTPException as error:
+            raise error
         except Exception:
-            raise HTTPException(status_code=500, detail="Erro ao gerar ranking de estatísticas.")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Erro ao gerar ranking de estatísticas.")
+
+
+class ProdutoServiceAsync(ServicoAssincrono):
+    def __init__(self):
+        super().__init__(ProdutoService())
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+
+
+class ResumoService:
+    def registrar_delta(self, db: Session, data_visita: datetime, guia_id: int,
+                        visitas: int, turistas: int, taxas: int, produtos: int):
+        # Valores em centavos
+        self.registrar_deltas(db, {(data_visita.date(), guia_id): [visitas, turistas, taxas, produtos]})
+
+    def registrar_deltas(self, db: Session, deltas: dict):
+        """
+        Soma os deltas no resumo diário. Não faz commit: quem chama decide a transação,
+        para o resumo nunca ficar diferente das visitas gravadas.
+        """
+        linhas = [
+            {
+                "dia": dia,
+                "guia_id": guia_id,
+                "qtd_visitas": visitas,
+                "qtd_turistas": turistas,
+                "total_taxas_centavos": taxas,
+                "total_produtos_centavos": produtos,
+            }
+            for (dia, guia_id), (visitas, turistas, taxas, produtos) in deltas.items()
+            if guia_id is not None
+        ]
+        if not linhas:
+            return
+
+        # Upsert: se o dia/guia ainda não existe eu insiro, senão só somo o delta na linha
+        insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(models.ResumoDiario)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.ResumoDiario.dia, models.ResumoDiario.guia_id],
+            set_={
+                "qtd_visitas": models.ResumoDiario.qtd_visitas + stmt.excluded.qtd_visitas,
+                "qtd_turistas": models.ResumoDiario.qtd_turistas + stmt.excluded.qtd_turistas,
+                "total_taxas_centavos": models.ResumoDiario.total_taxas_centavos + stmt.excluded.total_taxas_centavos,
+                "total_produtos_centavos": models.ResumoDiario.total_produtos_centavos + stmt.excluded.total_produtos_centavos,
+            },
+        )
+        db.execute(stmt, linhas)
+
+    def acumular(self, deltas: dict, data_visita: datetime, guia_id: int,
+                 visitas: int, turistas: int, taxas: int, produtos: int):
+        # Agrupo vários deltas do mesmo dia/guia antes de mandar para o banco (usado nos lotes)
+        atual = deltas.setdefault((data_visita.date(), guia_id), [0, 0, 0, 0])
+        atual[0] += visitas
+        atual[1] += turistas
+        atual[2] += taxas
+        atual[3] += produtos
+
+    def reconstruir(self, db: Session):
+        # Apago tudo e recalculo a partir das visitas (usado para corrigir ou preencher o resumo)
+        try:
+            db.query(models.ResumoDiario).delete()
+
+            agregado = db.query(
+                func.date(models.Visita.data_visita),
+                models.Visita.guia_id,
+                func.count(models.Visita.id),
+                func.coalesce(func.sum(models.Visita.qtd_turistas), 0),
+                func.coalesce(func.sum(models.Visita.valor_taxa_guia_centavos), 0),
+                func.coalesce(func.sum(models.Visita.total_produtos_centavos), 0),
+            ).filter(
+                models.Visita.guia_id.isnot(None),
+                models.Visita.data_visita.isnot(None),
+            ).group_by(func.date(models.Visita.data_visita), models.Visita.guia_id)
+
+            deltas = defaultdict(lambda: [0, 0, 0, 0])
+            for dia, guia_id, visitas, turistas, taxas, produtos in agregado:
+                deltas[(date.fromisoformat(str(dia)), guia_id)] = [visitas, turistas, taxas, produtos]
+
+            self.registrar_deltas(db, deltas)
+            db.commit()
+
+            return len(deltas)
+        except Exception:
+            db.rollback()
+            raise
+
+    def somar_periodo(self, db: Session, inicio: datetime = None, fim_exclusivo: datetime = None):
+        """
+        Soma o período [inicio, fim_exclusivo) usando o resumo para os dias completos e as
+        visitas só nas pontas que começam ou terminam no meio de um dia. Os totais saem em centavos.
+        """
+        primeiro_dia = None
+        if inicio is not None:
+            primeiro_dia = inicio.date() if inicio.time() == time.min else inicio.date() + timedelta(days=1)
+
+        ultimo_dia = fim_exclusivo.date() if fim_exclusivo is not None else None
+
+        # Período menor que um dia completo: não compensa usar o resumo
+        if primeiro_dia is not None and ultimo_dia is not None and primeiro_dia >= ultimo_dia:
+            return self._somar_visitas(db, inicio, fim_exclusivo)
+
+        query = db.query(
+            func.coalesce(func.sum(models.ResumoDiario.total_taxas_centavos), 0),
+            func.coalesce(func.sum(models.ResumoDiario.total_produtos_centavos), 0),
+            func.coalesce(func.sum(models.ResumoDiario.qtd_visitas), 0),
+        )
+        if primeiro_dia is not None:
+            query = query.filter(models.ResumoDiario.dia >= primeiro_dia)
+        if ultimo_dia is not None:
+            query = query.filter(models.ResumoDiario.dia < ultimo_dia)
+
+        taxas, produtos, quantidade = query.one()
+
+        pontas = []
+        if inicio is not None and inicio.time() != time.min:
+            pontas.append((inicio, datetime.combine(primeiro_dia, time.min)))
+        if fim_exclusivo is not None and fim_exclusivo.time() != time.min:
+            pontas.append((datetime.combine(ultimo_dia, time.min), fim_exclusivo))
+
+        for ponta_inicio, ponta_fim in pontas:
+            ponta = self._somar_visitas(db, ponta_inicio, ponta_fim)
+            taxas += ponta[0]
+            produtos += ponta[1]
+            quantidade += ponta[2]
+
+        return taxas, produtos, quantidade
+
+    def somar_por_dia(self, db: Session, inicio: datetime, fim_exclusivo: datetime):
+        """
+        Mesma ideia do somar_periodo, mas separado por dia: devolve {dia: [visitas, turistas,
+        taxas, produtos]} (valores em centavos) só com os dias que tiveram movimento.
+        """
+        primeiro_dia = inicio.date() if inicio.time() == time.min else inicio.date() + timedelta(days=1)
+        ultimo_dia = fim_exclusivo.date()
+
+        # Período menor que um dia completo: tudo sai das visitas
+        if primeiro_dia >= ultimo_dia:
+            return self._somar_visitas_por_dia(db, inicio, fim_exclusivo)
+
+        dias = self._somar_visitas_por_dia(db, inicio, datetime.combine(primeiro_dia, time.min)) if inicio.time() != time.min else {}
+
+        query = db.query(
+            models.ResumoDiario.dia,
+            func.sum(models.ResumoDiario.qtd_visitas),
+            func.sum(models.ResumoDiario.qtd_turistas),
+            func.sum(models.ResumoDiario.total_taxas_centavos),
+            func.sum(models.ResumoDiario.total_produtos_centavos),
+        ).filter(
+            models.ResumoDiario.dia >= primeiro_dia,
+            models.ResumoDiario.dia < ultimo_dia,
+        ).group_by(models.ResumoDiario.dia)
+
+        for dia, visitas, turistas, taxas, produtos in query:
+            dias[dia] = [visitas, turistas, taxas, produtos]
+
+        if fim_exclusivo.time() != time.min:
+            dias.update(self._somar_visitas_por_dia(db, datetime.combine(ultimo_dia, time.min), fim_exclusivo))
+
+        return dias
+
+    def _somar_visitas_por_dia(self, db: Session, inicio: datetime, fim_exclusivo: datetime):
+        # Mesmos filtros do _somar_visitas, agrupado por dia
+        query = db.query(
+            func.date(models.Visita.data_visita),
+            func.count(models.Visita.id),
+            func.coalesce(func.sum(models.Visita.qtd_turistas), 0),
+            func.coalesce(func.sum(models.Visita.valor_taxa_guia_centavos), 0),
+            func.coalesce(func.sum(models.Visita.total_produtos_centavos), 0),
+        ).filter(
+            models.Visita.data_visita >= inicio,
+            models.Visita.data_visita < fim_exclusivo,
+        ).group_by(func.date(models.Visita.data_visita))
+
+        return {
+            date.fromisoformat(str(dia)): [visitas, turistas, taxas, produtos]
+            for dia, visitas, turistas, taxas, produtos in query
+        }
+
+    def _somar_visitas(self, db: Session, inicio: datetime = None, fim_exclusivo: datetime = None):
+        query = db.query(
+            func.coalesce(func.sum(models.Visita.valor_taxa_guia_centavos), 0),
+            func.coalesce(func.sum(models.Visita.total_produtos_centavos), 0),
+            func.count(models.Visita.id),
+        )
+        if inicio is not None:
+            query = query.filter(models.Visita.data_visita >= inicio)
+        if fim_exclusivo is not None:
+            query = query.filter(models.Visita.data_visita < fim_exclusivo)
+
+        return tuple(query.one())
@@ -1,13 +1,67 @@
+import base64
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Optional
 from app import models, schemas
-from datetime import datetime, timedelta
+from app.services.assincrono import ServicoAssincrono
+from app.ao_vivo import Movimento, painel_ao_vivo
+from app.cache import catalogo_cache
+from app.dinheiro import para_centavos, para_reais
+from app.services.resumos_service import ResumoService
+from datetime import date, datetime, time, timedelta
+
+resumo_service = ResumoService()
+
+# Uma série não pode passar disso (por exemplo, 'hour' num período de anos)
+MAXIMO_PONTOS_SERIE = 5000
+
+def inicio_do_intervalo(momento: datetime, intervalo: str) -> datetime:
+    # Início do intervalo (hora, dia, semana ou mês) que contém o momento; a semana começa na segunda
+    if intervalo == "hour":
+        return momento.replace(minute=0, second=0, microsecond=0)
+
+    dia = momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    if intervalo == "week":
+        return dia - timedelta(days=dia.weekday())
+    if intervalo == "month":
+        return dia.replace(day=1)
+    return dia
+
+def proximo_intervalo(inicio: datetime, intervalo: str) -> datetime:
+    if intervalo == "hour":
+        return inicio + timedelta(hours=1)
+    if intervalo == "week":
+        return inicio + timedelta(days=7)
+    if intervalo == "month":
+        # Do dia 28 mais 4 dias sempre cai no mês seguinte
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+def filtrar_periodo(query, data_inicio: datetime = None, data_fim: datetime = None):
+    # Filtro de período usado em todos os lugares que consultam visitas por data
+    # (a query precisa envolver a tabela de visitas)
+
+    # Travinha de segurança para evitar datas invertidas
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail='A data de início não pode ser depois da data de fim.')
+
+    if data_inicio:
+        query = query.filter(models.Visita.data_visita >= data_inicio)
+        
+    if data_fim:
+        # Adiciono 1 dia na data de fim para garantir que pegue as visitas até o último minuto do dia
+        data_fim_ajustada = data_fim + timedelta(days=1)
+        query = query.filter(models.Visita.data_visita < data_fim_ajustada)
+
+    return query
 
 class VisitaService:
     def registrar_visita(self, db: Session, dados_visita: schemas.VisitaCreate):
         try:
             # Procuro o guia e já verifico se ele existe e se não está "de castigo" (inativo)
-            guia = db.query(models.Guia).filter(models.Guia.id == dados_visita.guia_id).first()
+            # O catálogo vem do cache em memória, então normalmente não há consulta ao banco aqui
+            guia = catalogo_cache.guia(db, dados_visita.guia_id)
 
             if not guia:
                 raise HTTPException(status_code=404, detail=f'Guia com ID {dados_visita.guia_id} não encontrado.')
@@ -17,50 +71,77 @@ class VisitaService:
 
             # Pego todos os IDs de produtos que vieram na lista para validar de uma vez só
             ids_enviados = [item.produto_id for item in dados_visita.itens]
-            produtos_no_banco = db.query(models.Produto).filter(models.Produto.id.in_(ids_enviados)).all()
+            produtos_no_catalogo = catalogo_cache.produtos(db, ids_enviados)
 
-            # Se o que eu achei no banco for diferente do que me enviaram, tem ID errado no meio
-            if len(produtos_no_banco) != len(set(ids_enviados)):
+            # Se o que eu achei no catálogo for diferente do que me enviaram, tem ID errado no meio
+            if len(produtos_no_catalogo) != len(set(ids_enviados)):
                 raise HTTPException(status_code=400, detail='Um ou mais IDs de produtos são inválidos ou não existem.')
 
             # Crio um mapa de preços para facilitar a conta e não ter que ficar voltando no banco
-            mapa_precos = {p.id: p.preco for p in produtos_no_banco}
+            # (todas as contas são feitas em centavos, e só viram reais na resposta)
+            mapa_precos = {produto_id: p.preco_centavos for produto_id, p in produtos_no_catalogo.items()}
+            taxa_centavos = para_centavos(dados_visita.valor_taxa_guia)
 
-            soma_produtos = 0.0
+            soma_produtos = 0
             objetos_itens = []
 
             for item in dados_visita.itens:
+                # Preço zero (brinde) é um preço válido; só o produto fora do catálogo é recusado
                 preco_atual = mapa_precos.get(item.produto_id)
+                if preco_atual is None:
+                    raise HTTPException(status_code=400, detail='Um ou mais IDs de produtos são inválidos ou não existem.')
 
-                if preco_atual:
-                    # Somo o valor total dos produtos vendidos
-                    soma_produtos += (preco_atual * item.quantidade)
-    
-                    # Importante: gravo o preço que o produto custa HOJE. 
-                    # Se o preço mudar amanhã, meu faturamento antigo continua certo.
-                    objetos_itens.append(models.VisitaProduto(
-                        produto_id=item.produto_id,
-                        quantidade=item.quantidade,
-                        preco_na_hora=preco_atual
-                    ))
+                # Somo o valor total dos produtos vendidos
+                soma_produtos += (preco_atual * item.quantidade)
+
+                # Importante: gravo o preço que o produto custa HOJE. 
+                # Se o preço mudar amanhã, meu faturamento antigo continua certo.
+                objetos_itens.append(models.VisitaProduto(
+                    produto_id=item.produto_id,
+                    quantidade=item.quantidade,
+                    preco_na_hora_centavos=preco_atual,
+                    subtotal_centavos=preco_atual * item.quantidade,
+                ))
 
             # Monto o registro da visita com os cálculos que fiz acima
             nova_visita = models.Visita(
                 guia_id=dados_visita.guia_id,
                 qtd_turistas=dados_visita.qtd_turistas,
-                valor_taxa_guia=dados_visita.valor_taxa_guia,
-                total_produtos=soma_produtos,
+                valor_taxa_guia_centavos=taxa_centavos,
+                total_produtos_centavos=soma_produtos,
                 itens=objetos_itens
             )
 
             db.add(nova_visita)
+            db.flush() # o flush já me devolve o ID e a data que o banco gerou
+
+            # Atualizo o resumo diário na mesma transação da visita
+            resumo_service.registrar_delta(
+                db, nova_visita.data_visita, nova_visita.guia_id,
+                1, nova_visita.qtd_turistas, taxa_centavos, soma_produtos
+            )
+
+            # Monto o retorno antes do commit, com o que já tenho em memória, para não precisar
+            # de um refresh (e das consultas de guia e itens) depois de gravar
+            resposta = schemas.VisitaResponse(
+                id=nova_visita.id,
+                data_visita=nova_visita.data_visita,
+                qtd_turistas=nova_visita.qtd_turistas,
+                total_produtos=para_reais(soma_produtos),
+                # Calculo o total geral (taxa + produtos) para mostrar no retorno da API
+                total_arrecadado=para_reais(taxa_centavos + soma_produtos),
+                guia=schemas.GuiaResumido(nome=guia.nome, telefone=guia.telefone),
+                itens=[self._item_para_resposta(i) for i in objetos_itens],
+            )
+
+            movimento = self._movimento(nova_visita, objetos_itens, produtos_no_catalogo)
+
             db.commit()
-            db.refresh(nova_visita) # refresh aqui para o banco me devolver o ID e a data que ele gerou
-            
-            # Calculo o total geral (taxa + produtos) para mostrar no retorno da API
-            nova_visita.total_arrecadado = nova_visita.valor_taxa_guia + nova_visita.total_produtos
 
-            return nova_visita
+            # Só depois do commit a visita entra no painel ao vivo
+            painel_ao_vivo.publicar([movimento])
+
+            return resposta
         
         except HTTPException as error:
             db.rollback()
@@ -70,29 +151,280 @@ class VisitaService:
             raise HTTPException(status_code=500, detail='Erro interno ao registrar visita.')
         
 
-    def listar_visitas(self, db: Session):
-        visitas = db.query(models.Visita).all()
-        
-        resultado = []
-        for v in visitas:
-            # Para cada visita da lista, eu calculo o total arrecadado na hora de mostrar
-            total_geral = v.valor_taxa_guia + v.total_produtos
-
-            visita_schema = schemas.VisitaResponse(
-                id=v.id,
-                guia_id=v.guia_id,
-                data_visita=v.data_visita,
-                qtd_turistas=v.qtd_turistas,
-                valor_taxa_guia=v.valor_taxa_guia,
-                total_produtos=v.total_produtos,
-                total_arrecadado=total_geral,
-                guia=v.guia,
-                itens=v.itens 
+    def registrar_lote(self, db: Session, lote: schemas.VisitaLote):
+        resultados = [None] * len(lote.visitas)
+
+        # Valido todos os guias e produtos do lote com uma consulta para cada, e não uma por visita
+        # (e, com o cache do catálogo, normalmente sem consulta nenhuma)
+        ids_guias = {v.guia_id for v in lote.visitas}
+        guias_ativos = {
+            guia_id: g.ativo for guia_id, g in catalogo_cache.guias(db, ids_guias).items()
+        }
+
+        ids_produtos = {item.produto_id for v in lote.visitas for item in v.itens}
+        produtos_no_catalogo = catalogo_cache.produtos(db, ids_produtos)
+        mapa_precos = {produto_id: p.preco_centavos for produto_id, p in produtos_no_catalogo.items()}
+        nomes = {produto_id: p.nome for produto_id, p in produtos_no_catalogo.items()}
+
+        validas = []
+        for indice, dados_visita in enumerate(lote.visitas):
+            if dados_visita.guia_id not in guias_ativos:
+                erro = f'Guia com ID {dados_visita.guia_id} não encontrado.'
+            elif not guias_ativos[dados_visita.guia_id]:
+                erro = 'Não dá para registrar visita para um guia inativo.'
+            else:
+                erro = None
+
+            soma_produtos = 0
+            itens = []
+            for item in dados_visita.itens if erro is None else ():
+                # Preço zero (brinde) é um preço válido; só o produto fora do catálogo derruba a visita
+                preco_atual = mapa_precos.get(item.produto_id)
+                if preco_atual is None:
+                    erro = f'Produto com ID {item.produto_id} não encontrado.'
+                    break
+
+                soma_produtos += (preco_atual * item.quantidade)
+                # Mesmo cuidado do cadastro individual: gravo o preço de HOJE
+                itens.append({
+                    "produto_id": item.produto_id,
+                    "quantidade": item.quantidade,
+                    "preco_na_hora_centavos": preco_atual,
+                    "subtotal_centavos": preco_atual * item.quantidade,
+                })
+
+            if erro:
+                resultados[indice] = schemas.ResultadoItemLote(indice=indice, sucesso=False, erro=erro)
+                continue
+
+            validas.append((indice, dados_visita, para_centavos(dados_visita.valor_taxa_guia), soma_produtos, itens))
+
+        # Gravo em blocos: cada bloco é uma transação, então um erro só derruba o próprio bloco
+        tamanho_bloco = lote.tamanho_bloco or len(validas) or 1
+        for inicio in range(0, len(validas), tamanho_bloco):
+            bloco = validas[inicio:inicio + tamanho_bloco]
+            try:
+                gravadas = self._inserir_visitas(db, [
+                    {
+                        "guia_id": dados_visita.guia_id,
+                        "qtd_turistas": dados_visita.qtd_turistas,
+                        "valor_taxa_guia_centavos": taxa_centavos,
+                        "total_produtos_centavos": soma_produtos,
+                    }
+                    for _, dados_visita, taxa_centavos, soma_produtos, _ in bloco
+                ])
+
+                linhas_itens = []
+                deltas = {}
+                for (indice, dados_visita, taxa_centavos, soma_produtos, itens), visita in zip(bloco, gravadas):
+                    linhas_itens.extend({**item, "visita_id": visita.id} for item in itens)
+                    resumo_service.acumular(
+                        deltas, visita.data_visita, dados_visita.guia_id,
+                        1, dados_visita.qtd_turistas, taxa_centavos, soma_produtos
+                    )
+
+                if linhas_itens:
+                    db.execute(insert(models.VisitaProduto), linhas_itens)
+
+                resumo_service.registrar_deltas(db, deltas)
+                db.commit()
+
+                painel_ao_vivo.publicar([
+                    Movimento(
+                        visita.data_visita, 1, dados_visita.qtd_turistas, taxa_centavos, soma_produtos,
+                        tuple(
+                            (item["produto_id"], nomes[item["produto_id"]], item["quantidade"], item["subtotal_centavos"])
+                            for item in itens
+                        ),
+                    )
+                    for (_, dados_visita, taxa_centavos, soma_produtos, itens), visita in zip(bloco, gravadas)
+                ])
+
+                for (indice, *_), visita in zip(bloco, gravadas):
+                    resultados[indice] = schemas.ResultadoItemLote(indice=indice, sucesso=True, visita_id=visita.id)
+            except Exception:
+                db.rollback()
+                for indice, *_ in bloco:
+                    resultados[indice] = schemas.ResultadoItemLote(
+                        indice=indice, sucesso=False, erro='Erro interno ao gravar o bloco desta visita. Tente reenviar.'
+                    )
+
+        registradas = sum(1 for r in resultados if r.sucesso)
+
+        return schemas.ResultadoLote(
+            total_recebidas=len(resultados),
+            total_registradas=registradas,
+            total_com_erro=len(resultados) - registradas,
+            resultados=resultados,
+        )
+
+    def _inserir_visitas(self, db: Session, linhas: list):
+        """
+        Grava as visitas de um bloco e devolve (id, data_visita) de cada uma, na ordem enviada.
+        """
+        if db.get_bind().dialect.name != "sqlite":
+            # Um INSERT com vários valores; o RETURNING me devolve id e data na ordem enviada
+            return db.execute(
+                insert(models.Visita).returning(
+                    models.Visita.id, models.Visita.data_visita, sort_by_parameter_order=True
+                ),
+                linhas,
+            ).all()
+
+        # No SQLite o RETURNING com ordem garantida vira um INSERT por visita. Então gravo tudo num
+        # executemany sem RETURNING e leio as últimas linhas de volta: o INSERT já pegou a trava de
+        # escrita do banco, que só sai no commit, então ninguém grava visita no meio e as visitas
+        # do bloco são os últimos ids, em sequência e na ordem enviada
+        db.execute(insert(models.Visita), linhas)
+        ultimo_id = select(func.max(models.Visita.id)).scalar_subquery()
+        return db.execute(
+            select(models.Visita.id, models.Visita.data_visita)
+            .where(models.Visita.id > ultimo_id - len(linhas))
+            .order_by(models.Visita.id)
+        ).all()
+
+    def listar_visitas(
+        self,
+        db: Session,
+        limite: int = 100,
+        cursor: Optional[str] = None,
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        guia_id: Optional[int] = None,
+    ):
+        query = db.query(models.Visita).options(
+            # Carrego guia e itens em lote (uma consulta para cada), e não uma por visita
+            joinedload(models.Visita.guia),
+            selectinload(models.Visita.itens),
+        )
+        visitas, tem_proxima = self._pagina(query, limite, cursor, data_inicio, data_fim, guia_id)
+
+        resultado = [self._para_resposta(v) for v in visitas]
+
+        proximo_cursor = self._codificar_cursor(visitas[-1]) if tem_proxima else None
+
+        return resultado, proximo_cursor
+
+    def listar_visitas_rapido(
+        self,
+        db: Session,
+        limite: int = 100,
+        cursor: Optional[str] = None,
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        guia_id: Optional[int] = None,
+    ):
+        """
+        Mesma página do listar_visitas, mas lida em tuplas de colunas (sem montar objetos do ORM
+        nem schemas) e devolvida em dicionários no formato do VisitaResponse.
+        """
+        query = db.query(
+            models.Visita.id,
+            models.Visita.data_visita,
+            models.Visita.qtd_turistas,
+            models.Visita.valor_taxa_guia_centavos,
+            models.Visita.total_produtos_centavos,
+            models.Guia.id.label("guia_encontrado"),
+            models.Guia.nome,
+            models.Guia.telefone,
+        ).outerjoin(models.Guia, models.Guia.id == models.Visita.guia_id)
+        linhas, tem_proxima = self._pagina(query, limite, cursor, data_inicio, data_fim, guia_id)
+
+        # Os itens da página inteira vêm numa consulta só
+        itens = {}
+        if linhas:
+            consulta_itens = db.query(
+                models.VisitaProduto.visita_id,
+                models.VisitaProduto.produto_id,
+                models.VisitaProduto.quantidade,
+                models.VisitaProduto.preco_na_hora_centavos,
+            ).filter(
+                models.VisitaProduto.visita_id.in_([linha.id for linha in linhas])
+            ).order_by(models.VisitaProduto.id)
+
+            for visita_id, produto_id, quantidade, preco_na_hora_centavos in consulta_itens:
+                itens.setdefault(visita_id, []).append(
+                    {"produto_id": produto_id, "quantidade": quantidade, "preco_na_hora": para_reais(preco_na_hora_centavos)}
+                )
+
+        resultado = [
+            {
+                "id": linha.id,
+                "data_visita": linha.data_visita,
+                "qtd_turistas": linha.qtd_turistas,
+                "total_produtos": para_reais(linha.total_produtos_centavos),
+                "total_arrecadado": para_reais(linha.valor_taxa_guia_centavos + linha.total_produtos_centavos),
+                "guia": {"nome": linha.nome, "telefone": linha.telefone} if linha.guia_encontrado else None,
+                "itens": itens.get(linha.id, []),
+            }
+            for linha in linhas
+        ]
+
+        proximo_cursor = self._codificar_cursor(linhas[-1]) if tem_proxima else None
+
+        return resultado, proximo_cursor
+
+    def _pagina(self, query, limite, cursor, data_inicio, data_fim, guia_id):
+        # Paginação por cursor (keyset): ordeno por (data_visita, id) e continuo a partir da
+        # última visita entregue, em vez de usar OFFSET, que fica mais lento a cada página
+        query = filtrar_periodo(query, data_inicio, data_fim)
+
+        if guia_id is not None:
+            query = query.filter(models.Visita.guia_id == guia_id)
+
+        if cursor:
+            ultimo_id, ultima_data = self._decodificar_cursor(cursor)
+            # Comparo com a data gravada no banco (e não com a do cursor) para o formato ser
+            # sempre o mesmo; a data do cursor só é usada se a visita tiver sido apagada
+            data_referencia = func.coalesce(
+                select(models.Visita.data_visita).where(models.Visita.id == ultimo_id).scalar_subquery(),
+                ultima_data,
+            )
+            query = query.filter(
+                tuple_(models.Visita.data_visita, models.Visita.id) > tuple_(data_referencia, ultimo_id)
             )
-            resultado.append(visita_schema)
 
-        return resultado
-    
+        # Peço um registro a mais só para saber se existe próxima página
+        linhas = query.order_by(models.Visita.data_visita, models.Visita.id).limit(limite + 1).all()
+
+        return linhas[:limite], len(linhas) > limite
+
+    def _para_resposta(self, v: models.Visita):
+        # Para cada visita, eu calculo o total arrecadado na hora de mostrar.
+        # O schema é montado aqui dentro (e não pelo FastAPI) para guia e itens serem lidos
+        # enquanto a sessão ainda está disponível, inclusive no modo assíncrono
+        total_geral = v.valor_taxa_guia_centavos + v.total_produtos_centavos
+
+        return schemas.VisitaResponse(
+            id=v.id,
+            data_visita=v.data_visita,
+            qtd_turistas=v.qtd_turistas,
+            total_produtos=para_reais(v.total_produtos_centavos),
+            total_arrecadado=para_reais(total_geral),
+            guia=v.guia,
+            itens=[self._item_para_resposta(i) for i in v.itens]
+        )
+
+    def _item_para_resposta(self, item: models.VisitaProduto):
+        return schemas.ItemVenda(
+            produto_id=item.produto_id,
+            quantidade=item.quantidade,
+            preco_na_hora=para_reais(item.preco_na_hora_centavos),
+        )
+
+    def _codificar_cursor(self, visita) -> str:
+        # Aceita tanto o objeto do ORM quanto a linha do caminho rápido (ambos têm id e data)
+        bruto = f"{visita.id}|{visita.data_visita.isoformat()}"
+        return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+    def _decodificar_cursor(self, cursor: str):
+        try:
+            bruto = base64.urlsafe_b64decode(cursor.encode()).decode()
+            ultimo_id, ultima_data = bruto.split("|", 1)
+            return int(ultimo_id), datetime.fromisoformat(ultima_data)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail='Cursor de paginação inválido.')
+
     def buscar_por_id(self, db: Session, visita_id: int):
         visita = db.query(models.Visita).filter(models.Visita.id == visita_id).first()
 
@@ -104,8 +436,16 @@ class VisitaService:
     def deletar_visita(self, db: Session, visita_id: int):
         visita = self.buscar_por_id(db, visita_id)
         try:
+            # Tiro a visita do resumo diário antes de apagar
+            resumo_service.registrar_delta(
+                db, visita.data_visita, visita.guia_id,
+                -1, -visita.qtd_turistas, -visita.valor_taxa_guia_centavos, -visita.total_produtos_centavos
+            )
+            # Os itens seriam lidos de qualquer forma pelo cascade do delete
+            removido = self._movimento(visita, visita.itens).invertido()
             db.delete(visita)
             db.commit()
+            painel_ao_vivo.publicar([removido])
             return True
         except Exception:
             db.rollback()
@@ -118,75 +458,253 @@ class VisitaService:
         try:
             # Valido os novos produtos da mesma forma que fiz no cadastro
             ids_enviados = [item.produto_id for item in dados.itens]
-            produtos_no_banco = db.query(models.Produto).filter(models.Produto.id.in_(ids_enviados)).all()
+            produtos_no_catalogo = catalogo_cache.produtos(db, ids_enviados)
 
-            if len(produtos_no_banco) != len(set(ids_enviados)):
+            if len(produtos_no_catalogo) != len(set(ids_enviados)):
                 raise HTTPException(status_code=400, detail='IDs de produtos inválidos.')
             
-            mapa_precos = {p.id: p.preco for p in produtos_no_banco}
+            mapa_precos = {produto_id: p.preco_centavos for produto_id, p in produtos_no_catalogo.items()}
+
+            # Guardo como a visita estava para tirar do resumo diário (e do painel) os valores antigos
+            antes = self._movimento(visita_existente, visita_existente.itens).invertido()
+            deltas = {}
+            resumo_service.acumular(
+                deltas, visita_existente.data_visita, visita_existente.guia_id,
+                -1, -visita_existente.qtd_turistas,
+                -visita_existente.valor_taxa_guia_centavos, -visita_existente.total_produtos_centavos
+            )
             
             # Atualizo os dados básicos da visita
             visita_existente.guia_id = dados.guia_id
             visita_existente.qtd_turistas = dados.qtd_turistas
-            visita_existente.valor_taxa_guia = dados.valor_taxa_guia
+            visita_existente.valor_taxa_guia_centavos = para_centavos(dados.valor_taxa_guia)
 
-            # Para atualizar os produtos, achei mais fácil apagar os antigos e inserir os novos
-            db.query(models.VisitaProduto).filter(models.VisitaProduto.visita_id == visita_id).delete()
+            # Os itens são comparados por produto: só o que mudou é gravado, e o total dos
+            # produtos anda junto com essa diferença, sem somar tudo de novo
+            visita_existente.total_produtos_centavos += self._atualizar_itens(visita_existente, dados.itens, mapa_precos)
 
-            soma_produtos = 0.0
-            novos_itens = []
-            for item in dados.itens:
-                preco_atual = mapa_precos.get(item.produto_id)
-                if preco_atual:
-                    soma_produtos += (preco_atual * item.quantidade)
-                    novos_itens.append(models.VisitaProduto(
-                        visita_id=visita_id,
-                        produto_id=item.produto_id,
-                        quantidade=item.quantidade,
-                        preco_na_hora=preco_atual
-                    ))
-
-            visita_existente.total_produtos = soma_produtos
-            visita_existente.itens = novos_itens
+            resumo_service.acumular(
+                deltas, visita_existente.data_visita, visita_existente.guia_id,
+                1, visita_existente.qtd_turistas,
+                visita_existente.valor_taxa_guia_centavos, visita_existente.total_produtos_centavos
+            )
+            resumo_service.registrar_deltas(db, deltas)
+
+            # Monto o retorno antes do commit, como no cadastro, para não precisar de um refresh
+            guia = catalogo_cache.guia(db, visita_existente.guia_id)
+            resposta = schemas.VisitaResponse(
+                id=visita_existente.id,
+                data_visita=visita_existente.data_visita,
+                qtd_turistas=visita_existente.qtd_turistas,
+                total_produtos=para_reais(visita_existente.total_produtos_centavos),
+                total_arrecadado=para_reais(
+                    visita_existente.valor_taxa_guia_centavos + visita_existente.total_produtos_centavos
+                ),
+                guia=schemas.GuiaResumido(nome=guia.nome, telefone=guia.telefone) if guia else None,
+                itens=[self._item_para_resposta(i) for i in visita_existente.itens],
+            )
             
+            depois = self._movimento(visita_existente, visita_existente.itens, produtos_no_catalogo)
+
             db.commit()
-            db.refresh(visita_existente)
 
-            # Recalculo o total para o retorno da API ficar correto
-            visita_existente.total_arrecadado = visita_existente.valor_taxa_guia + visita_existente.total_produtos
-            
-            return visita_existente
+            painel_ao_vivo.publicar([antes, depois])
+
+            return resposta
         except HTTPException as error:
             db.rollback()
             raise error
         except Exception:
             db.rollback()
             raise HTTPException(status_code=500, detail='Erro ao atualizar visita.')
+
+    def _movimento(self, visita: models.Visita, itens, catalogo: dict = None) -> Movimento:
+        # O que a visita soma no painel ao vivo; o nome vem do cache do catálogo quando está à mão
+        catalogo = catalogo or {}
+        return Movimento(
+            visita.data_visita, 1, visita.qtd_turistas, visita.valor_taxa_guia_centavos, visita.total_produtos_centavos,
+            tuple(
+                (i.produto_id, catalogo[i.produto_id].nome if i.produto_id in catalogo else None, i.quantidade, i.subtotal_centavos)
+                for i in itens
+            ),
+        )
+
+    def _atualizar_itens(self, visita: models.Visita, itens, mapa_precos: dict) -> int:
+        """
+        Aplica nos itens da visita só a diferença para a lista enviada: muda a quantidade de quem
+        mudou, insere os produtos novos e apaga os que saíram. Devolve quanto o total dos
+        produtos mudou, em centavos.
+        """
+        # Produto repetido na lista conta como uma linha só, com as quantidades somadas
+        quantidades = {}
+        for item in itens:
+            quantidades[item.produto_id] = quantidades.get(item.produto_id, 0) + item.quantidade
+
+        diferenca = 0
+        atuais = {}
+        for linha in list(visita.itens):
+            if linha.produto_id in quantidades and linha.produto_id not in atuais:
+                atuais[linha.produto_id] = linha
+            else:
+                # Produto que saiu da visita (ou linha repetida de um produto que já tem linha):
+                # o delete-orphan apaga a linha no flush
+                diferenca -= linha.subtotal_centavos
+                visita.itens.remove(linha)
+
+        for produto_id, quantidade in quantidades.items():
+            linha = atuais.get(produto_id)
+
+            if linha is None:
+                # Produto novo na visita entra com o preço de HOJE, como no cadastro
+                # (brinde, com preço zero, também é item da visita; só produto fora do catálogo não entra)
+                preco_atual = mapa_precos.get(produto_id)
+                if preco_atual is None:
+                    raise HTTPException(status_code=400, detail='IDs de produtos inválidos.')
+                visita.itens.append(models.VisitaProduto(
+                    produto_id=produto_id,
+                    quantidade=quantidade,
+                    preco_na_hora_centavos=preco_atual,
+                    subtotal_centavos=preco_atual * quantidade,
+                ))
+                diferenca += preco_atual * quantidade
+            elif linha.quantidade != quantidade:
+                # Quem já estava na visita mantém o preço gravado na hora da venda
+                novo_subtotal = linha.preco_na_hora_centavos * quantidade
+                diferenca += novo_subtotal - linha.subtotal_centavos
+                linha.quantidade = quantidade
+                linha.subtotal_centavos = novo_subtotal
+
+        return diferenca
     
     def gerar_relatorio_filtrado(self, db: Session, data_inicio: datetime = None, data_fim: datetime = None):
         # Travinha de segurança para evitar datas invertidas
         if data_inicio and data_fim and data_inicio > data_fim:
             raise HTTPException(status_code=400, detail='A data de início não pode ser depois da data de fim.')
 
-        query = db.query(models.Visita)
-    
-        if data_inicio:
-            query = query.filter(models.Visita.data_visita >= data_inicio)
-            
-        if data_fim:
-            # Adiciono 1 dia na data de fim para garantir que pegue as visitas até o último minuto do dia
-            data_fim_ajustada = data_fim + timedelta(days=1)
-            query = query.filter(models.Visita.data_visita < data_fim_ajustada)
-            
-        visitas = query.all()
-        
-        # Somo tudo o que foi filtrado para entregar o relatório final
-        taxas = sum(v.valor_taxa_guia for v in visitas)
-        tot_produtos = sum(v.total_produtos for v in visitas)
-        
+        # Mesmo critério do filtro de período: a data de fim vale até o último minuto do dia
+        fim_exclusivo = data_fim + timedelta(days=1) if data_fim else None
+
+        # Os dias completos vêm do resumo diário; só as pontas parciais olham as visitas.
+        # As somas chegam em centavos (exatas) e só viram reais aqui
+        taxas, tot_produtos, quantidade = resumo_service.somar_periodo(db, data_inicio, fim_exclusivo)
+
         return {
-            "total_taxas_guias": taxas,
-            "total_produtos": tot_produtos,
-            "faturamento_total_geral": taxas + tot_produtos,
-            "quantidade_visitas": len(visitas)
-        }
\ No newline at end of file
+            "total_taxas_guias": para_reais(taxas),
+            "total_produtos": para_reais(tot_produtos),
+            "faturamento_total_geral": para_reais(taxas + tot_produtos),
+            "quantidade_visitas": quantidade
+        }
+
+    def gerar_serie(self, db: Session, intervalo: str, data_inicio: datetime, data_fim: datetime):
+        """
+        Totais do período separados por hora, dia, semana ou mês, com os intervalos sem
+        movimento preenchidos com zero (a série vem completa, pronta para o gráfico).
+        """
+        if data_inicio > data_fim:
+            raise HTTPException(status_code=400, detail='A data de início não pode ser depois da data de fim.')
+
+        # As datas das visitas são gravadas sem fuso, então comparo sem fuso também
+        data_inicio = data_inicio.replace(tzinfo=None)
+        fim_exclusivo = data_fim.replace(tzinfo=None) + timedelta(days=1)
+
+        # Monto todos os intervalos antes de consultar, já zerados
+        totais = {}
+        atual = inicio_do_intervalo(data_inicio, intervalo)
+        while atual < fim_exclusivo:
+            if len(totais) == MAXIMO_PONTOS_SERIE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f'O período tem mais de {MAXIMO_PONTOS_SERIE} intervalos. Use um intervalo maior ou um período menor.'
+                )
+            totais[atual] = [0, 0, 0, 0]
+            atual = proximo_intervalo(atual, intervalo)
+
+        if intervalo == "hour":
+            # O resumo diário não tem hora, então aqui é um GROUP BY direto nas visitas
+            por_momento = self._somar_por_hora(db, data_inicio, fim_exclusivo)
+        else:
+            # Dia, semana e mês saem do resumo diário (as pontas parciais, das visitas)
+            por_momento = {
+                datetime.combine(dia, time.min): valores
+                for dia, valores in resumo_service.somar_por_dia(db, data_inicio, fim_exclusivo).items()
+            }
+
+        for momento, valores in por_momento.items():
+            acumulado = totais[inicio_do_intervalo(momento, intervalo)]
+            for posicao, valor in enumerate(valores):
+                acumulado[posicao] += valor
+
+        return [
+            {
+                "inicio": inicio,
+                "visitas": visitas,
+                "turistas": turistas,
+                "total_taxas": para_reais(taxas),
+                "total_produtos": para_reais(produtos),
+                "faturamento_total": para_reais(taxas + produtos),
+            }
+            for inicio, (visitas, turistas, taxas, produtos) in totais.items()
+        ]
+
+    def _somar_por_hora(self, db: Session, inicio: datetime, fim_exclusivo: datetime):
+        if db.get_bind().dialect.name == "postgresql":
+            hora = func.date_trunc("hour", models.Visita.data_visita)
+        else:
+            hora = func.strftime("%Y-%m-%d %H:00:00", models.Visita.data_visita)
+
+        query = db.query(
+            hora,
+            func.count(models.Visita.id),
+            func.coalesce(func.sum(models.Visita.qtd_turistas), 0),
+            func.coalesce(func.sum(models.Visita.valor_taxa_guia_centavos), 0),
+            func.coalesce(func.sum(models.Visita.total_produtos_centavos), 0),
+        ).filter(
+            models.Visita.data_visita >= inicio,
+            models.Visita.data_visita < fim_exclusivo,
+        ).group_by(hora)
+
+        # No SQLite a hora volta como texto; no PostgreSQL, como data com fuso
+        return {
+            (datetime.fromisoformat(momento) if isinstance(momento, str) else momento.replace(tzinfo=None)): [
+                visitas, turistas, taxas, produtos
+            ]
+            for momento, visitas, turistas, taxas, produtos in query
+        }
+
+    def totais_do_dia(self, db: Session, dia: date):
+        """
+        Carga do painel ao vivo: totais do dia (do resumo diário) e as vendas de cada produto
+        no dia, no formato do app.ao_vivo.
+        """
+        totais = db.query(
+            func.coalesce(func.sum(models.ResumoDiario.qtd_visitas), 0),
+            func.coalesce(func.sum(models.ResumoDiario.qtd_turistas), 0),
+            func.coalesce(func.sum(models.ResumoDiario.total_taxas_centavos), 0),
+            func.coalesce(func.sum(models.ResumoDiario.total_produtos_centavos), 0),
+        ).filter(models.ResumoDiario.dia == dia).one()
+
+        inicio = datetime.combine(dia, time.min)
+        vendas = db.query(
+            models.VisitaProduto.produto_id,
+            models.Produto.nome,
+            func.sum(models.VisitaProduto.quantidade),
+            func.sum(models.VisitaProduto.subtotal_centavos),
+        ).join(
+            models.Visita, models.Visita.id == models.VisitaProduto.visita_id
+        ).join(
+            models.Produto, models.Produto.id == models.VisitaProduto.produto_id
+        ).filter(
+            models.Visita.data_visita >= inicio,
+            models.Visita.data_visita < inicio + timedelta(days=1),
+        ).group_by(models.VisitaProduto.produto_id, models.Produto.nome)
+
+        return [int(valor) for valor in totais], {
+            produto_id: [nome, int(quantidade), int(subtotal)]
+            for produto_id, nome, quantidade, subtotal in vendas
+            if quantidade > 0
+        }
+
+
+class VisitaServiceAsync(ServicoAssincrono):
+    def __init__(self):
+        super().__init__(VisitaService())
@@ -0,0 +1,9 @@
+"""
+Benchmarks da Turismo API.
+
+    python -m benchmarks gerar --visitas 1000000
+    python -m benchmarks rodar --modo processo
+    python -m benchmarks comparar resultados/antes.json resultados/depois.json
+
+Veja a seção "Benchmarks" do README para os detalhes.
+"""
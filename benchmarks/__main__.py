@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import sys
+
+BANCO_PADRAO = "sqlite:///./benchmark.db"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks da Turismo API")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = comandos.add_parser("gerar", help="Preenche um banco com dados sintéticos")
+    gerar.add_argument("--banco", default=BANCO_PADRAO, help=f"URL do banco (padrão: {BANCO_PADRAO})")
+    gerar.add_argument("--guias", type=int, default=50)
+    gerar.add_argument("--produtos", type=int, default=200)
+    gerar.add_argument("--visitas", type=int, default=100_000)
+    gerar.add_argument("--dias", type=int, default=365, help="Quantos dias para trás as visitas cobrem")
+    gerar.add_argument("--itens-por-visita", type=float, default=1.8, help="Média de produtos diferentes por compra")
+    gerar.add_argument("--semente", type=int, default=42)
+
+    rodar = comandos.add_parser("rodar", help="Mede latência e vazão dos endpoints")
+    rodar.add_argument("--modo", choices=["processo", "http"], default="processo")
+    rodar.add_argument("--banco", default=BANCO_PADRAO, help="URL do banco (modo processo)")
+    rodar.add_argument("--url", default="http://127.0.0.1:8000", help="URL da API (modo http)")
+    rodar.add_argument("--api-key", default=os.getenv("API_KEY_TURISMO"))
+    rodar.add_argument("--cenario", action="append", dest="cenarios", help="Pode repetir; padrão: todos")
+    rodar.add_argument("--requisicoes", type=int, default=500)
+    rodar.add_argument("--concorrencia", type=int, default=8)
+    rodar.add_argument("--aquecimento", type=int, default=20)
+    rodar.add_argument("--semente", type=int, default=42)
+    rodar.add_argument("--saida", default="benchmarks/resultados", help="Pasta onde o JSON é gravado")
+
+    comparar = comandos.add_parser("comparar", help="Compara dois resultados gravados")
+    comparar.add_argument("antes")
+    comparar.add_argument("depois")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "gerar":
+        from benchmarks.gerador import gerar as gerar_dados
+        resumo = gerar_dados(
+            args.banco,
+            guias=args.guias,
+            produtos=args.produtos,
+            visitas=args.visitas,
+            dias=args.dias,
+            itens_por_visita=args.itens_por_visita,
+            semente=args.semente,
+        )
+        print(json.dumps(resumo, indent=2, ensure_ascii=False))
+
+    elif args.comando == "rodar":
+        if args.modo == "processo":
+            # O app lê essas variáveis na importação, então precisam estar prontas antes
+            os.environ["DATABASE_URL"] = args.banco
+            # Sem os limites de uso: com eles, os cenários mediriam o custo de um 429, não o do endpoint
+            os.environ.setdefault("LIMITES_HABILITADOS", "false")
+            if not args.api_key:
+                args.api_key = secrets.token_hex(16)
+            os.environ["API_KEY_TURISMO"] = args.api_key
+        elif not args.api_key:
+            sys.exit("Informe --api-key (ou a variável API_KEY_TURISMO) para o modo http.")
+
+        from benchmarks import harness
+
+        parametros = {
+            "modo": args.modo,
+            "destino": args.banco if args.modo == "processo" else args.url,
+            "requisicoes": args.requisicoes,
+            "concorrencia": args.concorrencia,
+            "aquecimento": args.aquecimento,
+            "semente": args.semente,
+            "db_async": os.getenv("DB_ASYNC", "true"),
+        }
+        resultados = asyncio.run(harness.executar(
+            args.modo,
+            args.api_key,
+            url=args.url,
+            cenarios=args.cenarios,
+            requisicoes=args.requisicoes,
+            concorrencia=args.concorrencia,
+            aquecimento=args.aquecimento,
+            semente=args.semente,
+        ))
+        print(harness.formatar(resultados))
+        print(f"\nResultado gravado em {harness.salvar(resultados, parametros, args.saida)}")
+
+        recusados = harness.recusas(resultados)
+        if recusados:
+            # 429/503 vêm dos limites de uso da API (ou da fila de relatórios cheia): as latências
+            # desses cenários são de respostas recusadas e não servem para comparar
+            detalhes = ", ".join(f"{nome}: {qtd}" for nome, qtd in recusados.items())
+            print(f"\nATENÇÃO: requisições recusadas pelos limites de uso ({detalhes}). "
+                  "Rode a API com LIMITES_HABILITADOS=false ou aumente os limites da chave usada.", file=sys.stderr)
+            sys.exit(1)
+
+    elif args.comando == "comparar":
+        from benchmarks import harness
+        print(harness.comparar(args.antes, args.depois))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Gerador de dados sintéticos para os benchmarks.
+
+Preenche o banco com guias, produtos e visitas seguindo distribuições parecidas com as de
+um ponto turístico de verdade: mais movimento nos fins de semana e na alta temporada
+(dezembro a fevereiro e julho), poucos produtos concentrando a maior parte das vendas e
+muitas visitas sem compra nenhuma.
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app import models
+from app.database import Base, criar_engine
+from app.services.resumos_service import ResumoService
+
+CATEGORIAS = {
+    # categoria: (faixa de preço em centavos, peso na vitrine)
+    "Bebidas": ((300, 1200), 4),
+    "Comidas": ((800, 4000), 3),
+    "Artesanato": ((2000, 25000), 2),
+    "Lembranças": ((500, 6000), 2),
+}
+
+NOMES = ["Água", "Açaí", "Café", "Suco", "Tapioca", "Cocada", "Pulseira", "Cerâmica", "Chaveiro", "Cesto"]
+
+
+def _peso_do_dia(dia: datetime) -> float:
+    # Fins de semana quase dobram o movimento; alta temporada em jan e jul
+    peso = 1.8 if dia.weekday() >= 5 else 1.0
+    sazonal = 1.0 + 0.6 * math.cos((dia.timetuple().tm_yday - 15) / 365 * 2 * math.pi)
+    julho = 0.5 if dia.month == 7 else 0.0
+    return peso * (sazonal + julho)
+
+
+def _horario(aleatorio: random.Random) -> timedelta:
+    # Visitas entre 8h e 17h, com pico no fim da manhã
+    hora = min(max(aleatorio.gauss(11.5, 2.5), 8.0), 17.5)
+    return timedelta(hours=hora, seconds=aleatorio.randrange(3600))
+
+
+def gerar(
+    url: str,
+    guias: int = 50,
+    produtos: int = 200,
+    visitas: int = 100_000,
+    dias: int = 365,
+    itens_por_visita: float = 1.8,
+    semente: int = 42,
+    bloco: int = 20_000,
+    fim: datetime = None,
+):
+    """
+    Cria as tabelas (se ainda não existirem) e insere os dados. Devolve um resumo com o que
+    foi gerado e quanto tempo levou.
+    """
+    aleatorio = random.Random(semente)
+    engine = criar_engine(url)
+    Base.metadata.create_all(engine)
+    inicio_execucao = time.perf_counter()
+
+    with engine.begin() as conexao:
+        conexao.execute(insert(models.Guia), [
+            {"nome": f"Guia {i + 1}", "telefone": f"1199{i:07d}", "ativo": aleatorio.random() > 0.1}
+            for i in range(guias)
+        ])
+        linhas_produtos = []
+        for i in range(produtos):
+            categoria = aleatorio.choices(list(CATEGORIAS), weights=[p for _, p in CATEGORIAS.values()])[0]
+            minimo, maximo = CATEGORIAS[categoria][0]
+            linhas_produtos.append({
+                "nome": f"{NOMES[i % len(NOMES)]} {i + 1}",
+                "preco_centavos": aleatorio.randint(minimo, maximo),
+                "categoria": categoria,
+                "ativo": aleatorio.random() > 0.05,
+            })
+        conexao.execute(insert(models.Produto), linhas_produtos)
+
+        ids_guias = [g for (g,) in conexao.execute(models.Guia.__table__.select().with_only_columns(models.Guia.id))]
+        precos = dict(conexao.execute(
+            models.Produto.__table__.select().with_only_columns(models.Produto.id, models.Produto.preco_centavos)
+        ).all())
+
+    ids_produtos = list(precos)
+    # Popularidade: alguns guias trabalham muito mais que outros; produtos seguem uma Zipf
+    pesos_guias = [aleatorio.lognormvariate(0, 0.8) for _ in ids_guias]
+    pesos_produtos = [1 / (posicao + 1) ** 1.1 for posicao in range(len(ids_produtos))]
+    aleatorio.shuffle(pesos_produtos)
+
+    fim = fim or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    calendario = [fim - timedelta(days=d) for d in range(dias, 0, -1)]
+    pesos_dias = [_peso_do_dia(d) for d in calendario]
+
+    with engine.connect() as conexao:
+        proximo_id = (conexao.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM visitas").scalar() or 0) + 1
+
+    itens_gerados = 0
+    for inicio_bloco in range(0, visitas, bloco):
+        tamanho = min(bloco, visitas - inicio_bloco)
+        dias_sorteados = aleatorio.choices(calendario, weights=pesos_dias, k=tamanho)
+        guias_sorteados = aleatorio.choices(ids_guias, weights=pesos_guias, k=tamanho)
+
+        linhas_visitas = []
+        linhas_itens = []
+        for dia, guia_id in zip(sorted(dias_sorteados), guias_sorteados):
+            visita_id = proximo_id
+            proximo_id += 1
+
+            # Cerca de 1 em cada 4 grupos não compra nada
+            quantidade_itens = 0 if aleatorio.random() < 0.25 else max(1, round(aleatorio.expovariate(1 / itens_por_visita)))
+            escolhidos = set(aleatorio.choices(ids_produtos, weights=pesos_produtos, k=quantidade_itens))
+
+            total = 0
+            for produto_id in escolhidos:
+                quantidade = aleatorio.choices([1, 2, 3, 4, 6], weights=[50, 25, 12, 8, 5])[0]
+                total += precos[produto_id] * quantidade
+                linhas_itens.append({
+                    "visita_id": visita_id,
+                    "produto_id": produto_id,
+                    "quantidade": quantidade,
+                    "preco_na_hora_centavos": precos[produto_id],
+                    "subtotal_centavos": precos[produto_id] * quantidade,
+                })
+
+            linhas_visitas.append({
+                "id": visita_id,
+                "guia_id": guia_id,
+                "qtd_turistas": aleatorio.choices(range(1, 21), weights=[8, 14, 12, 10, 8, 7, 6, 5, 4, 4, 3, 3, 3, 2, 2, 2, 2, 2, 1, 1])[0],
+                "valor_taxa_guia_centavos": aleatorio.choice([3000, 4000, 5000, 6000, 8000, 10000]),
+                "total_produtos_centavos": total,
+                "data_visita": dia + _horario(aleatorio),
+            })
+
+        with engine.begin() as conexao:
+            conexao.execute(insert(models.Visita), linhas_visitas)
+            if linhas_itens:
+                conexao.execute(insert(models.VisitaProduto), linhas_itens)
+        itens_gerados += len(linhas_itens)
+
+    # As visitas foram inseridas direto, sem passar pelo service, então recalculo o resumo
+    with Session(engine) as db:
+        ResumoService().reconstruir(db)
+
+    engine.dispose()
+
+    return {
+        "guias": guias,
+        "produtos": produtos,
+        "visitas": visitas,
+        "itens": itens_gerados,
+        "dias": dias,
+        "semente": semente,
+        "segundos": round(time.perf_counter() - inicio_execucao, 2),
+    }
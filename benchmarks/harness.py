@@ -0,0 +1,219 @@
+"""
+Harness que dispara requisições contra a API e mede latência e vazão.
+
+Funciona em dois modos:
+* processo: chama o app FastAPI direto (ASGI), sem rede, para medir só a aplicação e o banco;
+* http: usa uma API já rodando (por exemplo, uvicorn com vários workers).
+"""
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import httpx
+
+
+async def _registrar_visita(cliente, aleatorio, contexto):
+    itens = [
+        {"produto_id": produto_id, "quantidade": aleatorio.randint(1, 3)}
+        for produto_id in set(aleatorio.choices(contexto["produtos"], k=aleatorio.randint(0, 3)))
+    ]
+    return await cliente.post("/visitas/", json={
+        "guia_id": aleatorio.choice(contexto["guias"]),
+        "qtd_turistas": aleatorio.randint(1, 15),
+        "valor_taxa_guia": 50.0,
+        "itens": itens,
+    })
+
+
+def _periodo(aleatorio, dias_maximo=90):
+    fim = date.today() - timedelta(days=aleatorio.randrange(365))
+    inicio = fim - timedelta(days=aleatorio.randrange(1, dias_maximo))
+    return {"data_inicio": inicio.isoformat(), "data_fim": fim.isoformat()}
+
+
+async def _listar_visitas(cliente, aleatorio, contexto):
+    inicio = date.today() - timedelta(days=aleatorio.randrange(365))
+    return await cliente.get("/visitas/", params={"limite": 100, "data_inicio": inicio.isoformat()})
+
+
+async def _relatorio(cliente, aleatorio, contexto):
+    return await cliente.get("/visitas/relatorio", params=_periodo(aleatorio, 365))
+
+
+async def _ranking(cliente, aleatorio, contexto):
+    return await cliente.get("/produtos/ranking", params={"top": 20, **_periodo(aleatorio)})
+
+
+CENARIOS = {
+    "POST /visitas": _registrar_visita,
+    "GET /visitas": _listar_visitas,
+    "GET /visitas/relatorio": _relatorio,
+    "GET /produtos/ranking": _ranking,
+}
+
+
+def percentil(valores_ordenados, p):
+    # Percentil pelo método do posto mais próximo (nearest-rank)
+    if not valores_ordenados:
+        return None
+    posicao = max(0, min(len(valores_ordenados) - 1, round(p / 100 * len(valores_ordenados) + 0.5) - 1))
+    return valores_ordenados[posicao]
+
+
+async def rodar_cenario(cliente, nome, requisicoes, concorrencia, contexto, semente):
+    gerar_requisicao = CENARIOS[nome]
+    latencias = []
+    status = {}
+    proxima = iter(range(requisicoes))
+
+    async def trabalhador(numero):
+        aleatorio = random.Random(f"{semente}-{nome}-{numero}")
+        for _ in proxima:
+            inicio = time.perf_counter()
+            try:
+                resposta = await gerar_requisicao(cliente, aleatorio, contexto)
+                codigo = resposta.status_code
+            except httpx.HTTPError:
+                codigo = "falha_de_conexao"
+            latencias.append(time.perf_counter() - inicio)
+            status[str(codigo)] = status.get(str(codigo), 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador(n) for n in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    erros = sum(qtd for codigo, qtd in status.items() if not codigo.startswith("2"))
+
+    return {
+        "requisicoes": len(latencias),
+        "concorrencia": concorrencia,
+        "erros": erros,
+        "status": status,
+        "duracao_s": round(duracao, 3),
+        "vazao_rps": round(len(latencias) / duracao, 1) if duracao else None,
+        "media_ms": round(sum(latencias) / len(latencias) * 1000, 2) if latencias else None,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+    }
+
+
+async def _carregar_contexto(cliente):
+    # Descubro pela própria API quais guias e produtos podem ser usados nas visitas
+    guias = (await cliente.get("/guias/", params={"apenas_ativos": True})).json()
+    produtos = (await cliente.get("/produtos/", params={"apenas_ativos": True})).json()
+    if not guias or not produtos:
+        raise RuntimeError("O banco precisa ter guias e produtos ativos. Rode 'python -m benchmarks gerar' antes.")
+
+    return {"guias": [g["id"] for g in guias], "produtos": [p["id"] for p in produtos]}
+
+
+async def executar(
+    modo: str,
+    api_key: str,
+    url: str = None,
+    cenarios=None,
+    requisicoes: int = 500,
+    concorrencia: int = 8,
+    aquecimento: int = 20,
+    semente: int = 42,
+):
+    if modo == "processo":
+        # Importo só aqui: o app lê DATABASE_URL na importação
+        from app.main import app
+        transporte = httpx.ASGITransport(app=app)
+        url = "http://benchmark"
+        # O ASGITransport não dispara o lifespan; rodo ele aqui para o app iniciar e
+        # fechar o engine (e as conexões do aiosqlite) como faria no uvicorn
+        ciclo_de_vida = app.router.lifespan_context(app)
+    else:
+        transporte = httpx.AsyncHTTPTransport(retries=0)
+        ciclo_de_vida = contextlib.nullcontext()
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with ciclo_de_vida, httpx.AsyncClient(
+        transport=transporte, base_url=url, headers={"X-API-KEY": api_key}, timeout=120, limits=limites
+    ) as cliente:
+        contexto = await _carregar_contexto(cliente)
+        resultados = {}
+
+        for nome in cenarios or list(CENARIOS):
+            if aquecimento:
+                await rodar_cenario(cliente, nome, aquecimento, 1, contexto, f"aquecimento-{semente}")
+            resultados[nome] = await rodar_cenario(cliente, nome, requisicoes, concorrencia, contexto, semente)
+
+    return resultados
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def salvar(resultados: dict, parametros: dict, pasta: str = "benchmarks/resultados") -> Path:
+    """
+    Grava o resultado em JSON junto com o commit e o ambiente, para comparar execuções.
+    """
+    commit = _commit_atual()
+    agora = datetime.now()
+    relatorio = {
+        "commit": commit,
+        "data": agora.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": parametros,
+        "cenarios": resultados,
+    }
+
+    destino = Path(pasta)
+    destino.mkdir(parents=True, exist_ok=True)
+    arquivo = destino / f"{agora:%Y%m%d-%H%M%S}-{commit}.json"
+    arquivo.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    return arquivo
+
+
+def comparar(arquivo_antes: str, arquivo_depois: str) -> str:
+    antes = json.loads(Path(arquivo_antes).read_text(encoding="utf-8"))
+    depois = json.loads(Path(arquivo_depois).read_text(encoding="utf-8"))
+
+    linhas = [f"{'cenário':<24}{'métrica':<12}{antes['commit']:>12}{depois['commit']:>12}{'variação':>11}"]
+    for nome, resultado in depois["cenarios"].items():
+        anterior = antes["cenarios"].get(nome)
+        if not anterior:
+            continue
+        for metrica in ("vazao_rps", "p50_ms", "p95_ms", "p99_ms"):
+            a, d = anterior.get(metrica), resultado.get(metrica)
+            variacao = f"{(d - a) / a * 100:+.1f}%" if a and d is not None else "-"
+            linhas.append(f"{nome:<24}{metrica:<12}{a!s:>12}{d!s:>12}{variacao:>11}")
+
+    return "\n".join(linhas)
+
+
+def recusas(resultados: dict) -> dict:
+    # Quantas respostas 429/503 (limites de uso e fila de relatórios) cada cenário recebeu
+    contagem = {
+        nome: sum(r["status"].get(codigo, 0) for codigo in ("429", "503"))
+        for nome, r in resultados.items()
+    }
+    return {nome: qtd for nome, qtd in contagem.items() if qtd}
+
+
+def formatar(resultados: dict) -> str:
+    linhas = [f"{'cenário':<24}{'req':>7}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    for nome, r in resultados.items():
+        linhas.append(
+            f"{nome:<24}{r['requisicoes']:>7}{r['erros']:>7}{r['vazao_rps']!s:>9}"
+            f"{r['p50_ms']!s:>9}{r['p95_ms']!s:>9}{r['p99_ms']!s:>9}"
+        )
+    return "\n".join(linhas)
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+# O app lê essas variáveis na importação: banco SQLite em memória (uma conexão só, modo
+# síncrono) e uma chave de API própria dos testes
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("API_KEY_TURISMO", "chave-dos-testes")
+# Sem limites de uso por padrão (os testes disparam muitas requisições seguidas); quem testa
+# os limites liga no próprio teste
+os.environ.setdefault("LIMITES_HABILITADOS", "false")
+# Os relatórios em segundo plano e os perfis gravam em pastas temporárias, não na do projeto
+os.environ.setdefault("RELATORIOS_DIRETORIO", tempfile.mkdtemp(prefix="relatorios-testes-"))
+os.environ.setdefault("PERFIL_DIRETORIO", tempfile.mkdtemp(prefix="perfis-testes-"))
+# Chave de administrador, a única que pode pedir perfil de uma requisição
+os.environ.setdefault("API_KEYS", "admin:chave-admin-dos-testes")
+os.environ.setdefault("PERFIL_CHAVES", "admin")
+
+import pytest
+from fastapi.testclient import TestClient
+from app.ao_vivo import painel_ao_vivo
+from app.cache import catalogo_cache
+from app.database import Base, engine
+from app.main import app
+
+CABECALHOS = {"X-API-KEY": os.environ["API_KEY_TURISMO"]}
+
+# Tamanhos do banco usados para conferir que a quantidade de consultas não cresce com os dados
+TAMANHOS = {
+    "pequeno": {"guias": 2, "produtos": 3, "visitas": 4},
+    "grande": {"guias": 12, "produtos": 25, "visitas": 80},
+}
+
+
+def popular(cliente: TestClient, guias: int, produtos: int, visitas: int):
+    """
+    Recria as tabelas e cadastra os dados pela própria API, do mesmo jeito que em produção.
+    """
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    catalogo_cache.invalidar("produtos")
+    catalogo_cache.invalidar("guias")
+    # O painel ao vivo guarda os totais do banco anterior
+    painel_ao_vivo.limpar()
+
+    for i in range(guias):
+        cliente.post("/guias/", json={"nome": f"Guia {i + 1}", "telefone": f"1199{i:07d}"}, headers=CABECALHOS)
+    for i in range(produtos):
+        cliente.post("/produtos/", json={
+            "nome": f"Produto {i + 1}", "preco": 5.0 + i, "categoria": "Bebidas" if i % 2 else "Artesanato",
+        }, headers=CABECALHOS)
+
+    if not visitas:
+        return
+
+    lote = [
+        {
+            "guia_id": i % guias + 1,
+            "qtd_turistas": i % 7 + 1,
+            "valor_taxa_guia": 50.0,
+            "itens": [
+                {"produto_id": (i + j) % produtos + 1, "quantidade": j + 1}
+                for j in range(min(3, produtos))
+            ],
+        }
+        for i in range(visitas)
+    ]
+    resposta = cliente.post("/visitas/lote", json={"visitas": lote}, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+
+
+@pytest.fixture
+def cliente():
+    with TestClient(app) as cliente:
+        yield cliente
@@ -0,0 +1,51 @@
+"""
+Contagem das consultas SQL feitas durante um trecho de código, para os testes de orçamento.
+"""
+from collections import Counter
+from typing import Any, List, Tuple
+from sqlalchemy import event
+
+
+class ContadorConsultas:
+    """
+    Guarda cada comando enviado ao banco enquanto estiver ativo (usar com 'with').
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.comandos: List[str] = []
+        # Comando e parâmetros de cada execução, para os testes que refazem o plano da consulta
+        self.execucoes: List[Tuple[str, Any]] = []
+
+    def _registrar(self, conn, cursor, statement, parameters, context, executemany):
+        self.comandos.append(statement)
+        self.execucoes.append((statement, parameters))
+
+    def __enter__(self):
+        self.comandos = []
+        self.execucoes = []
+        event.listen(self.engine, "before_cursor_execute", self._registrar)
+        return self
+
+    def __exit__(self, *erro):
+        event.remove(self.engine, "before_cursor_execute", self._registrar)
+
+    @property
+    def total(self) -> int:
+        return len(self.comandos)
+
+    def repetidos(self) -> Counter:
+        # Comandos idênticos executados mais de uma vez são o sinal típico de N+1
+        return Counter({comando: qtd for comando, qtd in Counter(self.comandos).items() if qtd > 1})
+
+    def descrever(self) -> str:
+        linhas = [f"{self.total} consultas"]
+        repetidos = self.repetidos()
+        if repetidos:
+            linhas.append("Comandos repetidos:")
+            for comando, qtd in repetidos.most_common():
+                linhas.append(f"  {qtd}x {' '.join(comando.split())}")
+        else:
+            linhas.append("Comandos executados:")
+            linhas.extend(f"  {' '.join(comando.split())}" for comando in self.comandos)
+        return "\n".join(linhas)
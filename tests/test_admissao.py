@@ -0,0 +1,90 @@
+"""
+Limites de uso: balde de fichas por chave e classe de rota, e limite de relatórios simultâneos
+com fila curta.
+"""
+import asyncio
+import pytest
+from fastapi.routing import APIRoute
+from app import security
+from app.admissao import ROTAS_RELATORIO, LimiteConcorrencia, Lotado, controle_admissao
+from app.main import app
+from tests.conftest import CABECALHOS, popular
+
+CABECALHOS_BI = {"X-API-KEY": "chave-do-bi"}
+VISITA = {"guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 20, "itens": []}
+
+
+@pytest.fixture
+def limites(monkeypatch):
+    # Segunda chave, com nome, e limites ligados só neste teste
+    monkeypatch.setitem(security.CHAVES, "bi", CABECALHOS_BI["X-API-KEY"])
+    monkeypatch.setattr(controle_admissao, "habilitado", True)
+    controle_admissao.limpar()
+    yield controle_admissao
+    controle_admissao.limpar()
+
+
+def test_cada_chave_tem_seus_baldes(cliente, limites, monkeypatch):
+    popular(cliente, guias=1, produtos=2, visitas=2)
+    monkeypatch.setitem(limites.limites_por_chave, ("bi", "relatorio"), (0.01, 2))
+
+    respostas = [cliente.get("/produtos/ranking", headers=CABECALHOS_BI) for _ in range(3)]
+    assert [r.status_code for r in respostas] == [200, 200, 429]
+    assert int(respostas[-1].headers["Retry-After"]) >= 1
+
+    # O balde esgotado é só o de relatórios do BI: a outra chave e as escritas do próprio BI seguem
+    assert cliente.get("/produtos/ranking", headers=CABECALHOS).status_code == 200
+    assert cliente.post("/visitas/", json=VISITA, headers=CABECALHOS_BI).status_code == 200
+
+    # Chave inválida não gasta ficha de ninguém: quem responde é a autenticação
+    assert cliente.get("/produtos/ranking", headers={"X-API-KEY": "errada"}).status_code == 401
+
+    metricas = cliente.get("/metrics").text
+    assert 'turismo_admissao_rejeicoes_total{chave="bi",classe="relatorio",motivo="taxa"} 1.0' in metricas
+    assert 'turismo_http_respostas_total{metodo="GET",rota="/produtos/ranking",status="429"} 1.0' in metricas
+
+
+def test_relatorios_lotados_respondem_503(cliente, limites, monkeypatch):
+    popular(cliente, guias=1, produtos=1, visitas=1)
+    relatorios = LimiteConcorrencia(maximo=1, fila=0, espera=1)
+    monkeypatch.setattr(limites, "relatorios", relatorios)
+
+    relatorios.em_uso = 1  # como se houvesse um relatório em andamento
+    resposta = cliente.get("/visitas/relatorio", headers=CABECALHOS)
+    assert resposta.status_code == 503 and resposta.headers["Retry-After"] == "1"
+    # O limite é só dos relatórios
+    assert cliente.get("/visitas/", headers=CABECALHOS).status_code == 200
+
+    relatorios.em_uso = 0
+    assert cliente.get("/visitas/relatorio", headers=CABECALHOS).status_code == 200
+    assert relatorios.em_uso == 0
+
+
+def test_fila_dos_relatorios():
+    async def cenario():
+        limite = LimiteConcorrencia(maximo=1, fila=1, espera=0.2)
+        await limite.entrar()
+
+        # O segundo espera na fila; o terceiro não cabe nela e sai na hora
+        segundo = asyncio.create_task(limite.entrar())
+        await asyncio.sleep(0)
+        with pytest.raises(Lotado):
+            await limite.entrar()
+
+        # Quem sai passa a vaga para o da fila
+        limite.sair()
+        await segundo
+        assert limite.em_uso == 1
+
+        # Ninguém sai: a espera acaba e a vaga não fica presa com quem desistiu
+        with pytest.raises(Lotado):
+            await limite.entrar()
+        limite.sair()
+        assert limite.em_uso == 0 and not limite._fila
+
+    asyncio.run(cenario())
+
+
+def test_rotas_de_relatorio_existem():
+    rotas = {(metodo, rota.path) for rota in app.routes if isinstance(rota, APIRoute) for metodo in rota.methods}
+    assert ROTAS_RELATORIO <= rotas, ROTAS_RELATORIO - rotas
@@ -0,0 +1,159 @@
+"""
+Painel ao vivo: os totais em memória batem com o relatório e as telas conectadas não
+consultam o banco a cada atualização.
+
+O TestClient espera a resposta terminar, e o stream não termina; por isso as telas aqui são
+abertas direto no gerador do painel, o mesmo que a rota devolve.
+"""
+import asyncio
+import json
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app import models
+from app.ao_vivo import RECONEXAO_MS, hoje, painel_ao_vivo
+from app.database import engine
+from app.routers.visitas import _totais_do_dia
+from app.services.resumos_service import ResumoService
+from tests.conftest import CABECALHOS, popular
+from tests.consultas import ContadorConsultas
+
+VISITA = {"guia_id": 1, "qtd_turistas": 4, "valor_taxa_guia": 35.5, "itens": [{"produto_id": 2, "quantidade": 3}]}
+
+
+@pytest.fixture
+def painel(monkeypatch):
+    # Pings e eventos sem espera, para os testes não dependerem de relógio
+    monkeypatch.setattr(painel_ao_vivo, "heartbeat", 0.05)
+    monkeypatch.setattr(painel_ao_vivo, "intervalo_minimo", 0)
+    yield painel_ao_vivo
+    painel_ao_vivo.limpar()
+
+
+async def _proximo(tela, pings: int = 0):
+    # Próximo evento de totais da tela; com 'pings', exige que venham antes esses pings
+    while True:
+        bloco = await asyncio.wait_for(anext(tela), 2)
+        if bloco.startswith(": ping"):
+            pings -= 1
+            continue
+        assert pings <= 0, f"evento antes dos pings esperados: {bloco}"
+        linhas = dict(linha.split(": ", 1) for linha in bloco.strip().split("\n"))
+        assert linhas["event"] == "totais"
+        return linhas["id"], json.loads(linhas["data"])
+
+
+async def _abrir(ultimo_id=None):
+    tela = painel_ao_vivo.transmitir(_totais_do_dia, ultimo_id)
+    assert await anext(tela) == f"retry: {RECONEXAO_MS}\n\n"
+    return tela
+
+
+def _conferir_com_relatorio(cliente, totais):
+    dia = {"data_inicio": hoje().isoformat(), "data_fim": hoje().isoformat()}
+    relatorio = cliente.get("/visitas/relatorio", params=dia, headers=CABECALHOS).json()
+    ranking = cliente.get("/produtos/ranking", params={"top": 5, **dia}, headers=CABECALHOS).json()
+
+    assert totais["dia"] == hoje().isoformat()
+    assert totais["visitas"] == relatorio["quantidade_visitas"]
+    assert totais["total_taxas"] == relatorio["total_taxas_guias"]
+    assert totais["total_produtos"] == relatorio["total_produtos"]
+    assert totais["faturamento_total"] == relatorio["faturamento_total_geral"]
+    assert [(p["id"], p["unidades_vendidas"], p["faturamento_total"]) for p in totais["top_produtos"]] == [
+        (p["id"], p["unidades_vendidas"], p["faturamento_total"]) for p in ranking if p["unidades_vendidas"]
+    ]
+
+
+def test_totais_acompanham_cadastro_edicao_e_exclusao(cliente, painel):
+    popular(cliente, guias=2, produtos=4, visitas=6)
+
+    async def cenario():
+        tela = await _abrir()
+        _, totais = await _proximo(tela)
+        _conferir_com_relatorio(cliente, totais)
+        assert totais["top_produtos"][0]["nome"].startswith("Produto ")
+
+        assert cliente.post("/visitas/", json=VISITA, headers=CABECALHOS).status_code == 200
+        _, totais = await _proximo(tela)
+        _conferir_com_relatorio(cliente, totais)
+
+        # As duas alterações chegam antes de a tela voltar a ler: saem num evento só, já somadas
+        assert cliente.put("/visitas/1", json=VISITA, headers=CABECALHOS).status_code == 200
+        assert cliente.delete("/visitas/2", headers=CABECALHOS).status_code == 200
+        _, totais = await _proximo(tela)
+        _conferir_com_relatorio(cliente, totais)
+
+        await tela.aclose()
+
+    asyncio.run(cenario())
+
+
+def test_reconexao_com_last_event_id(cliente, painel):
+    popular(cliente, guias=1, produtos=2, visitas=3)
+
+    async def cenario():
+        tela = await _abrir()
+        ultimo_id, totais = await _proximo(tela)
+        await tela.aclose()
+
+        # Nada mudou enquanto a tela estava fora: só pings até a próxima alteração
+        tela = await _abrir(ultimo_id)
+        assert await asyncio.wait_for(anext(tela), 2) == ": ping\n\n"
+        assert cliente.post("/visitas/", json=VISITA, headers=CABECALHOS).status_code == 200
+        novo_id, novos = await _proximo(tela)
+        assert novo_id != ultimo_id and novos["visitas"] == totais["visitas"] + 1
+        await tela.aclose()
+
+        # ID de outra execução do processo (ou desconhecido): recebe os totais na hora
+        tela = await _abrir("outra-execucao-7")
+        assert await _proximo(tela) == (novo_id, novos)
+        await tela.aclose()
+
+    asyncio.run(cenario())
+
+
+def test_telas_conectadas_nao_consultam_o_banco(cliente, painel):
+    popular(cliente, guias=2, produtos=3, visitas=5)
+
+    async def cenario():
+        with ContadorConsultas(engine) as contador:
+            telas = [await _abrir() for _ in range(50)]
+            primeiros = await asyncio.gather(*(_proximo(tela) for tela in telas))
+        # Uma carga só (totais do resumo + vendas por produto), não uma por tela
+        assert contador.total == 2, contador.descrever()
+        assert len({evento_id for evento_id, _ in primeiros}) == 1
+
+        assert cliente.post("/visitas/", json=VISITA, headers=CABECALHOS).status_code == 200
+        with ContadorConsultas(engine) as contador:
+            seguintes = await asyncio.gather(*(_proximo(tela) for tela in telas))
+        assert contador.total == 0, contador.descrever()
+        assert all(totais["visitas"] == 6 for _, totais in seguintes)
+
+        for tela in telas:
+            await tela.aclose()
+
+    asyncio.run(cenario())
+
+
+def test_recarga_traz_visitas_de_outros_processos(cliente, painel, monkeypatch):
+    popular(cliente, guias=1, produtos=2, visitas=2)
+    monkeypatch.setattr(painel_ao_vivo, "recarga", 0.2)
+
+    async def cenario():
+        tela = await _abrir()
+        _, totais = await _proximo(tela)
+
+        # Visita gravada por outro processo: não passa pelo service deste, só a recarga a enxerga
+        with Session(engine) as db:
+            visita = db.execute(insert(models.Visita).returning(models.Visita.data_visita).values(
+                guia_id=1, qtd_turistas=2, valor_taxa_guia_centavos=1000, total_produtos_centavos=0
+            )).one()
+            ResumoService().registrar_delta(db, visita.data_visita, 1, 1, 2, 1000, 0)
+            db.commit()
+
+        _, recarregados = await _proximo(tela)
+        assert recarregados["visitas"] == totais["visitas"] + 1
+        assert recarregados["total_taxas"] == totais["total_taxas"] + 10
+        await tela.aclose()
+
+    asyncio.run(cenario())
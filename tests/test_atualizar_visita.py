@@ -0,0 +1,77 @@
+"""
+Atualização de visita pela diferença dos itens.
+"""
+from sqlalchemy import func, select
+from app import models
+from app.database import SessionLocal
+from tests.conftest import CABECALHOS, popular
+
+
+def _itens(visita_id: int):
+    with SessionLocal() as db:
+        return {
+            item.produto_id: (item.id, item.quantidade, item.preco_na_hora_centavos, item.subtotal_centavos)
+            for item in db.query(models.VisitaProduto).filter(models.VisitaProduto.visita_id == visita_id)
+        }
+
+
+def test_itens_atualizados_pela_diferenca(cliente):
+    # A visita 1 começa com os produtos 1, 2 e 3 (quantidades 1, 2 e 3)
+    popular(cliente, guias=2, produtos=4, visitas=3)
+    antes = _itens(1)
+
+    # Os preços mudam depois da venda: quem já estava na visita mantém o preço da hora
+    cliente.put("/produtos/1", json={"nome": "Produto 1", "preco": 99.0, "categoria": "Artesanato"}, headers=CABECALHOS)
+    cliente.put("/produtos/4", json={"nome": "Produto 4", "preco": 20.0, "categoria": "Bebidas"}, headers=CABECALHOS)
+
+    resposta = cliente.put("/visitas/1", json={
+        "guia_id": 1, "qtd_turistas": 4, "valor_taxa_guia": 50.0,
+        "itens": [
+            {"produto_id": 1, "quantidade": 1},
+            {"produto_id": 2, "quantidade": 5},
+            {"produto_id": 4, "quantidade": 1},
+            {"produto_id": 4, "quantidade": 1},
+        ],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    depois = _itens(1)
+
+    # Sem mudança: a mesma linha, com o preço de antes
+    assert depois[1] == antes[1]
+    # Quantidade nova, mesma linha e mesmo preço da hora da venda
+    assert depois[2][0] == antes[2][0]
+    assert depois[2][1:] == (5, antes[2][2], 5 * antes[2][2])
+    # Produto que saiu da visita
+    assert 3 not in depois
+    # Produto novo, com o preço de hoje e as quantidades repetidas somadas
+    assert depois[4][1:] == (2, 2000, 4000)
+
+    total = sum(subtotal for _, _, _, subtotal in depois.values())
+    assert resposta.json()["total_produtos"] == total / 100
+
+    with SessionLocal() as db:
+        visita = db.get(models.Visita, 1)
+        assert visita.total_produtos_centavos == total
+        # O resumo diário continua batendo com as visitas
+        assert db.scalar(select(func.sum(models.ResumoDiario.total_produtos_centavos))) == db.scalar(
+            select(func.sum(models.Visita.total_produtos_centavos))
+        )
+
+
+def test_produto_de_preco_zero_entra_na_atualizacao(cliente):
+    popular(cliente, guias=1, produtos=3, visitas=1)
+    brinde = cliente.post("/produtos/", json={"nome": "Brinde", "preco": 0, "categoria": "Artesanato"}, headers=CABECALHOS).json()
+
+    resposta = cliente.put("/visitas/1", json={
+        "guia_id": 1, "qtd_turistas": 1, "valor_taxa_guia": 50.0,
+        "itens": [{"produto_id": 1, "quantidade": 1}, {"produto_id": brinde["id"], "quantidade": 3}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    assert _itens(1)[brinde["id"]][1:] == (3, 0, 0)
+    assert {item["produto_id"] for item in resposta.json()["itens"]} == {1, brinde["id"]}
+
+    # Produto fora do catálogo continua sendo recusado
+    resposta = cliente.put("/visitas/1", json={
+        "guia_id": 1, "qtd_turistas": 1, "valor_taxa_guia": 50.0, "itens": [{"produto_id": 999, "quantidade": 1}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 400
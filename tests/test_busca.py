@@ -0,0 +1,43 @@
+"""
+Busca do catálogo pelo nome (FTS5): acentos, prefixos e sincronia com as alterações.
+"""
+from tests.conftest import CABECALHOS, popular
+
+
+def _nomes(cliente, rota: str, **params):
+    resposta = cliente.get(rota, params=params, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    return [item["nome"] for item in resposta.json()]
+
+
+def test_busca_de_produtos(cliente):
+    popular(cliente, guias=1, produtos=0, visitas=0)
+    for nome in ("Água Mineral 500ml", "Água de Coco", "Açaí na Tigela", "Cocada", "Café"):
+        cliente.post("/produtos/", json={"nome": nome, "preco": 5.0, "categoria": "Bebidas"}, headers=CABECALHOS)
+
+    # Sem acento, em maiúsculas e só com o começo da palavra
+    assert sorted(_nomes(cliente, "/produtos/busca", q="AGU")) == ["Água Mineral 500ml", "Água de Coco"]
+    assert _nomes(cliente, "/produtos/busca", q="acai") == ["Açaí na Tigela"]
+    # Todas as palavras precisam aparecer
+    assert _nomes(cliente, "/produtos/busca", q="ag co") == ["Água de Coco"]
+    assert len(_nomes(cliente, "/produtos/busca", q="a", limite=2)) == 2
+    # Operadores do FTS5 digitados pelo usuário não quebram a consulta
+    assert _nomes(cliente, "/produtos/busca", q='"OR*') == []
+
+    # A busca acompanha as alterações do catálogo
+    cliente.put("/produtos/4", json={"nome": "Cocada de Açúcar", "preco": 5.0, "categoria": "Doces"}, headers=CABECALHOS)
+    assert _nomes(cliente, "/produtos/busca", q="acucar") == ["Cocada de Açúcar"]
+
+    cliente.delete("/produtos/1", headers=CABECALHOS)
+    assert _nomes(cliente, "/produtos/busca", q="agua") == ["Água de Coco"]
+    assert len(_nomes(cliente, "/produtos/busca", q="agua", apenas_ativos=False)) == 2
+
+
+def test_busca_de_guias_comeca_vazia_a_cada_banco(cliente):
+    popular(cliente, guias=0, produtos=1, visitas=0)
+    cliente.post("/guias/", json={"nome": "João Ávila", "telefone": "11999999999"}, headers=CABECALHOS)
+    assert _nomes(cliente, "/guias/busca", q="joao av") == ["João Ávila"]
+
+    # Recriar as tabelas recria a busca junto, sem sobrar o que estava indexado antes
+    popular(cliente, guias=0, produtos=1, visitas=0)
+    assert _nomes(cliente, "/guias/busca", q="joao") == []
@@ -0,0 +1,115 @@
+"""
+Cache do catálogo: acertos e falhas, invalidação pelas alterações do próprio processo e
+alterações de outros processos percebidas pela tabela catalogo_versoes.
+"""
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+from app import cache, models
+from app.cache import CatalogoCache, incrementar_versao
+from app.database import Base, criar_engine
+from tests.conftest import CABECALHOS, popular
+
+VISITA = {"guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 10.0, "itens": [{"produto_id": 1, "quantidade": 1}, {"produto_id": 2, "quantidade": 1}]}
+
+
+def _estatisticas(cliente):
+    return cliente.get("/diagnostico/cache", headers=CABECALHOS).json()
+
+
+def _registrar(cliente, **mudancas):
+    return cliente.post("/visitas/", json={**VISITA, **mudancas}, headers=CABECALHOS)
+
+
+def test_acertos_e_falhas(cliente):
+    popular(cliente, guias=1, produtos=2, visitas=0)
+    inicio = _estatisticas(cliente)
+
+    # Primeira visita: guia e produtos vêm do banco
+    assert _registrar(cliente).status_code == 200
+    depois_da_primeira = _estatisticas(cliente)
+    assert depois_da_primeira["falhas"] - inicio["falhas"] == 3
+    assert (depois_da_primeira["guias_em_cache"], depois_da_primeira["produtos_em_cache"]) == (1, 2)
+
+    # Segunda: tudo do cache
+    assert _registrar(cliente).status_code == 200
+    depois_da_segunda = _estatisticas(cliente)
+    assert depois_da_segunda["falhas"] == depois_da_primeira["falhas"]
+    assert depois_da_segunda["acertos"] - depois_da_primeira["acertos"] >= 3
+
+
+def test_alteracoes_do_catalogo_invalidam_o_cache(cliente):
+    popular(cliente, guias=2, produtos=2, visitas=0)
+    assert _registrar(cliente).status_code == 200
+
+    # Preço novo: a próxima visita já grava o preço de hoje
+    invalidacoes = _estatisticas(cliente)["invalidacoes"]
+    cliente.put("/produtos/1", json={"nome": "Produto 1", "preco": 9.5, "categoria": "Artesanato"}, headers=CABECALHOS)
+    assert _estatisticas(cliente)["invalidacoes"] == invalidacoes + 1
+    itens = _registrar(cliente).json()["itens"]
+    assert [(i["produto_id"], i["preco_na_hora"]) for i in itens] == [(1, 9.5), (2, 6.0)]
+
+    # Produto desativado sai do cache e é recarregado com o status novo
+    assert cliente.delete("/produtos/2", headers=CABECALHOS).status_code == 200
+    assert _estatisticas(cliente)["produtos_em_cache"] == 0
+    _registrar(cliente)
+    assert _estatisticas(cliente)["produtos_em_cache"] == 2
+
+    # Guia alterado e depois desativado
+    cliente.put("/guias/1", json={"nome": "Guia Renomeado", "telefone": "11900001111"}, headers=CABECALHOS)
+    assert _registrar(cliente).json()["guia"] == {"nome": "Guia Renomeado", "telefone": "11900001111"}
+    assert cliente.delete("/guias/1", headers=CABECALHOS).status_code == 200
+    resposta = _registrar(cliente)
+    assert resposta.status_code == 400 and "inativo" in resposta.json()["detail"]
+    assert _registrar(cliente, guia_id=2).status_code == 200
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+
+@pytest.fixture
+def dois_processos(tmp_path, monkeypatch):
+    # Banco em arquivo com duas conexões: a do cache ("este processo") e a de "outro processo"
+    url = f"sqlite:///{tmp_path / 'catalogo.db'}"
+    este, outro = criar_engine(url), criar_engine(url)
+    Base.metadata.create_all(este)
+    relogio = Relogio()
+    monkeypatch.setattr(cache, "time", relogio)
+    yield sessionmaker(bind=este), sessionmaker(bind=outro), relogio
+    este.dispose()
+    outro.dispose()
+
+
+def test_alteracao_de_outro_processo_e_percebida_depois_do_intervalo(dois_processos):
+    SessaoEste, SessaoOutro, relogio = dois_processos
+    catalogo = CatalogoCache(intervalo_verificacao=2.0)
+
+    with SessaoOutro() as db:
+        db.add(models.Produto(id=1, nome="Água", preco_centavos=500, categoria="Bebidas", ativo=True))
+        incrementar_versao(db, "produtos")
+        db.commit()
+
+    with SessaoEste() as db:
+        assert catalogo.produtos(db, [1])[1].preco_centavos == 500
+
+    # O outro processo muda o preço e a versão, na mesma transação
+    with SessaoOutro() as db:
+        db.execute(update(models.Produto).where(models.Produto.id == 1).values(preco_centavos=750))
+        incrementar_versao(db, "produtos")
+        db.commit()
+
+    # Dentro do intervalo, o cache ainda não conferiu as versões
+    relogio.agora += 1.9
+    with SessaoEste() as db:
+        assert catalogo.produtos(db, [1])[1].preco_centavos == 500
+
+    # Passado o intervalo, a versão nova limpa o cache e o preço é relido
+    relogio.agora += 0.2
+    with SessaoEste() as db:
+        assert catalogo.produtos(db, [1])[1].preco_centavos == 750
+    assert catalogo.estatisticas()["versoes"]["produtos"] == 2
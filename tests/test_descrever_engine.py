@@ -0,0 +1,70 @@
+"""
+Configuração do banco que aparece no log de inicialização: PRAGMAs lidos de volta da conexão
+e tamanhos do pool, do engine síncrono e do assíncrono.
+"""
+import asyncio
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app import main
+from app.config import configuracoes
+from app.database import criar_engine, criar_engine_assincrono, descrever_engine
+
+# Valores diferentes dos padrões, para o teste só passar se forem mesmo os aplicados
+PRAGMAS = {"synchronous": 2, "busy_timeout": 1234, "cache_size": -2000, "mmap_size": 1048576, "temp_store": 2}
+
+
+@pytest.fixture
+def url(tmp_path, monkeypatch):
+    for nome, valor in {
+        "sqlite_synchronous": "FULL", "sqlite_busy_timeout_ms": 1234, "sqlite_cache_size": -2000,
+        "sqlite_mmap_size": 1048576, "sqlite_temp_store": "MEMORY",
+        "db_pool_size": 3, "db_pool_max_overflow": 7, "db_pool_timeout": 4.0,
+        "db_leitura_pool_size": 2, "db_leitura_pool_max_overflow": 1,
+    }.items():
+        monkeypatch.setattr(configuracoes, nome, valor)
+    return f"sqlite:///{tmp_path / 'descricao.db'}"
+
+
+def _descrever(engine_alvo):
+    async def cenario():
+        try:
+            return await descrever_engine(engine_alvo)
+        finally:
+            if isinstance(engine_alvo, AsyncEngine):
+                await engine_alvo.dispose()
+            else:
+                engine_alvo.dispose()
+
+    return asyncio.run(cenario())
+
+
+@pytest.mark.parametrize("assincrono", [False, True], ids=["sincrono", "assincrono"])
+def test_pragmas_e_pool_configurados(url, assincrono):
+    criar = criar_engine_assincrono if assincrono else criar_engine
+    escrita, leitura = _descrever(criar(url)), _descrever(criar(url, leitura=True))
+
+    assert ("aiosqlite" in escrita["url"]) == assincrono
+    for descricao in (escrita, leitura):
+        assert {pragma: descricao[pragma] for pragma in PRAGMAS} == PRAGMAS
+        assert descricao["journal_mode"] == "wal"
+        assert descricao["pool_timeout"] == 4.0
+
+    assert (escrita["query_only"], leitura["query_only"]) == (0, 1)
+    assert (escrita["pool_size"], escrita["max_overflow"]) == (3, 7)
+    assert (leitura["pool_size"], leitura["max_overflow"]) == (2, 1)
+    assert "Pool size: 3" in escrita["pool"] and "Pool size: 2" in leitura["pool"]
+
+
+def test_log_de_inicializacao_mostra_o_engine_que_atende(url, monkeypatch, caplog):
+    # Com DB_ASYNC ligado quem atende é o engine assíncrono, e é ele que vai para o log
+    assincrono = criar_engine_assincrono(url)
+    monkeypatch.setattr(main, "ENGINES", {"escrita": assincrono})
+
+    with caplog.at_level(logging.INFO, logger="turismo_api"), TestClient(main.app):
+        pass
+    asyncio.run(assincrono.dispose())
+
+    linha, = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Banco de dados")]
+    assert "(escrita, " in linha and "sqlite+aiosqlite" in linha and "'pool_size': 3" in linha
@@ -0,0 +1,97 @@
+"""
+Desempenho dos guias: números de cada guia, batendo com o relatório do mesmo período.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import models
+from app.database import SessionLocal
+from app.services.resumos_service import ResumoService
+from tests.conftest import CABECALHOS, popular
+
+
+def _desempenho(cliente, **params):
+    resposta = cliente.get("/guias/desempenho", params=params, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()
+
+
+def _registrar(cliente, guia_id: int, turistas: int, taxa: float, itens=()):
+    resposta = cliente.post("/visitas/", json={
+        "guia_id": guia_id, "qtd_turistas": turistas, "valor_taxa_guia": taxa,
+        "itens": [{"produto_id": produto_id, "quantidade": quantidade} for produto_id, quantidade in itens],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+
+
+def test_desempenho_soma_o_mesmo_que_o_relatorio(cliente):
+    popular(cliente, guias=3, produtos=5, visitas=30)
+    # Um guia sem nenhuma visita
+    cliente.post("/guias/", json={"nome": "Guia novo", "telefone": "11900000000"}, headers=CABECALHOS)
+
+    # Parte das visitas vai para dois meses atrás (e o resumo diário acompanha)
+    antiga = datetime.utcnow() - timedelta(days=60)
+    with SessionLocal() as db:
+        db.execute(update(models.Visita).where(models.Visita.id % 4 == 0).values(data_visita=antiga))
+        ResumoService().reconstruir(db)
+
+    hoje = datetime.utcnow().date()
+    for periodo in (
+        {},
+        {"data_inicio": (hoje - timedelta(days=7)).isoformat(), "data_fim": hoje.isoformat()},
+        {"data_inicio": (hoje - timedelta(days=90)).isoformat(), "data_fim": (hoje - timedelta(days=30)).isoformat()},
+    ):
+        desempenho = _desempenho(cliente, **periodo)
+        relatorio = cliente.get("/visitas/relatorio", params=periodo, headers=CABECALHOS).json()
+
+        assert len(desempenho) == 4
+        assert sum(g["visitas"] for g in desempenho) == relatorio["quantidade_visitas"]
+        assert round(sum(g["total_taxas"] for g in desempenho), 2) == relatorio["total_taxas_guias"]
+        assert round(sum(g["total_produtos"] for g in desempenho), 2) == relatorio["total_produtos"]
+        assert round(sum(g["faturamento_total"] for g in desempenho), 2) == relatorio["faturamento_total_geral"]
+
+        # Turistas e visitas de cada guia conferidos direto nas visitas do período
+        with SessionLocal() as db:
+            visitas = db.query(models.Visita).all()
+        inicio = datetime.fromisoformat(periodo["data_inicio"]) if periodo else datetime.min
+        fim = datetime.fromisoformat(periodo["data_fim"]) + timedelta(days=1) if periodo else datetime.max
+        for guia in desempenho:
+            do_guia = [v for v in visitas if v.guia_id == guia["id"] and inicio <= v.data_visita < fim]
+            assert guia["visitas"] == len(do_guia)
+            assert guia["turistas"] == sum(v.qtd_turistas for v in do_guia)
+
+        novo = next(g for g in desempenho if g["nome"] == "Guia novo")
+        assert (novo["visitas"], novo["turistas"], novo["faturamento_total"], novo["ticket_medio_por_turista"], novo["ultima_visita"]) == (0, 0, 0.0, 0.0, None)
+
+
+def test_ordenacao_top_e_ativos(cliente):
+    popular(cliente, guias=4, produtos=1, visitas=0)
+    cliente.post("/produtos/", json={"nome": "Bala", "preco": 0.01, "categoria": "Bebidas"}, headers=CABECALHOS)
+    # Guia 1: 2 visitas, 2 turistas, R$ 60,01 (ticket de 30,005: meio centavo para cima)
+    _registrar(cliente, 1, 1, 30.0)
+    _registrar(cliente, 1, 1, 30.0, itens=[(2, 1)])
+    # Guia 2: 1 visita, 5 turistas, R$ 120,00
+    _registrar(cliente, 2, 5, 120.0)
+    # Guia 3: 2 visitas, 6 turistas, R$ 100,00 (ticket de 16,666...)
+    _registrar(cliente, 3, 3, 50.0)
+    _registrar(cliente, 3, 3, 50.0)
+    # Guia 4 fica sem visitas
+
+    desempenho = {g["id"]: g for g in _desempenho(cliente)}
+    assert {i: g["ticket_medio_por_turista"] for i, g in desempenho.items()} == {1: 30.01, 2: 24.0, 3: 16.67, 4: 0.0}
+    assert desempenho[1]["total_produtos"] == 0.01 and desempenho[1]["faturamento_total"] == 60.01
+
+    ordens = {
+        "faturamento": [2, 3, 1, 4],
+        "visitas": [1, 3, 2, 4],   # empate desfeito pelo ID
+        "turistas": [3, 2, 1, 4],
+        "ticket_medio": [1, 2, 3, 4],
+    }
+    for criterio, ordem in ordens.items():
+        assert [g["id"] for g in _desempenho(cliente, ordenar_por=criterio)] == ordem, criterio
+        assert [g["id"] for g in _desempenho(cliente, ordenar_por=criterio, top=2)] == ordem[:2], criterio
+
+    # Guia desativado sai com apenas_ativos, mas continua no desempenho completo
+    assert cliente.delete("/guias/3", headers=CABECALHOS).status_code == 200
+    assert [g["id"] for g in _desempenho(cliente, apenas_ativos=True)] == [2, 1, 4]
+    assert [g["id"] for g in _desempenho(cliente)] == [2, 3, 1, 4]
+    assert desempenho[3]["ativo"] and not next(g for g in _desempenho(cliente) if g["id"] == 3)["ativo"]
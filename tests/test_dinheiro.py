@@ -0,0 +1,35 @@
+"""
+Conversão entre reais (float, na API) e centavos (inteiro, no banco).
+"""
+import pytest
+from app.dinheiro import dividir_centavos, para_centavos, para_reais
+
+
+@pytest.mark.parametrize("reais, centavos", [
+    (0.1 + 0.2, 30),          # 0.30000000000000004 no float
+    (1.005, 101),             # 1.00499999999999989... no binário; meio centavo para cima pelo texto
+    (2.675, 268),
+    (0.005, 1),
+    (0.004, 0),
+    (-1.005, -101),           # negativo: o meio centavo se afasta do zero
+    (-0.1 - 0.2, -30),
+    (0, 0),
+    (19.99, 1999),
+    (12345678.91, 1234567891),
+    (None, None),
+])
+def test_para_centavos(reais, centavos):
+    assert para_centavos(reais) == centavos
+
+
+def test_ida_e_volta_sem_perder_centavo():
+    for centavos in range(-10000, 10001):
+        assert para_centavos(para_reais(centavos)) == centavos
+    assert para_reais(1234) == 12.34 and para_reais(-5) == -0.05 and para_reais(None) is None
+
+
+def test_divisao_arredonda_meio_centavo_para_cima():
+    assert dividir_centavos(6001, 2) == 3001   # round() daria 3000
+    assert dividir_centavos(10000, 3) == 3333
+    assert dividir_centavos(20000, 3) == 6667
+    assert dividir_centavos(-6001, 2) == -3001
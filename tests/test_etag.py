@@ -0,0 +1,75 @@
+"""
+ETag e 304 nas listagens do catálogo (GET /produtos e GET /guias).
+"""
+import pytest
+from app.cache import renovar_epoca
+from app.database import SessionLocal
+from tests.conftest import CABECALHOS, popular
+
+CATALOGOS = {
+    "/produtos/": {"nome": "Produto novo", "preco": 7.5, "categoria": "Bebidas"},
+    "/guias/": {"nome": "Guia novo", "telefone": "11988887777"},
+}
+
+
+def _etag(cliente, rota: str, **params) -> str:
+    resposta = cliente.get(rota, params=params, headers=CABECALHOS)
+    assert resposta.status_code == 200 and resposta.headers["Cache-Control"] == "no-cache"
+    return resposta.headers["ETag"]
+
+
+def _condicional(cliente, rota: str, etag: str, **params):
+    return cliente.get(rota, params=params, headers={**CABECALHOS, "If-None-Match": etag})
+
+
+@pytest.mark.parametrize("rota", CATALOGOS)
+def test_etag_muda_a_cada_alteracao(cliente, rota):
+    popular(cliente, guias=2, produtos=2, visitas=0)
+    etag = _etag(cliente, rota)
+
+    # A mesma ETag (também no formato fraco, ou no meio de uma lista) dá 304 sem corpo
+    for if_none_match in (etag, f"W/{etag}", f'"outra", {etag}'):
+        resposta = _condicional(cliente, rota, if_none_match)
+        assert resposta.status_code == 304 and resposta.content == b"" and resposta.headers["ETag"] == etag
+
+    vistas = {etag}
+    for metodo, caminho, corpo in (
+        ("POST", rota, CATALOGOS[rota]),
+        ("PUT", f"{rota}1", CATALOGOS[rota]),
+        ("DELETE", f"{rota}2", None),  # desativa
+    ):
+        assert cliente.request(metodo, caminho, json=corpo, headers=CABECALHOS).status_code == 200
+        nova = _etag(cliente, rota)
+        assert nova not in vistas, metodo
+        # Quem tinha a ETag anterior recebe a lista nova
+        assert _condicional(cliente, rota, etag).status_code == 200
+        vistas.add(etag := nova)
+
+
+@pytest.mark.parametrize("rota", CATALOGOS)
+def test_etag_separada_para_apenas_ativos(cliente, rota):
+    popular(cliente, guias=2, produtos=2, visitas=0)
+    todos, ativos = _etag(cliente, rota), _etag(cliente, rota, apenas_ativos=True)
+    assert todos != ativos
+
+    assert _condicional(cliente, rota, ativos, apenas_ativos=True).status_code == 304
+    assert _condicional(cliente, rota, ativos).status_code == 200
+    assert _condicional(cliente, rota, todos, apenas_ativos=True).status_code == 200
+
+
+def test_etag_nao_se_repete_em_banco_recriado(cliente):
+    # Mesmas operações, mesmas versões: só a época do banco separa as ETags
+    popular(cliente, guias=1, produtos=1, visitas=0)
+    antes = {rota: _etag(cliente, rota) for rota in CATALOGOS}
+
+    popular(cliente, guias=1, produtos=1, visitas=0)
+    for rota, etag in antes.items():
+        assert _condicional(cliente, rota, etag).status_code == 200
+
+    # Banco restaurado de um backup: a época é sorteada de novo pelo comando de manutenção
+    depois = {rota: _etag(cliente, rota) for rota in CATALOGOS}
+    with SessionLocal() as db:
+        renovar_epoca(db)
+        db.commit()
+    for rota, etag in depois.items():
+        assert _condicional(cliente, rota, etag).status_code == 200
@@ -0,0 +1,137 @@
+"""
+Exportação das vendas em CSV, NDJSON e XLSX: cabeçalho, uma linha por item vendido, arquivo
+válido e filtro de período.
+"""
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+import pytest
+from sqlalchemy import update
+from app import models
+from app.database import SessionLocal
+from app.services import exportacao_service
+from tests.conftest import CABECALHOS, popular
+
+COLUNAS = [
+    "visita_id", "data_visita", "guia_id", "guia_nome", "qtd_turistas", "valor_taxa_guia", "total_produtos",
+    "produto_id", "produto_nome", "categoria", "quantidade", "preco_na_hora", "subtotal",
+]
+NOME_DIFICIL = 'Doce <caseiro> & "cia", 1kg – não'
+PLANILHA = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+ANTIGA = datetime(2024, 3, 10, 9, 30)
+PERIODO_ANTIGO = {"data_inicio": "2024-03-01", "data_fim": "2024-03-31"}
+
+
+@pytest.fixture
+def vendas(cliente):
+    # 20 visitas com 3 itens cada, uma visita sem itens (sai numa linha, com os campos do item vazios)
+    # e um produto com nome que precisa de escape no CSV e no XML
+    popular(cliente, guias=3, produtos=4, visitas=20)
+    produto = cliente.post("/produtos/", json={"nome": NOME_DIFICIL, "preco": 2.5, "categoria": "Doces"}, headers=CABECALHOS).json()
+    for itens in ([], [{"produto_id": produto["id"], "quantidade": 2}]):
+        cliente.post("/visitas/", json={"guia_id": 1, "qtd_turistas": 1, "valor_taxa_guia": 10.0, "itens": itens}, headers=CABECALHOS)
+
+    # As visitas 1 a 5 (15 itens) vão para março de 2024
+    with SessionLocal() as db:
+        db.execute(update(models.Visita).where(models.Visita.id <= 5).values(data_visita=ANTIGA))
+        db.commit()
+    return {"todas": 20 * 3 + 1 + 1, "antigas": 5 * 3}
+
+
+def _exportar(cliente, formato: str, **params):
+    resposta = cliente.get("/visitas/exportar", params={"formato": formato, **params}, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.headers["content-disposition"] == f'attachment; filename="vendas.{formato}"'
+    return resposta
+
+
+def _ler_csv(resposta):
+    assert resposta.headers["content-type"] == "text/csv; charset=utf-8"
+    cabecalho, *linhas = csv.reader(io.StringIO(resposta.content.decode("utf-8")))
+    assert cabecalho == COLUNAS
+    return [dict(zip(cabecalho, linha)) for linha in linhas]
+
+
+def _ler_ndjson(resposta):
+    assert resposta.headers["content-type"] == "application/x-ndjson"
+    linhas = [json.loads(linha) for linha in resposta.content.decode("utf-8").splitlines()]
+    assert all(list(linha) == COLUNAS for linha in linhas)
+    return linhas
+
+
+def _ler_xlsx(resposta):
+    pacote = zipfile.ZipFile(io.BytesIO(resposta.content))
+    assert pacote.testzip() is None
+    assert {"[Content_Types].xml", "_rels/.rels", "xl/workbook.xml", "xl/_rels/workbook.xml.rels"} <= set(pacote.namelist())
+
+    abas = [
+        aba.get("name") for aba in ElementTree.fromstring(pacote.read("xl/workbook.xml")).iter(f"{PLANILHA}sheet")
+    ]
+    linhas = []
+    for numero in range(1, len(abas) + 1):
+        aba = ElementTree.fromstring(pacote.read(f"xl/worksheets/sheet{numero}.xml"))
+        cabecalho, *corpo = [
+            ["".join(celula.itertext()) for celula in linha.iter(f"{PLANILHA}c")]
+            for linha in aba.iter(f"{PLANILHA}row")
+        ]
+        # Toda aba começa com o cabeçalho
+        assert cabecalho == COLUNAS
+        linhas.extend(dict(zip(COLUNAS, celulas)) for celulas in corpo)
+    return abas, linhas
+
+
+def test_csv(cliente, vendas):
+    linhas = _ler_csv(_exportar(cliente, "csv"))
+    assert len(linhas) == vendas["todas"]
+
+    sem_itens = [linha for linha in linhas if not linha["produto_id"]]
+    assert len(sem_itens) == 1 and sem_itens[0]["guia_nome"] == "Guia 1"
+    dificil = next(linha for linha in linhas if linha["produto_nome"] == NOME_DIFICIL)
+    assert (dificil["quantidade"], dificil["preco_na_hora"], dificil["subtotal"]) == ("2", "2.5", "5.0")
+
+    # Mais antigas primeiro
+    datas = [datetime.fromisoformat(linha["data_visita"]) for linha in linhas]
+    assert datas == sorted(datas) and datas[0] == ANTIGA
+
+
+def test_ndjson(cliente, vendas):
+    linhas = _ler_ndjson(_exportar(cliente, "ndjson"))
+    assert len(linhas) == vendas["todas"]
+    assert sum(linha["subtotal"] or 0 for linha in linhas) == pytest.approx(
+        sum(linha["preco_na_hora"] * linha["quantidade"] for linha in linhas if linha["produto_id"])
+    )
+    assert next(linha for linha in linhas if linha["produto_nome"] == NOME_DIFICIL)["subtotal"] == 5.0
+
+
+def test_xlsx(cliente, vendas):
+    abas, linhas = _ler_xlsx(_exportar(cliente, "xlsx"))
+    assert abas == ["Vendas 1"] and len(linhas) == vendas["todas"]
+    assert any(linha["produto_nome"] == NOME_DIFICIL for linha in linhas)
+    assert _ler_csv(_exportar(cliente, "csv"))[0]["visita_id"] == linhas[0]["visita_id"]
+
+
+def test_xlsx_em_varias_abas(cliente, vendas, monkeypatch):
+    # Cada aba leva o cabeçalho e no máximo 10 linhas contando com ele
+    monkeypatch.setattr(exportacao_service, "LINHAS_POR_ABA_XLSX", 10)
+    abas, linhas = _ler_xlsx(_exportar(cliente, "xlsx"))
+    assert len(abas) == -(-vendas["todas"] // 9) and len(linhas) == vendas["todas"]
+    assert len({(linha["visita_id"], linha["produto_id"]) for linha in linhas}) == vendas["todas"]
+
+
+def test_filtro_de_periodo(cliente, vendas):
+    csv_linhas = _ler_csv(_exportar(cliente, "csv", **PERIODO_ANTIGO))
+    ndjson_linhas = _ler_ndjson(_exportar(cliente, "ndjson", **PERIODO_ANTIGO))
+    _, xlsx_linhas = _ler_xlsx(_exportar(cliente, "xlsx", **PERIODO_ANTIGO))
+
+    assert len(csv_linhas) == len(ndjson_linhas) == len(xlsx_linhas) == vendas["antigas"]
+    assert {int(linha["visita_id"]) for linha in csv_linhas} == {1, 2, 3, 4, 5}
+    assert all(datetime.fromisoformat(linha["data_visita"]) == ANTIGA for linha in ndjson_linhas)
+
+    # Período sem vendas: só o cabeçalho
+    assert _ler_csv(_exportar(cliente, "csv", data_inicio="2023-01-01", data_fim="2023-01-31")) == []
+    # Datas invertidas são recusadas antes de a resposta começar
+    resposta = cliente.get("/visitas/exportar", params={"data_inicio": "2024-03-31", "data_fim": "2024-03-01"}, headers=CABECALHOS)
+    assert resposta.status_code == 400
@@ -0,0 +1,77 @@
+"""
+Lado da leitura: conexões que não gravam, leituras longas que não seguram a escrita e todos
+os GETs passando pelo get_read_db.
+"""
+import time
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.database import criar_engine, get_db
+from app.main import app
+from tests.conftest import CABECALHOS, popular
+
+
+@pytest.fixture
+def engines(tmp_path):
+    # Os testes usam um banco em memória, que não tem lado de leitura separado; aqui é um arquivo
+    url = f"sqlite:///{tmp_path / 'leitura.db'}"
+    escrita, leitura = criar_engine(url), criar_engine(url, leitura=True)
+    with escrita.begin() as conexao:
+        conexao.exec_driver_sql("CREATE TABLE vendas (id INTEGER PRIMARY KEY, valor INTEGER)")
+        conexao.exec_driver_sql("INSERT INTO vendas (valor) VALUES (10), (20), (30)")
+    yield escrita, leitura
+    escrita.dispose()
+    leitura.dispose()
+
+
+def test_conexao_de_leitura_nao_grava(engines):
+    _, leitura = engines
+    with leitura.connect() as conexao:
+        assert conexao.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        assert conexao.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        with pytest.raises(OperationalError, match="readonly"):
+            conexao.exec_driver_sql("INSERT INTO vendas (valor) VALUES (40)")
+
+
+def test_leitura_longa_nao_segura_a_escrita(engines):
+    escrita, leitura = engines
+
+    with leitura.connect() as conexao_leitura:
+        # Transação de leitura aberta e no meio do resultado, como num relatório demorado
+        transacao = conexao_leitura.begin()
+        resultado = conexao_leitura.execute(text("SELECT valor FROM vendas ORDER BY id"))
+        assert resultado.fetchone() == (10,)
+
+        inicio = time.perf_counter()
+        with escrita.begin() as conexao_escrita:
+            conexao_escrita.exec_driver_sql("INSERT INTO vendas (valor) VALUES (40)")
+        # Com WAL o commit não espera o leitor (sem isso, esperaria o busy_timeout inteiro)
+        assert time.perf_counter() - inicio < 1
+
+        # A leitura em andamento continua vendo o banco como estava quando começou
+        assert [v for (v,) in resultado] == [20, 30]
+        transacao.rollback()
+
+        assert conexao_leitura.exec_driver_sql("SELECT COUNT(*) FROM vendas").scalar() == 4
+
+
+def test_gets_usam_o_lado_da_leitura():
+    def dependencias(dependente):
+        for dependencia in dependente.dependencies:
+            yield dependencia.call
+            yield from dependencias(dependencia)
+
+    com_escrita = sorted(
+        rota.path
+        for rota in app.routes
+        if isinstance(rota, APIRoute) and "GET" in rota.methods and get_db in dependencias(rota.dependant)
+    )
+    assert not com_escrita, f"GETs usando a sessão de escrita (troque por get_read_db): {com_escrita}"
+
+
+def test_metricas_dos_pools(cliente):
+    popular(cliente, guias=1, produtos=1, visitas=0)
+    cliente.get("/guias/", headers=CABECALHOS)
+    metricas = cliente.get("/metrics").text
+    assert 'turismo_db_pool_espera_segundos_count{lado="escrita"}' in metricas
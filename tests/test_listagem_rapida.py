@@ -0,0 +1,82 @@
+"""
+Caminho rápido das listagens (LISTAGEM_RAPIDA): o corpo tem que sair byte a byte igual ao do
+caminho normal, pelo response_model do FastAPI.
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
+from app import models, schemas
+from app.config import configuracoes
+from app.database import SessionLocal
+from app.respostas import RespostaJSONRapida
+from tests.conftest import CABECALHOS, popular
+
+
+def _nos_dois_caminhos(cliente, monkeypatch, rota: str, **params):
+    respostas = {}
+    for rapida in (False, True):
+        monkeypatch.setattr(configuracoes, "listagem_rapida", rapida)
+        resposta = cliente.get(rota, params=params, headers=CABECALHOS)
+        assert resposta.status_code == 200, resposta.text
+        respostas[rapida] = resposta
+
+    normal, rapida = respostas[False], respostas[True]
+    assert rapida.content == normal.content, rota
+    for cabecalho in ("content-type", "etag", "x-proximo-cursor"):
+        assert rapida.headers.get(cabecalho) == normal.headers.get(cabecalho), (rota, cabecalho)
+    return normal
+
+
+def test_mesmo_corpo_nos_dois_caminhos(cliente, monkeypatch):
+    popular(cliente, guias=3, produtos=5, visitas=25)
+    # Acentos, preço com fração que o float não representa exato e um produto desativado
+    cliente.post("/guias/", json={"nome": "José Araújo", "telefone": "11955554444"}, headers=CABECALHOS)
+    cliente.post("/produtos/", json={"nome": "Água de coco", "preco": 0.1 + 0.2, "categoria": "Bebidas"}, headers=CABECALHOS)
+    cliente.delete("/produtos/2", headers=CABECALHOS)
+    # Datas com e sem microssegundos, em dias diferentes
+    with SessionLocal() as db:
+        db.execute(update(models.Visita).where(models.Visita.id % 3 == 0).values(
+            data_visita=datetime(2024, 5, 17, 13, 45, 12, 345678)
+        ))
+        db.execute(update(models.Visita).where(models.Visita.id % 3 == 1).values(
+            data_visita=datetime.utcnow().replace(microsecond=0) - timedelta(days=2)
+        ))
+        db.commit()
+
+    _nos_dois_caminhos(cliente, monkeypatch, "/guias/")
+    _nos_dois_caminhos(cliente, monkeypatch, "/guias/", apenas_ativos=True)
+    _nos_dois_caminhos(cliente, monkeypatch, "/produtos/")
+    _nos_dois_caminhos(cliente, monkeypatch, "/produtos/", apenas_ativos=True)
+
+    # Todas as páginas da listagem de visitas, seguindo o cursor
+    paginas, cursor = 0, None
+    while True:
+        params = {"limite": 7, **({"cursor": cursor} if cursor else {})}
+        resposta = _nos_dois_caminhos(cliente, monkeypatch, "/visitas/", **params)
+        paginas += 1
+        cursor = resposta.headers.get("x-proximo-cursor")
+        if not cursor:
+            break
+    assert paginas == 4
+    _nos_dois_caminhos(cliente, monkeypatch, "/visitas/", guia_id=2, data_inicio="2024-01-01", data_fim="2024-12-31")
+    assert "13:45:12.345678" in _nos_dois_caminhos(cliente, monkeypatch, "/visitas/", data_fim="2024-12-31").text
+
+    for params in ({}, {"top": 3, "ordenar_por": "unidades"}, {"categoria": "Bebidas", "apenas_ativos": True}):
+        _nos_dois_caminhos(cliente, monkeypatch, "/produtos/ranking", **params)
+    _nos_dois_caminhos(cliente, monkeypatch, "/guias/desempenho")
+    _nos_dois_caminhos(cliente, monkeypatch, "/visitas/serie", data_inicio="2024-05-01", data_fim="2024-05-31")
+
+
+@pytest.mark.parametrize("data", [
+    datetime(2024, 5, 17, 13, 45, 12, tzinfo=timezone.utc),
+    datetime(2024, 5, 17, 13, 45, 12, 345678, tzinfo=timezone.utc),
+    datetime(2024, 5, 17, 13, 45, 12, tzinfo=timezone(timedelta(hours=-3))),
+    datetime(2024, 5, 17, 13, 45, 12),
+])
+def test_datas_como_o_pydantic(data):
+    # Um banco que devolve datas com fuso (PostgreSQL) passa por aqui: UTC sai com "Z" nos dois
+    visita = schemas.VisitaResponse(id=1, data_visita=data, qtd_turistas=2, total_produtos=0.3, total_arrecadado=10.3, guia=None, itens=[])
+    normal = JSONResponse(jsonable_encoder(visita)).body
+    assert RespostaJSONRapida(visita.model_dump()).body == normal
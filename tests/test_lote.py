@@ -0,0 +1,80 @@
+"""
+Registro de visitas: no lote, cada visita é validada sozinha e o erro volta na posição dela, e
+o id devolvido em cada posição é o da visita enviada ali; itens de preço zero (brindes) entram
+no lote e no cadastro individual.
+"""
+from tests.conftest import CABECALHOS, popular
+
+
+def test_lote_com_brinde_e_produto_inexistente(cliente):
+    popular(cliente, guias=1, produtos=2, visitas=0)
+    brinde = cliente.post("/produtos/", json={"nome": "Brinde", "preco": 0, "categoria": "Artesanato"}, headers=CABECALHOS).json()
+
+    resposta = cliente.post("/visitas/lote", json={"visitas": [
+        {"guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 10, "itens": [
+            {"produto_id": 1, "quantidade": 2}, {"produto_id": brinde["id"], "quantidade": 2},
+        ]},
+        {"guia_id": 1, "qtd_turistas": 1, "valor_taxa_guia": 10, "itens": [{"produto_id": 999, "quantidade": 1}]},
+    ]}, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    corpo = resposta.json()
+    assert (corpo["total_registradas"], corpo["total_com_erro"]) == (1, 1)
+
+    primeira, segunda = corpo["resultados"]
+    assert primeira["sucesso"] and not segunda["sucesso"]
+    assert segunda["indice"] == 1 and "999" in segunda["erro"]
+
+    # O brinde fica gravado como item da visita, com subtotal zero
+    visita, = cliente.get("/visitas/", headers=CABECALHOS).json()
+    assert visita["id"] == primeira["visita_id"]
+    assert {item["produto_id"]: item["quantidade"] for item in visita["itens"]} == {1: 2, brinde["id"]: 2}
+    assert visita["total_produtos"] == 10.0
+
+
+def test_visita_com_brinde(cliente):
+    # O cadastro individual grava o brinde do mesmo jeito que o lote
+    popular(cliente, guias=1, produtos=1, visitas=0)
+    brinde = cliente.post("/produtos/", json={"nome": "Brinde", "preco": 0, "categoria": "Artesanato"}, headers=CABECALHOS).json()
+
+    resposta = cliente.post("/visitas/", json={
+        "guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 10,
+        "itens": [{"produto_id": 1, "quantidade": 1}, {"produto_id": brinde["id"], "quantidade": 2}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    visita = resposta.json()
+    assert [(i["produto_id"], i["quantidade"], i["preco_na_hora"]) for i in visita["itens"]] == [(1, 1, 5.0), (brinde["id"], 2, 0.0)]
+    assert visita["total_produtos"] == 5.0
+
+    resposta = cliente.post("/visitas/", json={
+        "guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 10, "itens": [{"produto_id": 999, "quantidade": 1}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 400
+
+
+def test_ids_do_lote_na_ordem_enviada(cliente):
+    # Cada visita tem uma quantidade de turistas diferente, então dá para conferir que o id
+    # devolvido em cada posição é mesmo o da visita enviada ali (inclusive com blocos e erros)
+    popular(cliente, guias=2, produtos=3, visitas=3)
+    lote = [
+        {"guia_id": 999 if i % 5 == 4 else i % 2 + 1, "qtd_turistas": i + 1, "valor_taxa_guia": 10,
+         "itens": [{"produto_id": i % 3 + 1, "quantidade": i + 1}]}
+        for i in range(23)
+    ]
+
+    resposta = cliente.post("/visitas/lote", json={"visitas": lote, "tamanho_bloco": 4}, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    resultados = resposta.json()["resultados"]
+    ids = [r["visita_id"] for r in resultados if r["sucesso"]]
+    assert len(ids) == 19 and len(set(ids)) == 19
+
+    visitas = {v["id"]: v for v in cliente.get("/visitas/", params={"limite": 500}, headers=CABECALHOS).json()}
+    for resultado in resultados:
+        if not resultado["sucesso"]:
+            assert lote[resultado["indice"]]["guia_id"] == 999
+            continue
+        enviada, gravada = lote[resultado["indice"]], visitas[resultado["visita_id"]]
+        assert gravada["qtd_turistas"] == enviada["qtd_turistas"]
+        assert gravada["guia"]["nome"] == f"Guia {enviada['guia_id']}"
+        assert [(i["produto_id"], i["quantidade"]) for i in gravada["itens"]] == [
+            (item["produto_id"], item["quantidade"]) for item in enviada["itens"]
+        ]
@@ -0,0 +1,111 @@
+"""
+Migrations rodando de verdade (alembic num processo à parte, num banco em arquivo).
+"""
+import importlib.util
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from app.dinheiro import para_centavos
+
+RAIZ = Path(__file__).resolve().parent.parent
+ANTES_DOS_CENTAVOS = "ecba03df5a12"
+CENTAVOS = "2b788409de0f"
+
+
+def _migracao(revisao: str):
+    caminho, = (RAIZ / "alembic" / "versions").glob(f"{revisao}_*.py")
+    especificacao = importlib.util.spec_from_file_location(f"migracao_{revisao}", caminho)
+    modulo = importlib.util.module_from_spec(especificacao)
+    especificacao.loader.exec_module(modulo)
+    return modulo
+
+
+def _alembic(banco: Path, *argumentos):
+    return subprocess.run(
+        [sys.executable, "-m", "alembic", *argumentos],
+        cwd=RAIZ, env={**os.environ, "DATABASE_URL": f"sqlite:///{banco}"}, capture_output=True, text=True,
+    )
+
+
+@pytest.fixture
+def banco_da_epoca_do_float(tmp_path):
+    banco = tmp_path / "float.db"
+    resultado = _alembic(banco, "upgrade", ANTES_DOS_CENTAVOS)
+    assert resultado.returncode == 0, resultado.stderr
+    return banco
+
+
+def test_conversao_para_centavos(banco_da_epoca_do_float):
+    # Valores com meio centavo, mas cujos totais fecham com a conversão de cada um
+    precos = [1.005, 1.004, 2.675, 0.003, 19.99]
+    visitas = [(1, 2, 0.1 + 0.2, 7.355, "2024-01-01 10:00:00"), (2, 3, 1.005, 40.2, "2024-01-01 15:00:00"), (3, 1, 50.0, 0.0, "2024-01-02 09:00:00")]
+    with sqlite3.connect(banco_da_epoca_do_float) as conexao:
+        conexao.execute("INSERT INTO guias (id, nome, telefone, ativo) VALUES (1, 'Guia', '11999999999', 1)")
+        conexao.executemany(
+            "INSERT INTO produtos (id, nome, preco, categoria, ativo) VALUES (?, ?, ?, 'Bebidas', 1)",
+            [(i + 1, f"Produto {i + 1}", preco) for i, preco in enumerate(precos)],
+        )
+        conexao.executemany(
+            "INSERT INTO visitas (id, qtd_turistas, valor_taxa_guia, total_produtos, data_visita, guia_id) VALUES (?, ?, ?, ?, ?, 1)",
+            visitas,
+        )
+        conexao.executemany(
+            "INSERT INTO visita_produtos (visita_id, produto_id, quantidade, preco_na_hora) VALUES (?, ?, ?, ?)",
+            [(1, 1, 1, 1.005), (1, 2, 1, 1.004), (2, 5, 2, 19.99)],
+        )
+    conexao.close()
+
+    resultado = _alembic(banco_da_epoca_do_float, "upgrade", CENTAVOS)
+    assert resultado.returncode == 0, resultado.stderr
+
+    with sqlite3.connect(banco_da_epoca_do_float) as conexao:
+        # Cada valor com a mesma regra da API, inclusive os de meio centavo
+        assert [r[0] for r in conexao.execute("SELECT preco_centavos FROM produtos ORDER BY id")] == [para_centavos(p) for p in precos]
+        assert conexao.execute("SELECT valor_taxa_guia_centavos, total_produtos_centavos FROM visitas ORDER BY id").fetchall() == [
+            (para_centavos(taxa), para_centavos(produtos)) for _, _, taxa, produtos, _ in visitas
+        ]
+        assert conexao.execute(
+            "SELECT preco_na_hora_centavos, subtotal_centavos FROM visita_produtos ORDER BY id"
+        ).fetchall() == [(101, 101), (100, 100), (1999, 3998)]
+
+        # Os totais batem com os da época do float, e o resumo diário com as visitas
+        assert conexao.execute("SELECT SUM(preco_centavos) FROM produtos").fetchone()[0] == para_centavos(sum(precos))
+        assert conexao.execute(
+            "SELECT dia, qtd_visitas, total_taxas_centavos, total_produtos_centavos FROM resumo_diario ORDER BY dia"
+        ).fetchall() == [("2024-01-01", 2, 30 + 101, 736 + 4020), ("2024-01-02", 1, 5000, 0)]
+    conexao.close()
+
+
+def test_fracoes_de_centavo_que_nao_fecham_param_a_conversao(banco_da_epoca_do_float):
+    # Cada 0.005 vira 1 centavo, mas a soma (0.01) é 1 centavo só: a migração para sem mexer no banco
+    with sqlite3.connect(banco_da_epoca_do_float) as conexao:
+        conexao.executemany(
+            "INSERT INTO produtos (nome, preco, categoria, ativo) VALUES ('Bala', ?, 'Bebidas', 1)", [(0.005,), (0.005,)]
+        )
+    conexao.close()
+
+    resultado = _alembic(banco_da_epoca_do_float, "upgrade", CENTAVOS)
+    assert resultado.returncode != 0 and "produtos.preco" in resultado.stderr
+
+    with sqlite3.connect(banco_da_epoca_do_float) as conexao:
+        assert conexao.execute("SELECT version_num FROM alembic_version").fetchone()[0] == ANTES_DOS_CENTAVOS
+        assert "preco_centavos" not in {linha[1] for linha in conexao.execute("PRAGMA table_info(produtos)")}
+    conexao.close()
+
+
+def test_funcao_centavos_por_banco():
+    migracao = _migracao(CENTAVOS)
+
+    # No SQLite a função é a própria para_centavos, registrada na conexão
+    with create_engine("sqlite://").connect() as conexao:
+        migracao._registrar_centavos(conexao)
+        assert conexao.exec_driver_sql("SELECT centavos(1.005), centavos(2.675), centavos(0.1 + 0.2)").one() == (101, 268, 30)
+
+    # Banco que a migração não sabe converter: para antes de mexer em qualquer coisa, dizendo o porquê
+    with pytest.raises(RuntimeError, match="mysql"):
+        migracao._registrar_centavos(SimpleNamespace(dialect=SimpleNamespace(name="mysql")))
@@ -0,0 +1,118 @@
+"""
+Modo assíncrono (DB_ASYNC): as rotas com AsyncSession num SQLite em arquivo, com os services
+rodando pelo run_sync do ServicoAssincrono. Os outros testes usam o banco em memória, que
+força o modo síncrono.
+"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app import database
+from app.ao_vivo import painel_ao_vivo
+from app.cache import catalogo_cache
+from app.database import Base, criar_engine, criar_engine_assincrono
+from tests.conftest import CABECALHOS
+
+HOJE = date.today()
+
+
+@pytest.fixture
+def modo_assincrono(cliente, tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'assincrono.db'}"
+    sincrono = criar_engine(url, sem_pool=True)
+    Base.metadata.create_all(sincrono)
+    sincrono.dispose()
+
+    # Os mesmos engines que o app monta com DB_ASYNC ligado: aiosqlite, escrita e leitura separadas
+    escrita, leitura = criar_engine_assincrono(url), criar_engine_assincrono(url, leitura=True)
+    monkeypatch.setattr(database, "USAR_ASYNC", True)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(escrita, autoflush=False, expire_on_commit=False))
+    monkeypatch.setattr(database, "AsyncSessionLocalLeitura", async_sessionmaker(leitura, autoflush=False, expire_on_commit=False))
+
+    # Conto as chamadas ao run_sync para saber que cada rota passou por ele
+    chamadas = []
+    run_sync = AsyncSession.run_sync
+
+    async def contar(sessao, funcao, *args, **kwargs):
+        chamadas.append(getattr(funcao, "__name__", repr(funcao)))
+        return await run_sync(sessao, funcao, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncSession, "run_sync", contar)
+
+    def limpar():
+        catalogo_cache.invalidar("produtos")
+        catalogo_cache.invalidar("guias")
+        painel_ao_vivo.limpar()
+
+    limpar()
+    yield url, chamadas
+    limpar()
+    # As conexões do aiosqlite são do loop do cliente de testes; fecho por lá
+    cliente.portal.call(escrita.dispose)
+    cliente.portal.call(leitura.dispose)
+
+
+def _pedir(cliente, chamadas, metodo: str, rota: str, **kwargs):
+    antes = len(chamadas)
+    resposta = cliente.request(metodo, rota, headers={**CABECALHOS, **kwargs.pop("headers", {})}, **kwargs)
+    assert resposta.status_code in (200, 304), (metodo, rota, resposta.text)
+    assert len(chamadas) > antes, f"{metodo} {rota} não passou pelo run_sync"
+    return resposta
+
+
+def test_rotas_no_modo_assincrono(cliente, modo_assincrono):
+    url, chamadas = modo_assincrono
+    pedir = lambda metodo, rota, **kwargs: _pedir(cliente, chamadas, metodo, rota, **kwargs)
+
+    # CRUD do catálogo
+    for i in range(3):
+        pedir("POST", "/guias/", json={"nome": f"Guia {i + 1}", "telefone": f"1199{i:07d}"})
+        pedir("POST", "/produtos/", json={"nome": f"Produto {i + 1}", "preco": 5.0 + i, "categoria": "Bebidas"})
+    assert pedir("PUT", "/guias/1", json={"nome": "Guia Um", "telefone": "11999990000"}).json()["nome"] == "Guia Um"
+    assert pedir("PUT", "/produtos/1", json={"nome": "Produto Um", "preco": 6.5, "categoria": "Bebidas"}).json()["preco"] == 6.5
+    pedir("DELETE", "/guias/3")
+    pedir("DELETE", "/produtos/3")
+    assert pedir("GET", "/guias/2").json()["id"] == 2
+
+    # Visitas: cadastro, lote, atualização e remoção
+    visita = pedir("POST", "/visitas/", json={
+        "guia_id": 1, "qtd_turistas": 2, "valor_taxa_guia": 20.0, "itens": [{"produto_id": 1, "quantidade": 2}],
+    }).json()
+    assert visita["total_arrecadado"] == 33.0 and visita["guia"]["nome"] == "Guia Um"
+    lote = pedir("POST", "/visitas/lote", json={"visitas": [
+        {"guia_id": 1 + i % 2, "qtd_turistas": i + 1, "valor_taxa_guia": 10.0, "itens": [{"produto_id": 2, "quantidade": 1}]}
+        for i in range(6)
+    ]}).json()
+    assert lote["total_registradas"] == 6
+    pedir("PUT", f"/visitas/{visita['id']}", json={
+        "guia_id": 2, "qtd_turistas": 3, "valor_taxa_guia": 30.0, "itens": [{"produto_id": 2, "quantidade": 1}],
+    })
+    pedir("DELETE", f"/visitas/{lote['resultados'][0]['visita_id']}")
+
+    # Listagens, com ETag e com a paginação por cursor
+    etag = pedir("GET", "/produtos/").headers["ETag"]
+    assert pedir("GET", "/produtos/", headers={"If-None-Match": etag}).status_code == 304
+    assert [g["id"] for g in pedir("GET", "/guias/", params={"apenas_ativos": True}).json()] == [1, 2]
+
+    pagina = pedir("GET", "/visitas/", params={"limite": 4})
+    ids = [v["id"] for v in pagina.json()]
+    pagina = pedir("GET", "/visitas/", params={"limite": 4, "cursor": pagina.headers["X-Proximo-Cursor"]})
+    ids += [v["id"] for v in pagina.json()]
+    assert "X-Proximo-Cursor" not in pagina.headers and len(ids) == len(set(ids)) == 6
+
+    # Relatórios: os totais conferem com o que foi registrado
+    periodo = {"data_inicio": (HOJE - timedelta(days=1)).isoformat(), "data_fim": (HOJE + timedelta(days=1)).isoformat()}
+    relatorio = pedir("GET", "/visitas/relatorio", params=periodo).json()
+    assert relatorio["quantidade_visitas"] == 6
+    # Taxas: 30 da visita atualizada + 5 do lote (uma removida); produtos: 6 visitas com um produto 2
+    assert (relatorio["total_taxas_guias"], relatorio["total_produtos"]) == (80.0, 36.0)
+    assert sum(p["visitas"] for p in pedir("GET", "/visitas/serie", params=periodo).json()) == 6
+    assert sum(g["visitas"] for g in pedir("GET", "/guias/desempenho", params=periodo).json()) == 6
+    ranking = pedir("GET", "/produtos/ranking", params=periodo).json()
+    assert {p["id"]: p["unidades_vendidas"] for p in ranking if p["unidades_vendidas"]} == {2: 6}
+
+    assert {"registrar_visita", "registrar_lote", "atualizar_visita", "gerar_relatorio_filtrado"} <= set(chamadas)
+    # Tudo foi gravado no arquivo, e não no banco em memória dos outros testes
+    conferencia = criar_engine(url, sem_pool=True)
+    with conferencia.connect() as conexao:
+        assert conexao.exec_driver_sql("SELECT COUNT(*) FROM visitas").scalar() == 6
+    conferencia.dispose()
@@ -0,0 +1,134 @@
+"""
+Orçamento de consultas SQL por endpoint.
+
+Cada endpoint roda contra o banco em memória populado em dois tamanhos. O teste falha se a
+quantidade de consultas mudar com o tamanho do banco (sinal de N+1) ou passar do orçamento
+declarado aqui. Endpoint novo precisa entrar na tabela, senão o teste de cobertura falha.
+"""
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+import pytest
+from fastapi.routing import APIRoute
+from app.cache import catalogo_cache
+from app.database import engine
+from app.main import app
+from tests.conftest import CABECALHOS, TAMANHOS, popular
+from tests.consultas import ContadorConsultas
+
+VISITA = {"guia_id": 1, "qtd_turistas": 3, "valor_taxa_guia": 40.0, "itens": [{"produto_id": 1, "quantidade": 2}, {"produto_id": 2, "quantidade": 1}]}
+PERIODO = {"data_inicio": "2020-01-01", "data_fim": "2099-12-31"}
+# As visitas do popular() são gravadas com a data de hoje
+PERIODO_CURTO = {"data_inicio": (date.today() - timedelta(days=1)).isoformat(), "data_fim": date.today().isoformat()}
+# Mesmos itens que a visita 1 já tem depois do popular(), mudando só o resto
+VISITA_MESMOS_ITENS = {"guia_id": 1, "qtd_turistas": 9, "valor_taxa_guia": 50.0, "itens": [{"produto_id": 1, "quantidade": 1}, {"produto_id": 2, "quantidade": 2}, {"produto_id": 3, "quantidade": 3}]}
+
+
+class Chamada(NamedTuple):
+    metodo: str
+    rota: str
+    url: str
+    orcamento: int
+    json: Optional[dict] = None
+    params: Optional[dict] = None
+    cabecalhos: Optional[dict] = None
+
+
+CHAMADAS = [
+    Chamada("GET", "/", "/", 0),
+    Chamada("GET", "/metrics", "/metrics", 0),
+    Chamada("GET", "/diagnostico/cache", "/diagnostico/cache", 0),
+
+    Chamada("POST", "/guias/", "/guias/", 3, json={"nome": "Novo", "telefone": "11999999999"}),
+    Chamada("GET", "/guias/", "/guias/", 2),
+    # Com a ETag ainda válida, só a versão do catálogo é lida
+    Chamada("GET", "/guias/", "/guias/", 1, cabecalhos={"If-None-Match": "*"}),
+    Chamada("GET", "/guias/busca", "/guias/busca", 1, params={"q": "gui"}),
+    Chamada("GET", "/guias/desempenho", "/guias/desempenho", 1, params=PERIODO),
+    Chamada("GET", "/guias/{guia_id}", "/guias/1", 1),
+    Chamada("PUT", "/guias/{guia_id}", "/guias/1", 4, json={"nome": "Outro", "telefone": "11888888888"}),
+    Chamada("DELETE", "/guias/{guia_id}", "/guias/1", 3),
+
+    Chamada("POST", "/produtos/", "/produtos/", 3, json={"nome": "Novo", "preco": 9.9, "categoria": "Bebidas"}),
+    Chamada("GET", "/produtos/", "/produtos/", 2),
+    Chamada("GET", "/produtos/", "/produtos/", 1, cabecalhos={"If-None-Match": "*"}),
+    Chamada("GET", "/produtos/busca", "/produtos/busca", 1, params={"q": "prod 1"}),
+    Chamada("PUT", "/produtos/{produto_id}", "/produtos/1", 4, json={"nome": "Outro", "preco": 7.5, "categoria": "Bebidas"}),
+    Chamada("DELETE", "/produtos/{produto_id}", "/produtos/1", 3),
+    Chamada("GET", "/produtos/ranking", "/produtos/ranking", 1, params={"top": 10, **PERIODO}),
+
+    # No SQLite o ORM grava um INSERT por item (precisa do id de volta na ordem certa), então o
+    # orçamento depende dos 2 itens de VISITA; o que não pode acontecer é crescer com o banco
+    Chamada("POST", "/visitas/", "/visitas/", 7, json=VISITA),
+    # No lote as visitas vão num executemany (mais a leitura dos ids gerados) e os itens em outro,
+    # com qualquer quantidade de visitas
+    Chamada("POST", "/visitas/lote", "/visitas/lote", 7, json={"visitas": [VISITA] * 5}),
+    Chamada("GET", "/visitas/", "/visitas/", 2, params={"limite": 100}),
+    # Os itens são atualizados pela diferença: 2 quantidades mudam (um UPDATE só) e 1 item sai
+    Chamada("PUT", "/visitas/{visita_id}", "/visitas/1", 9, json=VISITA),
+    # Sem mudança nos itens, só a visita é gravada
+    Chamada("PUT", "/visitas/{visita_id}", "/visitas/1", 7, json=VISITA_MESMOS_ITENS),
+    Chamada("DELETE", "/visitas/{visita_id}", "/visitas/1", 5),
+    Chamada("GET", "/visitas/relatorio", "/visitas/relatorio", 3, params=PERIODO),
+    Chamada("GET", "/visitas/serie", "/visitas/serie", 1, params={**PERIODO, "bucket": "month"}),
+    Chamada("GET", "/visitas/serie", "/visitas/serie", 1, params={**PERIODO_CURTO, "bucket": "hour"}),
+    # Começando e terminando no meio do dia: o resumo e as duas pontas parciais
+    Chamada("GET", "/visitas/serie", "/visitas/serie", 3, params={
+        "data_inicio": "2020-01-01T10:00:00", "data_fim": "2099-12-30T10:00:00", "bucket": "month",
+    }),
+    Chamada("GET", "/visitas/exportar", "/visitas/exportar", 1, params={"formato": "csv"}),
+]
+
+# Streams que não terminam sozinhos (o TestClient espera a resposta acabar) e relatórios que
+# consultam o banco fora da requisição, no pool; as consultas deles são medidas no próprio teste
+MEDIDOS_A_PARTE = {
+    ("GET", "/visitas/ao-vivo"),  # tests/test_ao_vivo.py
+    ("POST", "/relatorios/jobs"),  # tests/test_relatorios.py
+    ("GET", "/relatorios/jobs/{job_id}"),
+    ("GET", "/relatorios/jobs/{job_id}/arquivo"),
+}
+
+
+def _medir(cliente, chamada: Chamada, tamanho: str) -> ContadorConsultas:
+    popular(cliente, **TAMANHOS[tamanho])
+    # Começo sempre com o cache do catálogo vazio, para a contagem não depender do que
+    # ficou carregado pela preparação dos dados
+    catalogo_cache.invalidar("produtos")
+    catalogo_cache.invalidar("guias")
+
+    with ContadorConsultas(engine) as contador:
+        resposta = cliente.request(
+            chamada.metodo, chamada.url, json=chamada.json, params=chamada.params,
+            headers={**CABECALHOS, **(chamada.cabecalhos or {})},
+        )
+    assert resposta.status_code < 400, f"{chamada.metodo} {chamada.url}: {resposta.status_code} {resposta.text}"
+
+    return contador
+
+
+@pytest.mark.parametrize("chamada", CHAMADAS, ids=lambda c: f"{c.metodo} {c.rota} {c.cabecalhos or ''}".strip())
+def test_consultas_dentro_do_orcamento(cliente, chamada: Chamada):
+    pequeno = _medir(cliente, chamada, "pequeno")
+    grande = _medir(cliente, chamada, "grande")
+
+    assert pequeno.total == grande.total, (
+        f"{chamada.metodo} {chamada.rota} faz mais consultas com mais dados "
+        f"({pequeno.total} -> {grande.total}).\n{grande.descrever()}"
+    )
+    assert grande.total <= chamada.orcamento, (
+        f"{chamada.metodo} {chamada.rota} passou do orçamento de {chamada.orcamento} consultas.\n"
+        f"{grande.descrever()}"
+    )
+
+
+def test_todos_os_endpoints_tem_orcamento():
+    declarados = {(c.metodo, c.rota) for c in CHAMADAS} | MEDIDOS_A_PARTE
+    documentacao = {app.openapi_url, app.docs_url, app.redoc_url, app.swagger_ui_oauth2_redirect_url}
+
+    faltando = sorted(
+        (metodo, rota.path)
+        for rota in app.routes
+        if isinstance(rota, APIRoute) and rota.path not in documentacao
+        for metodo in rota.methods
+        if (metodo, rota.path) not in declarados
+    )
+    assert not faltando, f"Endpoints sem orçamento de consultas: {faltando}"
@@ -0,0 +1,64 @@
+"""
+Perfil sob demanda: só a chave de administrador liga, a resposta continua a mesma e os
+arquivos trazem as consultas e as pilhas no formato do flamegraph.
+"""
+import json
+import re
+from pathlib import Path
+import pytest
+from app.config import configuracoes
+from tests.conftest import CABECALHOS, popular
+
+CABECALHOS_ADMIN = {"X-API-KEY": "chave-admin-dos-testes"}
+DIRETORIO = Path(configuracoes.perfil_diretorio)
+
+
+@pytest.fixture
+def perfis():
+    for caminho in DIRETORIO.glob("*"):
+        caminho.unlink()
+    yield DIRETORIO
+
+
+def test_perfil_da_requisicao(cliente, perfis):
+    popular(cliente, guias=2, produtos=3, visitas=20)
+    normal = cliente.get("/visitas/", headers=CABECALHOS_ADMIN)
+
+    resposta = cliente.get("/visitas/", headers={**CABECALHOS_ADMIN, "X-Profile": "1"})
+    assert resposta.status_code == 200 and resposta.json() == normal.json()
+
+    perfil_id = resposta.headers["X-Profile-Id"]
+    tempos = dict(item.split(";dur=") for item in resposta.headers["Server-Timing"].split(", "))
+    assert set(tempos) == {"total", "db", "serializacao", "orm"}
+
+    perfil = json.loads((perfis / f"{perfil_id}.json").read_text(encoding="utf-8"))
+    assert perfil["metodo"] == "GET" and perfil["caminho"] == "/visitas/" and perfil["status"] == 200
+    assert perfil["chave"] == "admin" and perfil["amostras"] >= 1
+    # As mesmas consultas da listagem (visitas e itens), cada uma com a duração
+    assert perfil["quantidade_consultas"] == len(perfil["consultas"]) == 2
+    assert any("FROM visitas" in consulta["sql"] for consulta in perfil["consultas"])
+    assert perfil["banco_ms"] == pytest.approx(sum(c["duracao_ms"] for c in perfil["consultas"]), abs=0.01)
+    assert perfil["banco_ms"] <= perfil["duracao_ms"]
+
+    # "thread;quadro;quadro contagem", um por linha
+    pilhas = (perfis / perfil["arquivo_pilhas"]).read_text(encoding="utf-8").splitlines()
+    assert pilhas and all(re.fullmatch(r"[^;]+(;[^;]+)+ \d+", linha) for linha in pilhas)
+
+    # Um perfil logo depois do outro não encontra o anterior ainda ocupando o amostrador
+    seguinte = cliente.get("/guias/", headers={**CABECALHOS_ADMIN, "X-Profile": "1"})
+    assert "X-Profile" not in seguinte.headers and seguinte.headers["X-Profile-Id"] != perfil_id
+
+
+def test_sem_perfil_para_outras_chaves_nem_sem_o_cabecalho(cliente, perfis):
+    popular(cliente, guias=1, produtos=1, visitas=1)
+
+    for cabecalhos in (
+        {**CABECALHOS, "X-Profile": "1"},
+        {**CABECALHOS_ADMIN, "X-Profile": "0"},
+        CABECALHOS_ADMIN,
+    ):
+        resposta = cliente.get("/visitas/", headers=cabecalhos)
+        assert resposta.status_code == 200
+        assert "X-Profile-Id" not in resposta.headers and "Server-Timing" not in resposta.headers
+
+    assert not list(perfis.glob("*"))
@@ -0,0 +1,98 @@
+"""
+Planos de execução das consultas dos services.
+
+Cada endpoint roda contra o banco em memória e cada comando enviado ao banco passa de novo
+pelo EXPLAIN QUERY PLAN do SQLite. O teste falha se algum deles ler uma tabela inteira
+(SCAN sem índice), a não ser nas leituras que precisam mesmo de todas as linhas.
+"""
+import re
+import pytest
+from app.cache import catalogo_cache
+from app.database import Base, engine
+from tests.conftest import CABECALHOS, TAMANHOS, popular
+from tests.consultas import ContadorConsultas
+from tests.test_orcamento_consultas import CHAMADAS, PERIODO, Chamada
+
+# Variações com filtro, que devem usar os índices (inclusive os parciais dos ativos)
+CHAMADAS_COM_FILTRO = [
+    Chamada("GET", "/guias/", "/guias/", 0, params={"apenas_ativos": True}),
+    Chamada("GET", "/produtos/", "/produtos/", 0, params={"apenas_ativos": True}),
+    Chamada("GET", "/guias/desempenho", "/guias/desempenho", 0, params={"top": 5, "apenas_ativos": True, **PERIODO}),
+    Chamada("GET", "/produtos/ranking", "/produtos/ranking", 0, params={"top": 10}),
+    Chamada("GET", "/produtos/ranking", "/produtos/ranking", 0, params={"top": 10, "apenas_ativos": True}),
+    Chamada("GET", "/produtos/ranking", "/produtos/ranking", 0, params={"top": 10, "apenas_ativos": True, **PERIODO}),
+    Chamada("GET", "/visitas/", "/visitas/", 0, params={"guia_id": 1}),
+    Chamada("GET", "/visitas/", "/visitas/", 0, params=PERIODO),
+    # Começa no meio do dia, então a ponta parcial é somada direto das visitas
+    Chamada("GET", "/visitas/relatorio", "/visitas/relatorio", 0, params={"data_inicio": "2020-01-01T10:00:00"}),
+    Chamada("GET", "/visitas/exportar", "/visitas/exportar", 0, params={"formato": "csv", **PERIODO}),
+]
+
+# O cache do catálogo relê todas as versões de uma vez (uma linha por tabela do catálogo)
+VARREDURAS_SEMPRE = {"catalogo_versoes"}
+
+# Leituras sem filtro, que devolvem (ou agregam) todas as linhas da tabela
+VARREDURAS_ESPERADAS = {
+    ("GET", "/guias/"): {"guias"},
+    ("GET", "/produtos/"): {"produtos"},
+    # O ranking inclui os produtos que nunca venderam, então passa por todos eles
+    ("GET", "/produtos/ranking"): {"produtos"},
+    # Mesmo caso: todos os guias aparecem, inclusive os que não tiveram visita
+    ("GET", "/guias/desempenho"): {"guias"},
+    ("GET", "/visitas/exportar"): {"visitas"},
+}
+
+PLANOS = [
+    pytest.param(
+        chamada,
+        VARREDURAS_SEMPRE | (set() if filtrada else VARREDURAS_ESPERADAS.get((chamada.metodo, chamada.rota), set())),
+        id=f"{chamada.metodo} {chamada.rota} {chamada.params or ''} {chamada.cabecalhos or ''}".strip(),
+    )
+    for chamadas, filtrada in ((CHAMADAS, False), (CHAMADAS_COM_FILTRO, True))
+    for chamada in chamadas
+]
+
+VARREDURA = re.compile(r"^SCAN (\w+)$")
+
+
+def _tabela(nome: str):
+    # O SQLAlchemy dá apelidos como guias_1 nas junções; subconsultas (anon_1) não são tabelas
+    for tabela in Base.metadata.tables:
+        if nome == tabela or re.fullmatch(rf"{tabela}_\d+", nome):
+            return tabela
+    return None
+
+
+def _plano(conexao, comando: str, parametros):
+    # Nos executemany o plano é o mesmo para todas as linhas; uso a primeira
+    if parametros and isinstance(parametros[0], (list, tuple, dict)):
+        parametros = parametros[0]
+    return [linha[3] for linha in conexao.exec_driver_sql(f"EXPLAIN QUERY PLAN {comando}", parametros)]
+
+
+@pytest.mark.parametrize("chamada,permitidas", PLANOS)
+def test_consultas_usam_indices(cliente, chamada: Chamada, permitidas: set):
+    popular(cliente, **TAMANHOS["grande"])
+    catalogo_cache.invalidar("produtos")
+    catalogo_cache.invalidar("guias")
+
+    with ContadorConsultas(engine) as contador:
+        resposta = cliente.request(
+            chamada.metodo, chamada.url, json=chamada.json, params=chamada.params,
+            headers={**CABECALHOS, **(chamada.cabecalhos or {})},
+        )
+    assert resposta.status_code < 400, f"{chamada.metodo} {chamada.url}: {resposta.status_code} {resposta.text}"
+
+    varreduras = []
+    with engine.connect() as conexao:
+        for comando, parametros in contador.execucoes:
+            plano = _plano(conexao, comando, parametros)
+            for passo in plano:
+                encontrado = VARREDURA.match(passo)
+                tabela = encontrado and _tabela(encontrado.group(1))
+                if tabela and tabela not in permitidas:
+                    varreduras.append(f"{passo} em: {' '.join(comando.split())}\n    " + "\n    ".join(plano))
+
+    assert not varreduras, (
+        f"{chamada.metodo} {chamada.rota} lê tabela inteira sem índice:\n" + "\n".join(varreduras)
+    )
@@ -0,0 +1,145 @@
+"""
+Relatórios em segundo plano: o resultado é o mesmo das rotas síncronas, o mesmo pedido não
+roda duas vezes dentro do TTL e o pool de processos funciona com um banco em arquivo.
+"""
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.database import engine
+from app.relatorios import GerenciadorRelatorios, gerenciador_relatorios, gravar_estado, ler_estado
+from tests.conftest import CABECALHOS, popular
+from tests.consultas import ContadorConsultas
+
+PERIODO = {"data_inicio": "2000-01-01", "data_fim": "2100-12-31"}
+
+
+def _esperar(cliente, job_id: str) -> dict:
+    limite = time.monotonic() + 10
+    while time.monotonic() < limite:
+        estado = cliente.get(f"/relatorios/jobs/{job_id}", headers=CABECALHOS).json()
+        if estado["status"] in ("concluido", "erro"):
+            return estado
+        time.sleep(0.02)
+    pytest.fail(f"relatório {job_id} não terminou: {estado}")
+
+
+def _pedir(cliente, **pedido):
+    resposta = cliente.post("/relatorios/jobs", json=pedido, headers=CABECALHOS)
+    assert resposta.status_code in (200, 202), resposta.text
+    assert resposta.headers["Location"] == f"/relatorios/jobs/{resposta.json()['id']}"
+    return resposta
+
+
+@pytest.fixture
+def relatorios(monkeypatch):
+    # Cada teste começa sem relatórios guardados de outro banco
+    monkeypatch.setattr(gerenciador_relatorios, "_proxima_limpeza", 0.0)
+    yield gerenciador_relatorios
+    for caminho in gerenciador_relatorios.diretorio.glob("*"):
+        caminho.unlink()
+
+
+def test_resultados_iguais_aos_das_rotas_sincronas(cliente, relatorios):
+    popular(cliente, guias=3, produtos=6, visitas=30)
+
+    with ContadorConsultas(engine) as contador:
+        resumo = _esperar(cliente, _pedir(cliente, tipo="resumo", **PERIODO).json()["id"])
+    sincrono = cliente.get("/visitas/relatorio", params=PERIODO, headers=CABECALHOS)
+    assert resumo["status"] == "concluido" and resumo["progresso"] == 100
+    assert resumo["resultado"] == sincrono.json()
+    # As mesmas consultas do relatório síncrono, só que rodando no pool
+    with ContadorConsultas(engine) as contador_sincrono:
+        cliente.get("/visitas/relatorio", params=PERIODO, headers=CABECALHOS)
+    assert contador.total == contador_sincrono.total, contador.descrever()
+
+    filtros = {"top": 4, "ordenar_por": "unidades", "categoria": "Bebidas"}
+    ranking = _esperar(cliente, _pedir(cliente, tipo="ranking", **filtros).json()["id"])
+    assert ranking["resultado"] == cliente.get("/produtos/ranking", params=filtros, headers=CABECALHOS).json()
+
+    exportacao = _esperar(cliente, _pedir(cliente, tipo="exportacao", formato="ndjson").json()["id"])
+    assert exportacao["arquivo_url"] == f"/relatorios/jobs/{exportacao['id']}/arquivo"
+    arquivo = cliente.get(exportacao["arquivo_url"], headers=CABECALHOS)
+    assert arquivo.headers["content-type"] == "application/x-ndjson"
+    assert arquivo.content == cliente.get("/visitas/exportar", params={"formato": "ndjson"}, headers=CABECALHOS).content
+
+
+def test_mesmo_pedido_reaproveita_o_resultado(cliente, relatorios):
+    popular(cliente, guias=2, produtos=3, visitas=5)
+
+    primeiro = _pedir(cliente, tipo="resumo", **PERIODO)
+    assert primeiro.status_code == 202
+    _esperar(cliente, primeiro.json()["id"])
+
+    # Parâmetros que não valem para o tipo não mudam o pedido
+    with ContadorConsultas(engine) as contador:
+        repetido = _pedir(cliente, tipo="resumo", formato="xlsx", **PERIODO)
+    assert repetido.status_code == 200 and repetido.json()["id"] == primeiro.json()["id"]
+    assert repetido.json()["status"] == "concluido" and contador.total == 0
+
+    # Resultado vencido (concluído há mais que o TTL): o pedido roda de novo e enxerga os dados novos
+    estado = ler_estado(relatorios.diretorio, primeiro.json()["id"])
+    vencido = (datetime.now(timezone.utc) - timedelta(seconds=relatorios.ttl + 1)).isoformat()
+    estado.update(concluido_em=vencido, expira_em=vencido)
+    gravar_estado(relatorios.diretorio, estado)
+    cliente.post("/visitas/", json={"guia_id": 1, "qtd_turistas": 1, "valor_taxa_guia": 10, "itens": []}, headers=CABECALHOS)
+    novo = _pedir(cliente, tipo="resumo", **PERIODO)
+    assert novo.status_code == 202
+    assert _esperar(cliente, novo.json()["id"])["resultado"]["quantidade_visitas"] == 6
+
+
+def test_erros(cliente, relatorios):
+    popular(cliente, guias=1, produtos=1, visitas=0)
+
+    invertido = cliente.post(
+        "/relatorios/jobs", json={"tipo": "resumo", "data_inicio": "2024-02-01", "data_fim": "2024-01-01"}, headers=CABECALHOS
+    )
+    assert invertido.status_code == 400
+
+    assert cliente.get("/relatorios/jobs/nao-existe", headers=CABECALHOS).status_code == 404
+    assert cliente.get("/relatorios/jobs/../../etc/passwd", headers=CABECALHOS).status_code == 404
+
+    # Relatório sem arquivo (resumo) não tem o que baixar
+    resumo = _esperar(cliente, _pedir(cliente, tipo="resumo").json()["id"])
+    assert cliente.get(f"/relatorios/jobs/{resumo['id']}/arquivo", headers=CABECALHOS).status_code == 409
+
+
+def test_pool_de_processos_com_banco_em_arquivo(cliente, tmp_path, monkeypatch):
+    popular(cliente, guias=2, produtos=4, visitas=20)
+
+    # Copio o banco em memória para um arquivo, que é o que o processo do relatório vai abrir
+    arquivo = tmp_path / "relatorios.db"
+    destino = sqlite3.connect(arquivo)
+    engine.raw_connection().driver_connection.backup(destino)
+    destino.close()
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{arquivo}")
+
+    gerenciador = GerenciadorRelatorios(tmp_path / "saida", ttl=60, processos=1, usar_processos=True)
+    try:
+        estado, novo = gerenciador.enfileirar("exportacao", {"formato": "csv"})
+        assert novo
+        limite = time.monotonic() + 60
+        while gerenciador.estado(estado["id"])["status"] not in ("concluido", "erro"):
+            assert time.monotonic() < limite, gerenciador.estado(estado["id"])
+            time.sleep(0.05)
+
+        estado = gerenciador.estado(estado["id"])
+        assert estado["status"] == "concluido", estado
+        gerado = gerenciador.caminho_arquivo(estado).read_bytes()
+        assert gerado == cliente.get("/visitas/exportar", headers=CABECALHOS).content
+    finally:
+        gerenciador.encerrar()
+
+
+def test_resultado_vencido_nao_e_mais_entregue(cliente, relatorios, monkeypatch):
+    popular(cliente, guias=1, produtos=2, visitas=3)
+    monkeypatch.setattr(relatorios, "ttl", 1)
+
+    exportacao = _esperar(cliente, _pedir(cliente, tipo="exportacao", formato="csv").json()["id"])
+    assert cliente.get(exportacao["arquivo_url"], headers=CABECALHOS).status_code == 200
+
+    time.sleep(1.1)
+    # Ninguém pediu outro relatório, então os arquivos ainda estão no disco; mesmo assim, vencido é 404
+    assert (relatorios.diretorio / f"{exportacao['id']}.json").exists()
+    assert cliente.get(f"/relatorios/jobs/{exportacao['id']}", headers=CABECALHOS).status_code == 404
+    assert cliente.get(exportacao["arquivo_url"], headers=CABECALHOS).status_code == 404
@@ -0,0 +1,108 @@
+"""
+Resumo diário: o que é mantido a cada gravação bate com o recalculado do zero, e o relatório
+montado com ele dá o mesmo que somar as visitas direto.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from app import models
+from app.database import SessionLocal
+from app.services.resumos_service import ResumoService
+from tests.conftest import CABECALHOS, popular
+
+BASE = datetime(2024, 3, 10)
+
+
+def _espalhar_visitas(horas: int):
+    # Cada visita vai para BASE + id * horas, passando pela meia-noite, e o resumo é refeito com as datas novas
+    with SessionLocal() as db:
+        for visita_id in db.scalars(select(models.Visita.id)).all():
+            db.execute(update(models.Visita).where(models.Visita.id == visita_id).values(
+                data_visita=BASE + timedelta(hours=visita_id * horas)
+            ))
+        db.commit()
+        ResumoService().reconstruir(db)
+
+
+def _linhas_do_resumo(db):
+    return {
+        (linha.dia, linha.guia_id): (linha.qtd_visitas, linha.qtd_turistas, linha.total_taxas_centavos, linha.total_produtos_centavos)
+        for linha in db.query(models.ResumoDiario)
+        # Linha zerada (dia/guia que ficou sem visitas) é o mesmo que linha nenhuma
+        if linha.qtd_visitas
+    }
+
+
+def _confere_com_reconstruir():
+    with SessionLocal() as db:
+        incremental = _linhas_do_resumo(db)
+        ResumoService().reconstruir(db)
+        assert incremental == _linhas_do_resumo(db)
+        assert incremental
+
+
+def test_resumo_incremental_igual_ao_reconstruido(cliente):
+    popular(cliente, guias=3, produtos=4, visitas=12)
+    _espalhar_visitas(horas=9)
+
+    # Visita nova (hoje)
+    resposta = cliente.post("/visitas/", json={
+        "guia_id": 2, "qtd_turistas": 3, "valor_taxa_guia": 35.5,
+        "itens": [{"produto_id": 1, "quantidade": 2}, {"produto_id": 3, "quantidade": 1}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    _confere_com_reconstruir()
+
+    # Atualização que troca o guia, os turistas, a taxa e os itens de uma visita antiga
+    resposta = cliente.put("/visitas/4", json={
+        "guia_id": 3, "qtd_turistas": 6, "valor_taxa_guia": 72.25,
+        "itens": [{"produto_id": 2, "quantidade": 4}, {"produto_id": 4, "quantidade": 1}],
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    with SessionLocal() as db:
+        assert db.get(models.Visita, 4).guia_id == 3
+    _confere_com_reconstruir()
+
+    # Exclusão
+    resposta = cliente.delete("/visitas/7", headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    _confere_com_reconstruir()
+
+
+def test_relatorio_com_pontas_parciais_igual_a_soma_das_visitas(cliente):
+    popular(cliente, guias=3, produtos=4, visitas=24)
+    # Uma visita a cada 5 horas: cerca de 5 dias, com visitas antes e depois de cada corte abaixo
+    _espalhar_visitas(horas=5)
+
+    periodos = [
+        # Começa e termina no meio do dia (o fim vale até o mesmo horário do dia seguinte)
+        (BASE + timedelta(hours=7, minutes=30), BASE + timedelta(days=2, hours=13)),
+        # Começa no meio do dia e termina num dia inteiro
+        (BASE + timedelta(hours=17), BASE + timedelta(days=3)),
+        # Começa num dia inteiro e termina no meio do dia
+        (BASE + timedelta(days=1), BASE + timedelta(days=3, hours=4)),
+        # Início e fim no mesmo horário: só um dia, sem nenhum dia inteiro no meio
+        (BASE + timedelta(days=1, hours=10), BASE + timedelta(days=1, hours=10)),
+    ]
+
+    for inicio, data_fim in periodos:
+        resposta = cliente.get("/visitas/relatorio", params={
+            "data_inicio": inicio.isoformat(), "data_fim": data_fim.isoformat(),
+        }, headers=CABECALHOS)
+        assert resposta.status_code == 200, resposta.text
+        relatorio = resposta.json()
+
+        with SessionLocal() as db:
+            taxas, produtos, quantidade = db.execute(select(
+                func.coalesce(func.sum(models.Visita.valor_taxa_guia_centavos), 0),
+                func.coalesce(func.sum(models.Visita.total_produtos_centavos), 0),
+                func.count(models.Visita.id),
+            ).where(
+                models.Visita.data_visita >= inicio,
+                models.Visita.data_visita < data_fim + timedelta(days=1),
+            )).one()
+
+        assert quantidade > 0
+        assert relatorio["quantidade_visitas"] == quantidade
+        assert round(relatorio["total_taxas_guias"] * 100) == taxas
+        assert round(relatorio["total_produtos"] * 100) == produtos
+        assert round(relatorio["faturamento_total_geral"] * 100) == taxas + produtos
@@ -0,0 +1,60 @@
+"""
+Série do faturamento: intervalos completos e totais iguais aos do relatório.
+"""
+from datetime import date, datetime, timedelta
+from tests.conftest import CABECALHOS, popular
+
+HOJE = date.today()
+
+
+def _serie(cliente, **params):
+    resposta = cliente.get("/visitas/serie", params=params, headers=CABECALHOS)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()
+
+
+def test_serie_completa_e_igual_ao_relatorio(cliente):
+    popular(cliente, guias=3, produtos=4, visitas=20)
+    inicio, fim = HOJE - timedelta(days=40), HOJE + timedelta(days=3)
+    periodo = {"data_inicio": inicio.isoformat(), "data_fim": fim.isoformat()}
+
+    relatorio = cliente.get("/visitas/relatorio", params=periodo, headers=CABECALHOS).json()
+
+    for bucket in ("hour", "day", "week", "month"):
+        serie = _serie(cliente, bucket=bucket, **periodo)
+        inicios = [datetime.fromisoformat(ponto["inicio"]) for ponto in serie]
+
+        # Sem buracos: cada ponto começa onde o anterior termina, do primeiro ao último dia
+        assert inicios == sorted(set(inicios))
+        assert inicios[0].date() <= inicio and inicios[-1].date() <= fim
+        if bucket == "day":
+            assert len(serie) == (fim - inicio).days + 1
+        if bucket == "hour":
+            assert len(serie) == ((fim - inicio).days + 1) * 24
+
+        assert sum(p["visitas"] for p in serie) == relatorio["quantidade_visitas"]
+        assert round(sum(p["total_taxas"] for p in serie), 2) == relatorio["total_taxas_guias"]
+        assert round(sum(p["total_produtos"] for p in serie), 2) == relatorio["total_produtos"]
+
+
+def test_serie_com_pontas_parciais(cliente):
+    popular(cliente, guias=2, produtos=3, visitas=6)
+    # As visitas são gravadas com o horário do banco (UTC)
+    agora = datetime.utcnow()
+    amanha = (agora + timedelta(days=1)).date().isoformat()
+
+    # Começa depois das visitas de hoje: o dia aparece, mas sem elas (o fim é contado a partir do
+    # início, que perto da meia-noite já cai no dia seguinte)
+    depois = agora + timedelta(minutes=5)
+    serie = _serie(cliente, bucket="day", data_inicio=depois.isoformat(), data_fim=(depois + timedelta(days=1)).date().isoformat())
+    assert [p["visitas"] for p in serie] == [0, 0]
+
+    serie = _serie(cliente, bucket="day", data_inicio=(agora - timedelta(days=1)).isoformat(), data_fim=amanha)
+    assert [p["visitas"] for p in serie] == [0, 6, 0]
+
+
+def test_serie_longa_demais(cliente):
+    resposta = cliente.get("/visitas/serie", params={
+        "bucket": "hour", "data_inicio": "2000-01-01", "data_fim": "2020-01-01",
+    }, headers=CABECALHOS)
+    assert resposta.status_code == 400